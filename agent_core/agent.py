@@ -1,57 +1,80 @@
 """
 Agent core: Orchestrates tasks, manages memory, tool selection, and LLM interaction.
 """
-from models.llm import LLMManager, TASK_END_TOKEN
-from modules import screen, input, file, web, command
-
+import asyncio
 
-from agent_core import memory
-from modules import screen, input as mod_input, file as mod_file, web, command
+from models.llm import LLMManager, TASK_END_TOKEN
+from agent_core import memory, blobs
+from agent_core.history import SessionLog
+from agent_core.executor import BatchExecutor, is_batch, is_inquiry, format_batch_results
+from agent_core.async_agent import AsyncAgent
+from agent_core.tools import default_registry
+from agent_core.compaction import HistoryCompactor
 
 class Agent:
     def __init__(self):
-        self.llm = LLMManager()
+        self.tools = default_registry()
+        self.llm = LLMManager(tools=self.tools)
+        if self.llm.embedding_model and self.llm.embedding_dim:
+            memory.set_embedder(self.llm.embed, self.llm.embedding_dim)
         self.memory = memory.load_memory()
         # Persist chat history across requests
         self.chat_history = memory.load_chat_history()
+        self.session_log = None
+        self.batch_executor = BatchExecutor(lambda call: self.tools.dispatch(self, call), classify=self.tools.concurrency_class)
+        self.async_agent = AsyncAgent(self, step_timeout=self.llm.step_timeout)
+        # Old turns are summarized in the background between requests (agent_core/compaction.py).
+        # Only after a request: a batch worker or server building an Agent mustn't summarize at startup.
+        self.compactor = None
+        if self.llm.history_compaction:
+            self.compactor = HistoryCompactor(self.llm.summarize_history, self.llm.compact_trigger_tokens,
+                                              self.llm.compact_keep_tokens)
 
-    def handle_request(self, request: str) -> str:
-        """Main entry for user requests. Implements agentic multi-step loop and saves chat history."""
-        chat_history = self.chat_history
-        try:
-            plan = self.llm.plan(request, chat_history)
-            chat_history.append({"role": "user", "content": request})
-            chat_history.append({"role": "llm_plan", "content": str(plan)})
-            result = self.execute_plan(plan, request)
-            chat_history.append({"role": "tool", "content": str(result)})
-            # Agentic multi-step loop: keep reasoning until LLM says done
-            max_steps = 20
-            steps = 0
-            while self._should_continue(plan, result) and steps < max_steps:
-                steps += 1
-                followup_prompt = self._agentic_followup_prompt(request, plan, result)
-                followup_plan = self._robust_parse_plan(self.llm._plan_with_api(followup_prompt, chat_history))
-                chat_history.append({"role": "llm_followup_plan", "content": str(followup_plan)})
-                followup_result = self.execute_plan(followup_plan, request)
-                chat_history.append({"role": "tool_followup", "content": str(followup_result)})
-                plan, result = followup_plan, followup_result
-        finally:
-            # Save chat history even if error
+    def handle_request(self, request: str, session=None) -> str:
+        """
+        Main entry for user requests. Implements agentic multi-step loop and saves chat history
+        (to `session`, an AgentSession, if given; otherwise to the agent's own history).
+        """
+        # Sync wrapper; async callers should await self.async_agent.handle_request directly
+        return asyncio.run(self.async_agent.handle_request(request, session=session))
+
+    def _persist_turn(self, request, plan, chat_history, session=None):
+        """Save chat history and memory after a request, even if it failed."""
+        if session is None:
             self.save_chat_history(chat_history)
-            # Optionally update memory
-            self.memory['last_request'] = request
-            self.memory['last_plan'] = plan if 'plan' in locals() else None
-            memory.save_memory(self.memory)
+        else:
+            memory.save_chat_history(chat_history, session=session.name)
+        # Optionally update memory
+        if session is not None and session.namespace is not None:
+            with memory.use_namespace(session.namespace):
+                kv = memory.load_memory()
+                kv.update(last_request=request, last_plan=plan)
+                memory.save_memory(kv)
+            return
+        self.memory['last_request'] = request
+        self.memory['last_plan'] = plan
+        memory.save_memory(self.memory)
+
+    def observe(self, result) -> str:
+        """History/prompt text for a tool result: large outputs become a blob handle plus excerpt."""
+        return blobs.get_blob_store().observation(result, self.llm.blob_inline_chars)
+
+    def _final_response(self, plan, result, chat_history):
         # Always return a string: just return the result (direct_answer, inquiry, etc.)
-        if not chat_history or not result:
+        if not chat_history:
             return 'No response from AI.'
+        if is_inquiry(result):
+            return result['text']
         # If the plan indicates task end or tool is 'none' return any final message
+        # (the 'none' tool itself returns nothing)
         if plan.get('task_end') or plan.get('tool') == 'none':
             args = plan.get('args', {})
             if 'text' in args:
                 return args['text']
             if 'message' in plan:
                 return plan['message']
+        if not result:
+            return 'No response from AI.'
         return str(result)
 
     def _robust_parse_plan(self, plan):
@@ -86,6 +109,9 @@ class Agent:
             return False
         if plan.get('tool') == 'none':
             return False
+        # A question for the user ends the request; the answer comes as the next one
+        if is_inquiry(result):
+            return False
         # If the result contains a clear done/completion signal or the token, stop.
         done_signals = ['done', 'complete', 'finished', 'no further action', 'task accomplished']
         if any(sig in str(result).lower() for sig in done_signals):
@@ -104,95 +130,22 @@ class Agent:
         )
 
     def save_chat_history(self, chat_history):
-        import os, json, datetime
+        import os, datetime
         # Persist the running history for future calls
         memory.save_chat_history(chat_history)
-        # Also keep timestamped logs for debugging
-        chat_dir = os.path.join(os.path.dirname(__file__), '../cache/chats')
-        os.makedirs(chat_dir, exist_ok=True)
-        session_file = os.path.join(
-            chat_dir,
-            f'session_{datetime.datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
-        )
-        with open(session_file, 'w') as f:
-            json.dump(chat_history, f, indent=2)
+        # Also keep a per-session log for debugging, appended to as the session grows
+        if self.session_log is None:
+            chat_dir = os.path.join(os.path.dirname(__file__), '../cache/chats')
+            session_file = os.path.join(
+                chat_dir,
+                f'session_{datetime.datetime.now().strftime("%Y%m%d_%H%M%S")}.jsonl'
+            )
+            self.session_log = SessionLog(session_file)
+        self.session_log.sync(chat_history)
 
     def execute_plan(self, plan, request=None):
-        tool = plan.get('tool')
-        args = plan.get('args', {})
-        try:
-            if tool == 'screen_ocr':
-                screen.capture_screen()
-                return "Captured the screen and performed OCR."
-            elif tool == 'move_mouse':
-                x, y = args.get('x'), args.get('y')
-                if x is not None and y is not None:
-                    mod_input.move_mouse(x, y)
-                    return f"Moved mouse to ({x}, {y})."
-                return "Missing x or y argument."
-            elif tool == 'click':
-                mod_input.click()
-                return "Clicked mouse."
-            elif tool == 'type_text':
-                text = args.get('text', '')
-                mod_input.type_text(text)
-                return f"Typed: {text}"
-            elif tool == 'read_file':
-                path = args.get('path')
-                if path:
-                    content = mod_file.read_file(path)
-                    return content
-                return "Missing file path."
-            elif tool == 'write_file':
-                path, content = args.get('path'), args.get('content')
-                if path is not None and content is not None:
-                    mod_file.write_file(path, content)
-                    return f"Wrote to {path}."
-                return "Missing path or content."
-            elif tool == 'append_file':
-                path, content = args.get('path'), args.get('content')
-                if path is not None and content is not None:
-                    mod_file.append_file(path, content)
-                    return f"Appended to {path}."
-                return "Missing path or content."
-            elif tool == 'search_web':
-                query = args.get('query')
-                if query:
-                    web.search_web(query)
-                    return f"Searched the web for: {query}"
-                return "Missing query."
-            elif tool == 'run_command':
-                cmd = args.get('cmd')
-                if cmd:
-                    output = command.run_command(cmd)
-                    return output
-                return "Missing command."
-            elif tool == 'memory_notepad_add':
-                note = args.get('note')
-                if note:
-                    memory.add_to_notepad(note)
-                    return "Added to notepad memory."
-                return "Missing note."
-            elif tool == 'memory_rag_query':
-                query = args.get('query')
-                if query:
-                    memory.rag_query(query)
-                    return f"Queried memory for: {query}"
-                return "Missing query."
-            elif tool == 'direct_answer':
-                question = args.get('question')
-                if question:
-                    return self.llm.answer_question(question)
-                return "Missing question."
-            elif tool == 'inquiry':
-                inquiry = args.get('question') or args.get('inquiry') or args.get('text')
-                if not inquiry:
-                    return 'The AI is requesting clarification.'
-                # Return a special signal that this is an inquiry that needs user input
-                return {"__type": "inquiry", "text": inquiry}
-            elif tool == 'none':
-                return ''
-            else:
-                return f"Unknown tool: {tool}"
-        except Exception as e:
-            return f"Error in tool execution: {e}"
+        if is_batch(plan):
+            # Independent tool calls in one plan run concurrently
+            return format_batch_results(self.batch_executor.run(plan['calls']))
+        # Single calls take their class slot too: a GUI action must not run during another session's
+        return self.batch_executor.run_single(plan)
@@ -0,0 +1,145 @@
+"""
+Async agent core: the multi-step request loop on asyncio.
+
+LLM calls and tools are blocking, so each step runs on a worker thread with a cancel token
+(see models/cancel.py) while the event loop stays free. That allows several sessions to run
+concurrently in one process, per-step timeouts, and cancelling an in-flight request: the
+token stops streaming generations between chunks, and the awaiting task returns at once.
+Agent.handle_request is a thin synchronous wrapper around AsyncAgent.handle_request.
+"""
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from agent_core import memory
+from modules import command
+from models.cancel import CancelToken, set_token
+from models import tracing
+
+TIMEOUT_MESSAGE = "Step timed out after {}s."
+
+
+class AgentSession:
+    """
+    Isolated conversation state for one caller. History is persisted under `name`; with a
+    `namespace`, key/value memory and notes are kept apart from other sessions too.
+    `on_event(dict)` is called with the steps of each request (plan, result, done).
+    """
+
+    def __init__(self, name=memory.DEFAULT_SESSION, history=None, namespace=None, on_event=None):
+        self.name = name
+        self.history = memory.load_chat_history(name) if history is None else history
+        self.namespace = namespace
+        self.on_event = on_event
+
+    def emit(self, event_type, **data):
+        if self.on_event is not None:
+            self.on_event(dict(data, type=event_type, session=self.name))
+
+
+class AsyncAgent:
+    def __init__(self, agent, step_timeout=None, max_workers=8, max_steps=20):
+        """
+        Args:
+            agent: The Agent providing the LLM, tools and memory
+            step_timeout: Seconds allowed per LLM call or tool run (None = no limit)
+            max_workers: Threads shared by all sessions for blocking work
+            max_steps: Follow-up steps allowed per request
+        """
+        self.agent = agent
+        self.step_timeout = step_timeout
+        self.max_steps = max_steps
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent")
+        # Single writer so saves land in request order
+        self.persist_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agent-persist")
+
+    async def run_blocking(self, fn, *args):
+        """Run fn(*args) on the worker pool; cancelling the awaiting task fires its cancel token."""
+        token = CancelToken()
+        ctx = contextvars.copy_context()
+        ctx.run(set_token, token)
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.pool, functools.partial(ctx.run, fn, *args))
+        try:
+            return await future
+        except asyncio.CancelledError:
+            token.cancel()
+            raise
+
+    async def step(self, fn, *args):
+        if self.step_timeout is None:
+            return await self.run_blocking(fn, *args)
+        return await asyncio.wait_for(self.run_blocking(fn, *args), self.step_timeout)
+
+    async def plan(self, request, history):
+        return await self.step(self.agent.llm.plan, request, history)
+
+    async def followup(self, request, plan, result, history):
+        prompt = self.agent._agentic_followup_prompt(request, plan, result)
+        raw = await self.step(self.agent.llm.plan_followup, prompt, history)
+        return self.agent._robust_parse_plan(raw)
+
+    async def execute(self, plan, request):
+        """Run a plan; returns (result, observation for the history)."""
+        return await self.step(self._execute, plan, request)
+
+    def _execute(self, plan, request):
+        # Storing a large output is blocking work too, so it happens on the worker thread
+        result = self.agent.execute_plan(plan, request)
+        return result, self.agent.observe(result)
+
+    async def handle_request(self, request: str, session=None) -> str:
+        """Agentic multi-step loop. Uses the agent's own history unless a session is given."""
+        chat_history = session.history if session is not None else self.agent.chat_history
+        session_name = session.name if session is not None else memory.DEFAULT_SESSION
+        emit = session.emit if session is not None else _ignore
+        compactor = self.agent.compactor
+        if compactor is not None:
+            compacted = compactor.apply(session_name, chat_history)
+            if compacted is not None:
+                # Queued ahead of this request's save, which appends after the summary
+                self.persist_pool.submit(memory.compact_chat_history, session_name, *compacted)
+        plan = result = None
+        # Each session's commands run in its own shell (cwd, environment)
+        with tracing.span("request", kind="request", session=session.name if session else None) as request_span, \
+                memory.use_namespace(session.namespace if session else None), command.use_session(session_name):
+            try:
+                with tracing.span("step", kind="step", step=0):
+                    plan = await self.plan(request, chat_history)
+                    emit("plan", step=0, plan=plan)
+                    chat_history.append({"role": "user", "content": request})
+                    chat_history.append({"role": "llm_plan", "content": str(plan)})
+                    result, observed = await self.execute(plan, request)
+                    emit("result", step=0, tool=plan.get("tool"), result=observed)
+                    chat_history.append({"role": "tool", "content": observed})
+                steps = 0
+                while self.agent._should_continue(plan, result) and steps < self.max_steps:
+                    steps += 1
+                    with tracing.span("step", kind="step", step=steps):
+                        followup_plan = await self.followup(request, plan, observed, chat_history)
+                        emit("plan", step=steps, plan=followup_plan)
+                        chat_history.append({"role": "llm_followup_plan", "content": str(followup_plan)})
+                        followup_result, observed = await self.execute(followup_plan, request)
+                        emit("result", step=steps, tool=followup_plan.get("tool"), result=observed)
+                        chat_history.append({"role": "tool_followup", "content": observed})
+                    plan, result = followup_plan, followup_result
+                request_span.set(steps=steps + 1)
+            except asyncio.TimeoutError:
+                result = TIMEOUT_MESSAGE.format(self.step_timeout)
+                request_span.set(error=result)
+                chat_history.append({"role": "tool", "content": result})
+                plan = {"tool": "none", "args": {}, "message": result}
+            finally:
+                # Persist off the critical path; a snapshot keeps later appends out of this save
+                saved = self.persist_pool.submit(self.agent._persist_turn, request, plan, list(chat_history), session)
+                if compactor is not None:
+                    # Only once the turn is on disk, so a summary never replaces unsaved turns
+                    saved.add_done_callback(lambda _: compactor.schedule(session_name, chat_history))
+        response = self.agent._final_response(plan, result, chat_history)
+        emit("done", response=response)
+        return response
+
+
+def _ignore(*args, **kwargs):
+    pass
@@ -0,0 +1,210 @@
+"""
+Headless batch mode: run a queue of requests through the agent without the menu.
+
+    python main.py --batch jobs.jsonl --workers 4 --llm-concurrency 2 > results.jsonl
+    echo "How much disk space is free?" | python main.py --batch -
+
+Jobs are JSONL, one per line: {"id": "j1", "request": "...", "answers": {...}}. A line can
+also be a bare request string; `request_id` and `body` are accepted for `id` and `request`.
+Each job runs through Agent.handle_request in its own history (persisted as session
+"batch-<id>") on a pool of worker processes, each with its own Agent. One semaphore shared by
+all workers caps how many model calls run at once. Results are written as JSONL in
+completion order, as soon as each job finishes:
+
+    {"id": "j1", "index": 0, "status": "ok", "response": "...", "steps": 3, "ms": 812.4, ...}
+
+status is ok, error, timeout or needs_input. A line that is not a job object or a request
+string gets an error record of its own; the rest of the queue still runs. Nobody is there to answer the inquiry tool, so a
+question is answered from the job's "answers" map, or the global one (--answers): keys are
+matched against the question exactly, then as substrings; "*" answers anything. If nothing
+matches, the job stops at once with status needs_input and the question.
+"""
+import os
+import sys
+import json
+import time
+import copy
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+DEFAULT_WORKERS = 2
+DEFAULT_LLM_CONCURRENCY = 2
+# Jobs submitted ahead per worker, so stdin is consumed as a stream rather than all at once
+QUEUE_DEPTH = 2
+
+
+class NeedsInput(BaseException):
+    """
+    Raised by the batch inquiry tool when no answer is available. A BaseException (like
+    models.cancel.Cancelled) so tool error handling doesn't turn it into an observation and
+    the agent loop ends right away.
+    """
+
+    def __init__(self, question):
+        super().__init__(question)
+        self.question = question
+
+
+def read_jobs(stream):
+    """
+    Yield job dicts from JSONL lines (or bare request strings); blank lines are skipped. An
+    unusable line (a JSON list or number, a non-string request) yields a job with an "error".
+    """
+    for lineno, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+        except ValueError:
+            job = line
+        if isinstance(job, str):
+            job = {"request": job}
+        if not isinstance(job, dict):
+            yield {"id": str(lineno), "request": line,
+                   "error": f"line {lineno}: expected a job object or a request string, got {type(job).__name__}"}
+            continue
+        job.setdefault("id", job.get("request_id") or str(lineno))
+        job.setdefault("request", job.get("body") or "")
+        if not isinstance(job["request"], str):
+            job["error"] = f"line {lineno}: request must be a string"
+        yield job
+
+
+def match_answer(question, answers):
+    """Answer for `question` from an answers map, or None."""
+    if not answers:
+        return None
+    q = question.strip().lower()
+    for key, answer in answers.items():
+        if key.strip().lower() == q:
+            return answer
+    for key, answer in answers.items():
+        if key != "*" and key.strip().lower() in q:
+            return answer
+    return answers.get("*")
+
+
+# Per worker process
+_agent = None
+_answers = {}
+
+
+def _init_worker(llm_limit, answers):
+    global _agent, _answers
+    # stdout carries the results stream; anything tools print goes to stderr instead
+    sys.stdout = sys.stderr
+    from agent_core.agent import Agent
+    _agent = Agent()
+    _agent.llm.call_limit = llm_limit
+    _answers = answers or {}
+    inquiry = _agent.tools.get("inquiry")
+    if inquiry is not None:
+        tool = copy.copy(inquiry)
+        tool.handler = _answer_inquiry
+        _agent.tools.add(tool, replace=True)
+
+
+def _answer_inquiry(agent, args):
+    question = args.get('question') or args.get('inquiry') or args.get('text') or ''
+    answer = match_answer(question, _answers)
+    if answer is None:
+        raise NeedsInput(question)
+    return f"User answered: {answer}"
+
+
+def run_job(job, submitted):
+    """Run one job in this worker's agent; returns its result record."""
+    global _answers
+    from agent_core.async_agent import AgentSession, TIMEOUT_MESSAGE
+    shared = _answers
+    _answers = dict(shared, **(job.get("answers") or {}))
+    session = AgentSession(f"batch-{job['id']}", history=[])
+    record = {"id": job["id"], "index": job.get("index"), "request": job["request"],
+              "worker": os.getpid(), "queued_ms": round((time.time() - submitted) * 1000, 1)}
+    started = time.perf_counter()
+    try:
+        response = _agent.handle_request(job["request"], session=session)
+        timed_out = response == TIMEOUT_MESSAGE.format(_agent.async_agent.step_timeout)
+        record.update(status="timeout" if timed_out else "ok", response=response)
+    except NeedsInput as e:
+        record.update(status="needs_input", question=e.question)
+    except Exception as e:
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+    finally:
+        _answers = shared
+        # Each job ran in its own shell; don't keep one per finished job
+        from modules import command
+        command.close_session(session.name)
+    record["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    record["steps"] = sum(1 for e in session.history if e.get("role") in ("llm_plan", "llm_followup_plan"))
+    # Report the job only once its history is saved
+    _agent.async_agent.persist_pool.submit(lambda: None).result()
+    return record
+
+
+def run(jobs, out, workers=DEFAULT_WORKERS, llm_concurrency=DEFAULT_LLM_CONCURRENCY, answers=None) -> dict:
+    """
+    Run `jobs` (an iterable of job dicts) on `workers` processes, writing one JSON line per
+    finished job to `out`. Returns counts per status.
+    """
+    context = multiprocessing.get_context()
+    llm_limit = context.BoundedSemaphore(llm_concurrency)
+    counts = {}
+    pending = {}
+
+    def write(record):
+        counts[record["status"]] = counts.get(record["status"], 0) + 1
+        out.write(json.dumps(record, default=str) + "\n")
+        out.flush()
+
+    def emit(done):
+        for future in done:
+            job = pending.pop(future)
+            try:
+                record = future.result()
+            except Exception as e:
+                # The worker process died (or the record couldn't be sent back)
+                record = {"id": job["id"], "index": job["index"], "request": job["request"],
+                          "status": "error", "error": f"{type(e).__name__}: {e}"}
+            write(record)
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(llm_limit, answers)) as pool:
+        for index, job in enumerate(jobs):
+            job["index"] = index
+            if job.get("error"):
+                # Reported as it is read, without a worker
+                write({"id": job["id"], "index": index, "request": job["request"], "status": "error",
+                       "error": job["error"]})
+                continue
+            pending[pool.submit(run_job, job, time.time())] = job
+            if len(pending) >= workers * QUEUE_DEPTH:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                emit(done)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            emit(done)
+    return counts
+
+
+def main(path, output=None, workers=DEFAULT_WORKERS, llm_concurrency=DEFAULT_LLM_CONCURRENCY,
+         answers_path=None) -> int:
+    """CLI entry (main.py --batch). Exits 1 if any job didn't finish with status ok."""
+    answers = None
+    if answers_path:
+        with open(answers_path) as f:
+            answers = json.load(f)
+    source = sys.stdin if path == "-" else open(path)
+    out = open(output, "w") if output else sys.stdout
+    started = time.perf_counter()
+    try:
+        counts = run(read_jobs(source), out, workers, llm_concurrency, answers)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    summary = ", ".join(f"{n} {status}" for status, n in sorted(counts.items())) or "no jobs"
+    print(f"Batch finished in {time.perf_counter() - started:.1f}s: {summary}", file=sys.stderr)
+    return 0 if set(counts) <= {"ok"} else 1
@@ -0,0 +1,201 @@
+"""
+Blob store: large tool outputs kept once, out of the chat history.
+
+An observation longer than the inline limit (BLOB_INLINE_CHARS) is written to
+cache/blobs/<ab>/<hash>.z, zlib-compressed and named by its SHA-256, so the same output read
+twice is stored once. The history entry keeps only a handle ("blob:<16 hex>") and a bounded
+head/tail excerpt; the model pages through the rest with the read_blob tool.
+
+Blobs aren't reference-counted: `collect_garbage` (run when sessions are deleted) keeps
+every blob whose handle still appears in a stored history (database sessions, their archives
+and the session logs in cache/chats) and deletes the rest. Blobs written in the last
+GC_GRACE_SECONDS are always kept, since their turn may not be saved yet.
+"""
+import os
+import re
+import time
+import zlib
+import hashlib
+import threading
+
+BLOB_DIR = os.path.join(os.path.dirname(__file__), '../cache/blobs')
+INLINE_CHARS = 4000
+# Share of the excerpt taken from the end of the output (the rest is the head)
+TAIL_SHARE = 0.25
+PAGE_LINES = 200
+HANDLE_HEX = 16
+GC_GRACE_SECONDS = 3600
+HANDLE_PATTERN = re.compile(r'blob:([0-9a-f]{%d})' % HANDLE_HEX)
+
+
+class BlobStore:
+    def __init__(self, root=BLOB_DIR):
+        self.root = os.path.normpath(root)
+        self._lock = threading.Lock()
+        self._recent = (None, None)  # (digest, text) of the last blob read, for paging
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], digest + '.z')
+
+    def put(self, text) -> str:
+        """Store `text` (deduplicated); returns its handle."""
+        digest = hashlib.sha256(text.encode(errors='replace')).hexdigest()[:HANDLE_HEX]
+        path = self._path(digest)
+        with self._lock:
+            if os.path.exists(path):
+                # Already stored: restart its grace period so a sweep can't race this turn's save
+                os.utime(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, 'wb') as f:
+                    f.write(zlib.compress(text.encode(errors='replace'), 6))
+                os.replace(tmp, path)
+        return f"blob:{digest}"
+
+    def get(self, handle):
+        """Full text of a blob, or None if it doesn't exist."""
+        match = HANDLE_PATTERN.search(handle or '')
+        if not match:
+            return None
+        digest = match.group(1)
+        recent_digest, recent_text = self._recent
+        if recent_digest == digest:
+            return recent_text
+        try:
+            with open(self._path(digest), 'rb') as f:
+                text = zlib.decompress(f.read()).decode(errors='replace')
+        except (OSError, zlib.error):
+            return None
+        self._recent = (digest, text)
+        return text
+
+    def observation(self, result, inline_chars=INLINE_CHARS) -> str:
+        """
+        What goes into the history for a tool result: the text itself if it's short, else a
+        handle with the first and last lines that fit in `inline_chars` (0 = always inline).
+        """
+        text = result if isinstance(result, str) else str(result)
+        if not inline_chars or len(text) <= inline_chars:
+            return text
+        handle = self.put(text)
+        lines = text.splitlines()
+        tail_budget = int(inline_chars * TAIL_SHARE)
+        head, used = [], 0
+        for line in lines:
+            if head and used + len(line) + 1 > inline_chars - tail_budget:
+                break
+            # A line longer than the whole excerpt is cut (read_blob "offset" reaches the rest)
+            head.append(line[:inline_chars - tail_budget])
+            used += len(head[-1]) + 1
+        tail, used = [], 0
+        for line in reversed(lines[len(head):]):
+            if used + len(line) + 1 > tail_budget:
+                break
+            tail.insert(0, line)
+            used += len(line) + 1
+        skipped = len(lines) - len(head) - len(tail)
+        cut = " (cut short)" if len(head[-1]) < len(lines[len(head) - 1]) else ""
+        header = (f"[Output stored as {handle}: {len(text)} chars, {len(lines)} lines. Showing lines "
+                  f"1-{len(head)}{cut}" + (f" and {len(lines) - len(tail) + 1}-{len(lines)}" if tail else "") +
+                  '. Use read_blob with "handle" and "start_line" (or "offset" in chars) for the rest.]')
+        parts = head + ([f"...[{skipped} lines omitted]..."] if skipped else []) + tail
+        return header + "\n" + "\n".join(parts)
+
+    def read_lines(self, handle, start=1, count=PAGE_LINES, max_chars=INLINE_CHARS) -> str:
+        """Lines `start`.. of a blob (1-based), at most `count` lines and `max_chars` characters."""
+        text = self.get(handle)
+        if text is None:
+            return f"No blob {handle}: it may have been deleted along with its session."
+        lines = text.splitlines()
+        start = max(1, start)
+        out, used = [], 0
+        for line in lines[start - 1:start - 1 + count]:
+            if out and used + len(line) + 1 > max_chars:
+                break
+            out.append(line[:max_chars])
+            used += len(out[-1]) + 1
+        end = start + len(out) - 1
+        if not out:
+            return f"{handle} has {len(lines)} lines; nothing at line {start}."
+        more = f'; continue with "start_line": {end + 1}' if end < len(lines) else ""
+        return f"[{handle} lines {start}-{end} of {len(lines)}{more}]\n" + "\n".join(out)
+
+    def read_chars(self, handle, offset=0, length=INLINE_CHARS) -> str:
+        """`length` characters of a blob from `offset`, for outputs with very long lines."""
+        text = self.get(handle)
+        if text is None:
+            return f"No blob {handle}: it may have been deleted along with its session."
+        offset = max(0, offset)
+        end = min(len(text), offset + length)
+        more = f'; continue with "offset": {end}' if end < len(text) else ""
+        return f"[{handle} chars {offset}-{end} of {len(text)}{more}]\n" + text[offset:end]
+
+    def handles(self) -> dict:
+        """digest -> path of every stored blob."""
+        found = {}
+        if not os.path.isdir(self.root):
+            return found
+        for prefix in os.scandir(self.root):
+            if prefix.is_dir():
+                for entry in os.scandir(prefix.path):
+                    if entry.name.endswith('.z'):
+                        found[entry.name[:-2]] = entry.path
+        return found
+
+    def collect_garbage(self, live, grace=GC_GRACE_SECONDS) -> int:
+        """Delete blobs whose digest isn't in `live` and that are older than `grace` seconds. Returns the count."""
+        cutoff = time.time() - grace
+        removed = 0
+        with self._lock:
+            for digest, path in self.handles().items():
+                try:
+                    if digest in live or os.path.getmtime(path) > cutoff:
+                        continue
+                    os.remove(path)
+                except OSError:
+                    continue
+                removed += 1
+            self._recent = (None, None)
+        return removed
+
+
+def referenced_handles() -> set:
+    """Digests of blobs referenced by any stored history."""
+    from agent_core import memory
+    from agent_core.catalog import get_catalog
+    store = memory.get_store()
+    live = set()
+    for sql in ("SELECT entry FROM chat WHERE entry LIKE '%blob:%'",
+                "SELECT entry FROM chat_archive WHERE entry LIKE '%blob:%'"):
+        for (entry,) in store.query(sql):
+            live.update(HANDLE_PATTERN.findall(entry))
+    catalog = get_catalog()
+    catalog.refresh()
+    for (content,) in store.query("SELECT content FROM chat_entries WHERE content LIKE '%blob:%'"):
+        live.update(HANDLE_PATTERN.findall(content))
+    return live
+
+
+def collect_garbage(grace=GC_GRACE_SECONDS) -> int:
+    """Delete unreferenced blobs (call after deleting sessions)."""
+    return get_blob_store().collect_garbage(referenced_handles(), grace)
+
+
+_blob_store = None
+_blob_store_lock = threading.Lock()
+
+
+def get_blob_store() -> BlobStore:
+    global _blob_store
+    with _blob_store_lock:
+        if _blob_store is None:
+            _blob_store = BlobStore()
+        return _blob_store
+
+
+def reset_blob_store():
+    """Forget the blob store and its read cache (after cache/ was deleted)."""
+    global _blob_store
+    with _blob_store_lock:
+        _blob_store = None
@@ -0,0 +1,218 @@
+"""
+Built-in tools. Each handler takes (agent, args) and returns the observation for the model.
+
+Tool modules are imported inside the handlers, so screen/OCR, browser and shell support
+are only loaded when a plan first uses them.
+"""
+from agent_core.tools import Tool, shorten
+
+TOOLS = []
+
+
+def _tool(name, **meta):
+    def register(handler):
+        TOOLS.append(Tool(name, handler=handler, **meta))
+        return handler
+    return register
+
+
+def _int(args, name, default):
+    """Integer argument; models often send null for "use the default"."""
+    value = args.get(name)
+    return default if value is None else int(value)
+
+
+# Input/Output
+
+@_tool("screen_ocr", group="Input/Output", concurrency="gui",
+       description="Capture screen text", ui="👀 Capturing screen text")
+def screen_ocr(agent, args):
+    from modules import screen
+    if agent.llm.screen_frame_buffer:
+        screen.start_frame_buffer(fps=agent.llm.screen_buffer_fps)
+    read = screen.read_screen()
+    text = f"Screen text:\n{read['text'] or '(no text found)'}"
+    # After the first read, tell the model what changed
+    if read['removed'] or read['added'] != read['lines']:
+        changes = [f"+ {line}" for line in read['added']] + [f"- {line}" for line in read['removed']]
+        text += "\n\nChanges since last read:\n" + ("\n".join(changes) or "(none)")
+    return text
+
+
+@_tool("move_mouse", args={"x": 123, "y": 456}, required=("x", "y"), group="Input/Output",
+       concurrency="gui", side_effects=True, description="Move mouse", ui="🖱️ Moving mouse to ({x}, {y})")
+def move_mouse(agent, args):
+    from modules import input as mod_input
+    x, y = args['x'], args['y']
+    mod_input.move_mouse(x, y)
+    return f"Moved mouse to ({x}, {y})."
+
+
+@_tool("click", group="Input/Output", concurrency="gui", side_effects=True,
+       description="Click mouse", ui="🖱️ Clicking mouse")
+def click(agent, args):
+    from modules import input as mod_input
+    mod_input.click()
+    return "Clicked mouse."
+
+
+@_tool("type_text", args={"text": "text"}, group="Input/Output", concurrency="gui", side_effects=True,
+       description="Type text", ui="⌨️ Typing: {text}", ui_width=30)
+def type_text(agent, args):
+    from modules import input as mod_input
+    text = args.get('text', '')
+    mod_input.type_text(text)
+    return f"Typed: {text}"
+
+
+# Files
+
+@_tool("read_file", args={"path": "/path"}, required=("path",), group="Files",
+       description='Read file (large files are truncated; page with "offset"/"length" in bytes '
+                   'or "start_line"/"end_line")',
+       ui="📖 Reading file: {path}")
+def read_file(agent, args):
+    from modules import file as mod_file
+    path = args['path']
+    if args.get('start_line') is not None or args.get('end_line') is not None:
+        return mod_file.read_lines(path, _int(args, 'start_line', 1), _int(args, 'end_line', None),
+                                   agent.llm.file_result_bytes)
+    return mod_file.read_file(path, _int(args, 'offset', 0), _int(args, 'length', None), agent.llm.file_result_bytes)
+
+
+@_tool("head_file", args={"path": "/path", "lines": 20}, required=("path",), group="Files",
+       description="First lines of a file", ui="📖 Reading start of file: {path}")
+def head_file(agent, args):
+    from modules import file as mod_file
+    return mod_file.head(args['path'], _int(args, 'lines', 20), agent.llm.file_result_bytes)
+
+
+@_tool("tail_file", args={"path": "/path", "lines": 20}, required=("path",), group="Files",
+       description="Last lines of a file (logs)", ui="📖 Reading end of file: {path}")
+def tail_file(agent, args):
+    from modules import file as mod_file
+    return mod_file.tail(args['path'], _int(args, 'lines', 20), agent.llm.file_result_bytes)
+
+
+@_tool("search_file", args={"path": "/path", "pattern": "regex", "context": 2},
+       required=("path", "pattern"), group="Files",
+       description="Matching lines with line numbers and context",
+       ui=lambda args: f"🔎 Searching {args.get('path', '')} for: {shorten(args.get('pattern', ''), 30)}")
+def search_file(agent, args):
+    from modules import file as mod_file
+    return mod_file.search_file(args['path'], args['pattern'], context=_int(args, 'context', 2),
+                                ignore_case=bool(args.get('ignore_case')), max_bytes=agent.llm.file_result_bytes)
+
+
+@_tool("write_file", args={"path": "/path", "content": "text"}, required=("path",), group="Files",
+       side_effects=True, description="Write file", ui="✍️ Writing to file: {path}")
+def write_file(agent, args):
+    from modules import file as mod_file
+    if args.get('content') is None:
+        return "Missing content."
+    mod_file.write_file(args['path'], args['content'])
+    return f"Wrote to {args['path']}."
+
+
+@_tool("append_file", args={"path": "/path", "content": "text"}, required=("path",), group="Files",
+       side_effects=True, description="Append to file", ui="✍️ Appending to file: {path}")
+def append_file(agent, args):
+    from modules import file as mod_file
+    if args.get('content') is None:
+        return "Missing content."
+    mod_file.append_file(args['path'], args['content'])
+    return f"Appended to {args['path']}."
+
+
+@_tool("read_blob", args={"handle": "blob:...", "start_line": 1}, required=("handle",), group="Files",
+       description='Page through a stored large output ("lines": count; or "offset"/"length" in chars)',
+       ui="📖 Reading stored output {handle}")
+def read_blob(agent, args):
+    from agent_core import blobs
+    store = blobs.get_blob_store()
+    # Pages stay under the inline limit so they aren't stored as blobs themselves
+    limit = max(500, (agent.llm.blob_inline_chars or blobs.INLINE_CHARS) - 200)
+    if args.get('offset') is not None:
+        return store.read_chars(args['handle'], int(args['offset']), min(_int(args, 'length', limit), limit))
+    return store.read_lines(args['handle'], _int(args, 'start_line', 1), _int(args, 'lines', blobs.PAGE_LINES), limit)
+
+
+# System & Web
+
+@_tool("search_web", args={"query": "terms"}, group="System & Web", concurrency="web",
+       description='Web search (or "queries": [...] for several at once)',
+       ui=lambda args: f"🔍 Searching web for: {shorten(args.get('query') or args.get('queries') or '', 50)}")
+def search_web(agent, args):
+    from modules import web
+    query, queries = args.get('query'), args.get('queries')
+    if queries:
+        return "\n\n".join(web.format_results(q, r) for q, r in zip(queries, web.search_many(queries)))
+    if query:
+        return web.format_results(query, web.search_web(query))
+    return "Missing query."
+
+
+@_tool("run_command", args={"cmd": "command"}, required=("cmd",), group="System & Web", side_effects=True,
+       description="Shell command (persistent shell: cd/export carry over; optional \"timeout\": seconds)",
+       examples=[({"cmd": "command", "background": True}, "Start a long-running job")],
+       ui="🔧 Running command: {cmd}")
+def run_command(agent, args):
+    from modules import command
+    cmd = args['cmd']
+    if args.get('background'):
+        return f"Started background job {command.start_job(cmd)}: {cmd}"
+    return command.run_command(cmd, timeout=args.get('timeout', command.DEFAULT_TIMEOUT))
+
+
+@_tool("job_status", args={"job": "1"}, required=("job",), group="System & Web",
+       description="Check a background job", ui="📋 Checking job {job}")
+def job_status(agent, args):
+    from modules import command
+    job = args['job']
+    status = command.job_status(job)
+    if 'error' in status:
+        return status['error']
+    state = 'running' if status['running'] else f"exited with code {status['exit_code']}"
+    return f"Job {job} ({status['cmd']}) {state}. Output:\n{status['output']}"
+
+
+# Memory & Communication
+
+@_tool("memory_notepad_add", args={"note": "text"}, required=("note",), group="Memory & Communication",
+       side_effects=True, description="Add note", ui="📝 Adding note: {note}")
+def memory_notepad_add(agent, args):
+    from agent_core import memory
+    memory.add_to_notepad(args['note'])
+    return "Added to notepad memory."
+
+
+@_tool("memory_rag_query", args={"query": "text"}, required=("query",), group="Memory & Communication",
+       description="Query memory", ui="🧠 Querying memory: {query}")
+def memory_rag_query(agent, args):
+    from agent_core import memory
+    query = args['query']
+    hits = memory.rag_query(query, k=args.get('k', 5))
+    if not hits:
+        return f"No relevant memory found for: {query}"
+    return "\n".join(f"[{h['score']}] {h['text']}" for h in hits)
+
+
+@_tool("direct_answer", args={"question": "text"}, required=("question",), concurrency="llm")
+def direct_answer(agent, args):
+    return agent.llm.answer_question(args['question'])
+
+
+@_tool("inquiry", args={"text": "question"}, group="Memory & Communication", concurrency="gui", side_effects=True,
+       description="Ask user")
+def inquiry(agent, args):
+    text = args.get('question') or args.get('inquiry') or args.get('text')
+    if not text:
+        return 'The AI is requesting clarification.'
+    # Return a special signal that this is an inquiry that needs user input
+    return {"__type": "inquiry", "text": text}
+
+
+@_tool("none", group="Memory & Communication", description="No action needed")
+def none(agent, args):
+    return ''
+
@@ -0,0 +1,271 @@
+"""
+Session catalog: an index of the chat logs in cache/chats for the CLI chat browser.
+
+Each session file gets a row of metadata (start time, turns, tools used, size, first request)
+and its entries are indexed for full-text search (SQLite FTS5, or LIKE where FTS5 is missing).
+Everything lives in the memory database, so listing, searching and paging through thousands
+of sessions never opens the files.
+
+`refresh` keeps the index in step with the directory incrementally. Session logs are
+append-only, so for a file that grew only the bytes past the indexed offset are parsed. A
+reset record (history replaced) restarts that session's entries. A file that was replaced
+(compacted: new inode) or shrank, or a legacy .json snapshot that changed, is re-read whole,
+and deleted files are dropped. Any process may write sessions: the catalog catches up the next time it's read.
+"""
+import os
+import re
+import json
+import glob
+import datetime
+
+from agent_core import memory
+from agent_core.history import RESET_RECORD
+
+CHAT_DIR = os.path.join(os.path.dirname(__file__), '../cache/chats')
+PAGE_SIZE = 20
+TITLE_CHARS = 80
+SNIPPET_TOKENS = 12
+PLAN_ROLES = ("llm_plan", "llm_followup_plan")
+TOOL_PATTERN = re.compile(r"""['"]tool['"]\s*:\s*['"]([\w\-]+)['"]""")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    path TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    started REAL NOT NULL,
+    updated REAL NOT NULL,
+    size INTEGER NOT NULL,
+    indexed_bytes INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    entries INTEGER NOT NULL,
+    turns INTEGER NOT NULL,
+    tools TEXT NOT NULL,
+    title TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chat_sessions_started ON chat_sessions (started);
+CREATE TABLE IF NOT EXISTS chat_entries (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS chat_entries_path_seq ON chat_entries (path, seq);
+"""
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS chat_entries_fts USING fts5(
+    content, content='chat_entries', content_rowid='id'
+);
+"""
+
+
+def _started(path, fallback):
+    """Start time from a session_YYYYmmdd_HHMMSS file name, else `fallback`."""
+    match = re.search(r'session_(\d{8}_\d{6})', os.path.basename(path))
+    if match:
+        try:
+            return datetime.datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").timestamp()
+        except ValueError:
+            pass
+    return fallback
+
+
+class SessionCatalog:
+    def __init__(self, chat_dir=CHAT_DIR, store=None):
+        self.chat_dir = os.path.normpath(chat_dir)
+        self.store = store or memory.get_store()
+        self.store.conn().executescript(SCHEMA)
+        try:
+            self.store.conn().executescript(FTS_SCHEMA)
+            self.fts = True
+        except Exception:
+            # SQLite built without FTS5: search falls back to LIKE
+            self.fts = False
+
+    # Indexing
+
+    def session_files(self) -> list:
+        files = glob.glob(os.path.join(self.chat_dir, 'session_*.jsonl'))
+        files += glob.glob(os.path.join(self.chat_dir, 'session_*.json'))
+        return files
+
+    def refresh(self) -> int:
+        """Bring the catalog up to date with the chat directory. Returns the sessions (re)indexed."""
+        known = {row[0]: row[1:] for row in
+                 self.store.query("SELECT path, size, indexed_bytes, inode FROM chat_sessions")}
+        changed = 0
+        for path in self.session_files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if path in known and known.pop(path) == (stat.st_size, stat.st_size, stat.st_ino):
+                continue
+            known.pop(path, None)
+            self.index(path)
+            changed += 1
+        for path in known:
+            self.remove(path)
+        return changed
+
+    def index(self, path):
+        """Index what's new in one session file."""
+        row = self.store.query("SELECT indexed_bytes, entries, inode FROM chat_sessions WHERE path = ?", (path,))
+        offset, seq, inode = row[0] if row else (0, 0, None)
+        stat = os.stat(path)
+        if not path.endswith('.jsonl') or stat.st_ino != inode or stat.st_size < offset:
+            # Legacy snapshot rewritten, or log compacted: start over
+            offset, seq = 0, 0
+        entries, reset, end = self._read(path, offset)
+        if reset or offset == 0:
+            seq = 0
+        with self.store.transaction() as conn:
+            if seq == 0:
+                self._delete_entries(conn, path)
+            self._insert_entries(conn, path, seq, entries)
+            self._update_meta(conn, path, end, stat)
+
+    def _read(self, path, offset):
+        """(entries after `offset`, whether a reset record was seen, offset after the last full line)."""
+        if not path.endswith('.jsonl'):
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+            except ValueError:
+                data = []
+            return (data if isinstance(data, list) else []), True, os.path.getsize(path)
+        entries, reset = [], False
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            end = offset
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # still being written; picked up next time
+                end += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn write from a crash
+                if entry == RESET_RECORD:
+                    entries, reset = [], True
+                    continue
+                if isinstance(entry, dict):
+                    entries.append(entry)
+        return entries, reset, end
+
+    def _delete_entries(self, conn, path):
+        if self.fts:
+            conn.execute(
+                "INSERT INTO chat_entries_fts (chat_entries_fts, rowid, content) "
+                "SELECT 'delete', id, content FROM chat_entries WHERE path = ?", (path,))
+        conn.execute("DELETE FROM chat_entries WHERE path = ?", (path,))
+
+    def _insert_entries(self, conn, path, start, entries):
+        for seq, entry in enumerate(entries, start=start):
+            content = str(entry.get('content', ''))
+            cur = conn.execute("INSERT INTO chat_entries (path, seq, role, content) VALUES (?, ?, ?, ?)",
+                               (path, seq, str(entry.get('role', '')), content))
+            if self.fts:
+                conn.execute("INSERT INTO chat_entries_fts (rowid, content) VALUES (?, ?)", (cur.lastrowid, content))
+
+    def _update_meta(self, conn, path, indexed_bytes, stat):
+        entries, turns = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(role = 'user'), 0) FROM chat_entries WHERE path = ?", (path,)).fetchone()
+        tools = set()
+        for (content,) in conn.execute("SELECT content FROM chat_entries WHERE path = ? AND role IN (?, ?)",
+                                       (path,) + PLAN_ROLES):
+            tools.update(t for t in TOOL_PATTERN.findall(content) if t not in ("none", "batch"))
+        first = conn.execute("SELECT content FROM chat_entries WHERE path = ? AND role = 'user' ORDER BY seq LIMIT 1",
+                             (path,)).fetchone()
+        title = " ".join((first[0] if first else "").split())[:TITLE_CHARS]
+        conn.execute(
+            "INSERT INTO chat_sessions (path, name, started, updated, size, indexed_bytes, inode, entries, turns, tools, "
+            "title) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(path) DO UPDATE SET "
+            "updated = excluded.updated, size = excluded.size, indexed_bytes = excluded.indexed_bytes, "
+            "inode = excluded.inode, "
+            "entries = excluded.entries, turns = excluded.turns, tools = excluded.tools, title = excluded.title",
+            (path, os.path.basename(path), _started(path, stat.st_mtime), stat.st_mtime, stat.st_size, indexed_bytes,
+             stat.st_ino, entries, turns, ",".join(sorted(tools)), title),
+        )
+
+    def remove(self, path):
+        """Forget a session (after its file is deleted)."""
+        with self.store.transaction() as conn:
+            self._delete_entries(conn, path)
+            conn.execute("DELETE FROM chat_sessions WHERE path = ?", (path,))
+
+    def delete(self, path):
+        """Delete a session file and its catalog entry."""
+        if os.path.exists(path):
+            os.remove(path)
+        self.remove(path)
+
+    # Reading
+
+    def count(self, query=None) -> int:
+        if not query:
+            return self.store.query("SELECT COUNT(*) FROM chat_sessions")[0][0]
+        return len(self._matching_paths(query))
+
+    def list(self, page=0, page_size=PAGE_SIZE, query=None) -> list:
+        """
+        One page of sessions, newest first, as dicts of their metadata. With `query`, only
+        sessions whose contents match it, each with a `snippet` of the best match.
+        """
+        columns = "path, name, started, updated, size, entries, turns, tools, title"
+        if not query:
+            rows = self.store.query(f"SELECT {columns} FROM chat_sessions ORDER BY started DESC, path DESC "
+                                    "LIMIT ? OFFSET ?", (page_size, page * page_size))
+            return [self._session(row) for row in rows]
+        matches = self._matching_paths(query)[page * page_size:(page + 1) * page_size]
+        sessions = []
+        for path, snippet in matches:
+            rows = self.store.query(f"SELECT {columns} FROM chat_sessions WHERE path = ?", (path,))
+            if rows:
+                sessions.append(dict(self._session(rows[0]), snippet=snippet))
+        return sessions
+
+    def _matching_paths(self, query) -> list:
+        """(path, snippet) of sessions matching `query`, best match first."""
+        if self.fts:
+            # Quote each word so user input can't break the FTS query syntax
+            terms = " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+            rows = self.store.query(
+                "SELECT e.path, snippet(chat_entries_fts, 0, '[', ']', '...', ?) FROM chat_entries_fts "
+                "JOIN chat_entries e ON e.id = chat_entries_fts.rowid "
+                "WHERE chat_entries_fts MATCH ? ORDER BY rank", (SNIPPET_TOKENS, terms))
+        else:
+            rows = self.store.query("SELECT path, substr(content, 1, 80) FROM chat_entries WHERE content LIKE ? "
+                                    "ORDER BY id DESC", (f"%{query}%",))
+        seen = {}
+        for path, snippet in rows:
+            seen.setdefault(path, snippet)
+        return list(seen.items())
+
+    def entries(self, path, offset=0, limit=PAGE_SIZE) -> list:
+        """A page of one session's entries ({"role", "content"}), in order."""
+        rows = self.store.query("SELECT role, content FROM chat_entries WHERE path = ? ORDER BY seq LIMIT ? OFFSET ?",
+                                (path, limit, offset))
+        return [{"role": role, "content": content} for role, content in rows]
+
+    @staticmethod
+    def _session(row) -> dict:
+        path, name, started, updated, size, entries, turns, tools, title = row
+        return {"path": path, "name": name, "started": started, "updated": updated, "size": size,
+                "entries": entries, "turns": turns, "tools": tools.split(",") if tools else [], "title": title}
+
+
+_catalog = None
+
+
+def get_catalog() -> SessionCatalog:
+    global _catalog
+    if _catalog is None:
+        _catalog = SessionCatalog()
+    return _catalog
+
+
+def reset_catalog():
+    """Forget the catalog (its store was closed); the next get_catalog() builds a fresh one."""
+    global _catalog
+    _catalog = None
@@ -0,0 +1,118 @@
+"""
+History compaction: keeps a session's live history small however long the install has run.
+
+Once a history passes `trigger_tokens`, everything except the most recent `keep_tokens` is
+folded by the local model into a rolling summary, a single {"role": "summary"} entry at the
+head of the history that prompts always keep. The raw turns move to the chat_archive table,
+so loading a session and building a prompt stay flat.
+
+Summarizing runs on a background thread after a request finishes, on a snapshot of the old
+turns. The result is only swapped into the live history when the next request for that
+session starts, on the event loop, before anything reads the history. The database rewrite is
+queued on the agent's persist thread, so it lands before that request's own save.
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from models.context import estimate_tokens, split_summary, SUMMARY_ROLE
+
+TRIGGER_TOKENS = 6000
+KEEP_TOKENS = 2000
+# Old turns are folded into the summary this many tokens at a time
+CHUNK_TOKENS = 3000
+
+
+def history_tokens(history) -> int:
+    return sum(estimate_tokens(str(e.get("content", ""))) for e in history)
+
+
+class HistoryCompactor:
+    def __init__(self, summarize, trigger_tokens=TRIGGER_TOKENS, keep_tokens=KEEP_TOKENS,
+                 chunk_tokens=CHUNK_TOKENS):
+        """
+        Args:
+            summarize: Callable(previous_summary, entries) -> updated summary text
+            trigger_tokens: History size that starts a compaction
+            keep_tokens: Recent history left as raw turns
+        """
+        self.summarize = summarize
+        self.trigger_tokens = trigger_tokens
+        self.keep_tokens = keep_tokens
+        self.chunk_tokens = chunk_tokens
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="compact")
+        self._lock = threading.Lock()
+        self._busy = set()  # sessions being summarized or waiting to be applied
+        self._pending = {}  # session -> (history, snapshot, summary entry)
+        self.errors = {}  # session -> last summarization error
+
+    def split_point(self, history) -> int:
+        """How many leading entries to compact: 0 below the trigger, else up to the user turn starting the kept part."""
+        if history_tokens(history) <= self.trigger_tokens:
+            return 0
+        kept = 0
+        index = len(history)
+        while index > 0 and kept + estimate_tokens(str(history[index - 1].get("content", ""))) <= self.keep_tokens:
+            index -= 1
+            kept += estimate_tokens(str(history[index].get("content", "")))
+        # Start the kept part at a user turn so no exchange is cut in half
+        while index > 0 and (index == len(history) or history[index].get("role") != "user"):
+            index -= 1
+        # A lone summary entry isn't worth re-summarizing
+        return index if index > 1 or (index == 1 and history[0].get("role") != SUMMARY_ROLE) else 0
+
+    def schedule(self, session, history):
+        """Start summarizing the old part of `history` in the background, if it's due. Call between requests."""
+        count = self.split_point(history)
+        with self._lock:
+            if count == 0 or session in self._busy:
+                return None
+            self._busy.add(session)
+        snapshot = history[:count]
+        return self.pool.submit(self._summarize, session, history, snapshot)
+
+    def _summarize(self, session, history, snapshot):
+        try:
+            summary, turns = split_summary(snapshot)
+            chunk, chunk_tokens = [], 0
+            for entry in turns:
+                chunk.append(entry)
+                chunk_tokens += estimate_tokens(str(entry.get("content", "")))
+                if chunk_tokens >= self.chunk_tokens:
+                    summary = self.summarize(summary, chunk)
+                    chunk, chunk_tokens = [], 0
+            if chunk:
+                summary = self.summarize(summary, chunk)
+            if not summary or not summary.strip():
+                raise ValueError("empty summary")
+        except Exception as e:
+            self.errors[session] = f"{type(e).__name__}: {e}"
+            with self._lock:
+                self._busy.discard(session)
+            return
+        archived = sum(1 for e in snapshot if e.get("role") != SUMMARY_ROLE)
+        previous = snapshot[0].get("turns", 0) if snapshot[0].get("role") == SUMMARY_ROLE else 0
+        entry = {"role": SUMMARY_ROLE, "content": summary.strip(), "turns": previous + archived, "updated": time.time()}
+        with self._lock:
+            self._pending[session] = (history, snapshot, entry)
+
+    def apply(self, session, history):
+        """
+        Swap a finished summary into `history` (call before the request reads it).
+        Returns (entries replaced, summary entry) to persist, or None.
+        """
+        with self._lock:
+            pending = self._pending.pop(session, None)
+            if pending is None:
+                return None
+            self._busy.discard(session)
+        target, snapshot, entry = pending
+        count = len(snapshot)
+        # Only if the history is the one summarized and its head hasn't been replaced since
+        if target is not history or len(history) < count or any(a is not b for a, b in zip(history, snapshot)):
+            return None
+        history[:count] = [entry]
+        return count, entry
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
@@ -0,0 +1,108 @@
+"""
+Batch executor: runs a plan's tool calls concurrently on a bounded thread pool.
+
+A batch plan looks like
+    {"tool": "batch", "calls": [
+        {"id": "a", "tool": "read_file", "args": {"path": "/etc/hosts"}},
+        {"id": "b", "tool": "run_command", "args": {"cmd": "uptime"}},
+        {"id": "c", "tool": "write_file", "args": {...}, "after": ["a"]}]}
+
+Calls start as soon as everything listed in `after` has finished. Each tool belongs to a
+concurrency class with its own limit, so GUI input stays strictly serialized while file,
+command and web work overlap. Results are reported in the order the calls were listed.
+"""
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Tools that drive the real mouse/keyboard/screen ("gui") must never overlap; each tool's
+# class comes from the tool registry (agent_core/tools.py)
+DEFAULT_CLASS = "io"
+CLASS_LIMITS = {"gui": 1, "llm": 2, "web": 2, "io": 8}
+MAX_WORKERS = 8
+
+
+def is_batch(plan) -> bool:
+    return isinstance(plan, dict) and isinstance(plan.get("calls"), list)
+
+
+def is_inquiry(result) -> bool:
+    """A question for the user, as returned by the inquiry tool."""
+    return isinstance(result, dict) and result.get("__type") == "inquiry"
+
+
+class BatchExecutor:
+    def __init__(self, run_one, max_workers=MAX_WORKERS, limits=None, classify=None):
+        """
+        Args:
+            run_one: Callable executing a single {"tool": ..., "args": ...} plan and returning its result
+            max_workers: Size of the shared thread pool
+            limits: Per-concurrency-class limits, defaults to CLASS_LIMITS
+            classify: Callable mapping a tool name to its concurrency class (default: everything is "io")
+        """
+        self.run_one = run_one
+        self.classify = classify or (lambda tool: DEFAULT_CLASS)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        self.semaphores = {
+            name: threading.BoundedSemaphore(limit)
+            for name, limit in (limits or CLASS_LIMITS).items()
+        }
+
+    def run(self, calls) -> list:
+        """Execute calls respecting `after` edges. Returns [(call, result), ...] in input order."""
+        calls = [dict(call, id=str(call.get("id", i + 1))) for i, call in enumerate(calls)]
+        by_id = {call["id"]: call for call in calls}
+        results = {}
+        pending = {call["id"] for call in calls}
+        running = {}
+        while pending or running:
+            for call_id in [call["id"] for call in calls if call["id"] in pending]:
+                deps = [str(d) for d in by_id[call_id].get("after", []) or []]
+                missing = [d for d in deps if d not in by_id]
+                if missing:
+                    results[call_id] = f"Skipped: unknown dependency {', '.join(missing)}"
+                    pending.discard(call_id)
+                elif all(d in results for d in deps):
+                    # Run in a copy of the caller's context so cancel tokens and trace spans carry over
+                    ctx = contextvars.copy_context()
+                    running[self.pool.submit(ctx.run, self._run_limited, by_id[call_id])] = call_id
+                    pending.discard(call_id)
+            if not running:
+                # Remaining calls wait on each other: a dependency cycle
+                for call_id in pending:
+                    results[call_id] = "Skipped: dependency cycle"
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                call_id = running.pop(future)
+                try:
+                    results[call_id] = future.result()
+                except Exception as e:
+                    results[call_id] = f"Error in tool execution: {e}"
+        return [(call, results[call["id"]]) for call in calls]
+
+    def run_single(self, call):
+        """Execute one call under its class limit, so e.g. GUI calls from concurrent sessions never interleave."""
+        return self._run_limited(call)
+
+    def _run_limited(self, call):
+        if is_batch(call):
+            return "Error in tool execution: nested batches are not supported"
+        semaphore = self.semaphores.get(self.classify(call.get("tool")))
+        if semaphore is None:
+            return self.run_one(call)
+        with semaphore:
+            return self.run_one(call)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
+
+
+def format_batch_results(pairs) -> str:
+    """Aggregate batch results into one observation for the model."""
+    parts = []
+    for call, result in pairs:
+        if is_inquiry(result):
+            result = f"(question for user) {result['text']}"
+        parts.append(f"[{call['id']}] {call.get('tool')}: {result}")
+    return "\n".join(parts)
@@ -0,0 +1,147 @@
+"""
+History log: append-only JSONL storage for chat sessions.
+
+Each turn is written with a single append (plus an optional fsync) instead of rewriting the
+whole file. A crash can at worst leave a torn last line, which is skipped on load. When the
+caller replaces history instead of extending it, a reset record is appended and the file is
+compacted later on a background thread.
+"""
+import os
+import json
+import threading
+
+RESET_RECORD = {"__reset": True}
+
+
+class SessionLog:
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._compacting = None
+        self._tail_checked = False
+        self.count = None  # live entries on disk, computed on first use
+        self._head = None  # first live entry on disk, serialized
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def iter_entries(self):
+        """
+        Lazily yield the live entries in order. A quick first pass finds where the last reset
+        record ends, so entries are then streamed from there without being held in memory.
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            start = self._live_offset(f)
+            f.seek(start)
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn write from a crash
+                if entry != RESET_RECORD:
+                    yield entry
+
+    @staticmethod
+    def _live_offset(f) -> int:
+        """Byte offset just past the last reset record (0 if there is none)."""
+        offset = start = 0
+        for line in f:
+            offset += len(line)
+            # Cheap substring test first; only candidate lines are parsed
+            if b'"__reset"' in line:
+                try:
+                    if json.loads(line) == RESET_RECORD:
+                        start = offset
+                except ValueError:
+                    pass
+        return start
+
+    def load(self) -> list:
+        entries = list(self.iter_entries())
+        self.count = len(entries)
+        self._head = json.dumps(entries[0]) if entries else None
+        return entries
+
+    def append(self, entries):
+        """Append entries with one write call."""
+        if not entries:
+            return
+        data = "".join(json.dumps(e) + "\n" for e in entries)
+        with self._lock:
+            self._write(data)
+            if self.count is not None:
+                if self.count == 0:
+                    self._head = json.dumps(entries[0])
+                self.count += len(entries)
+
+    def sync(self, history):
+        """
+        Persist `history`, appending only entries that are not on disk yet. If it no longer
+        extends what is on disk (shortened, or its head summarized away by compaction), the
+        log starts over from it.
+        """
+        if self.count is None:
+            self.count = 0
+            for entry in self.iter_entries():
+                if not self.count:
+                    self._head = json.dumps(entry)
+                self.count += 1
+        if len(history) >= self.count and (not self.count or json.dumps(history[0]) == self._head):
+            self.append(history[self.count:])
+            return
+        # History was shortened or replaced: start over after a reset marker
+        data = json.dumps(RESET_RECORD) + "\n" + "".join(json.dumps(e) + "\n" for e in history)
+        with self._lock:
+            self._write(data)
+            self.count = len(history)
+            self._head = json.dumps(history[0]) if history else None
+        self.compact_in_background()
+
+    def compact(self):
+        """Rewrite the file with only live entries, dropping reset records and torn lines."""
+        with self._lock:
+            entries = list(self.iter_entries())
+            tmp = self.path + ".tmp"
+            with open(tmp, 'w') as f:
+                for e in entries:
+                    f.write(json.dumps(e) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self.count = len(entries)
+            self._head = json.dumps(entries[0]) if entries else None
+            self._tail_checked = True
+
+    def compact_in_background(self):
+        if self._compacting is not None and self._compacting.is_alive():
+            return self._compacting
+        self._compacting = threading.Thread(target=self.compact, daemon=True)
+        self._compacting.start()
+        return self._compacting
+
+    def _write(self, data):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if not self._tail_checked:
+            # Terminate a torn last line so the new records start on their own line
+            self._tail_checked = True
+            if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+                with open(self.path, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        data = "\n" + data
+        with open(self.path, 'a') as f:
+            f.write(data)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def read_session(path) -> list:
+    """Load a saved session, accepting both JSONL logs and legacy pretty-printed JSON files."""
+    if path.endswith('.jsonl'):
+        return SessionLog(path).load()
+    with open(path, 'r') as f:
+        return json.load(f)
@@ -1,78 +1,365 @@
 """
 Memory module: Stores context, previous actions, and user preferences.
+
+Everything lives in one SQLite database (cache/commander.db) in WAL mode, so mutations are
+small transactional writes and several agent processes can share it safely. Data from the
+old per-kind JSON files is imported once by `migrate_json_files`.
+
+Key/value memory and notes can be scoped to a namespace (`use_namespace`, e.g. one per server
+session); the RAG documents are shared by everyone.
 """
 import os
 import json
+import time
+import sqlite3
+import threading
+import contextvars
+from contextlib import contextmanager
 
+from agent_core.retrieval import RetrievalEngine
 
-MEMORY_FILE = os.path.join(os.path.dirname(__file__), '../cache/memory.json')
-NOTEPAD_FILE = os.path.join(os.path.dirname(__file__), '../cache/notepad.json')
-RAG_FILE = os.path.join(os.path.dirname(__file__), '../cache/rag.json')
-CHAT_HISTORY_FILE = os.path.join(os.path.dirname(__file__), '../cache/chat_history.json')
+CACHE_DIR = os.path.join(os.path.dirname(__file__), '../cache')
+DB_FILE = os.path.join(CACHE_DIR, 'commander.db')
+RAG_INDEX_DIR = os.path.join(CACHE_DIR, 'rag_index')
 
-def load_memory():
-    if os.path.exists(MEMORY_FILE):
-        with open(MEMORY_FILE, 'r') as f:
+# Legacy JSON stores, only read by the migrator
+MEMORY_FILE = os.path.join(CACHE_DIR, 'memory.json')
+NOTEPAD_FILE = os.path.join(CACHE_DIR, 'notepad.json')
+RAG_FILE = os.path.join(CACHE_DIR, 'rag.json')
+RAG_DOCS_FILE = os.path.join(RAG_INDEX_DIR, 'docs.jsonl')
+CHAT_HISTORY_FILE = os.path.join(CACHE_DIR, 'chat_history.jsonl')
+LEGACY_CHAT_HISTORY_FILE = os.path.join(CACHE_DIR, 'chat_history.json')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS notes (id INTEGER PRIMARY KEY, text TEXT NOT NULL, created REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS rag_docs (id INTEGER PRIMARY KEY, text TEXT NOT NULL, created REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS chat (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    entry TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS chat_session_seq ON chat (session, seq);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS ns_kv (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE TABLE IF NOT EXISTS ns_notes (
+    id INTEGER PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ns_notes_namespace ON ns_notes (namespace, id);
+CREATE TABLE IF NOT EXISTS chat_archive (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL,
+    entry TEXT NOT NULL,
+    archived REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chat_archive_session ON chat_archive (session, id);
+"""
+
+
+class MemoryStore:
+    """SQLite storage with one connection per thread and explicit transactions."""
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self._local = threading.local()
+        self._conns = []  # every thread's connection, so close() can reach them all
+        self._conns_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn().executescript(SCHEMA)
+
+    def conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Still used by one thread only; check_same_thread=False just lets close() run elsewhere
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    def close(self):
+        """Close the connections of all threads. The store must not be used afterwards."""
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT: takes the write lock up front so concurrent writers queue."""
+        conn = self.conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def query(self, sql, params=()):
+        return self.conn().execute(sql, params).fetchall()
+
+    # Key/value memory; namespace None is the shared store
+    def load_kv(self, namespace=None) -> dict:
+        if namespace is None:
+            rows = self.query("SELECT key, value FROM kv")
+        else:
+            rows = self.query("SELECT key, value FROM ns_kv WHERE namespace = ?", (namespace,))
+        return {key: json.loads(value) for key, value in rows}
+
+    def save_kv(self, data: dict, namespace=None):
+        values = [(key, json.dumps(value, default=str)) for key, value in data.items()]
+        with self.transaction() as conn:
+            if namespace is None:
+                # Other processes write the shared store too: upsert what changed, never drop keys
+                # this caller simply didn't load
+                existing = dict(conn.execute("SELECT key, value FROM kv"))
+                conn.executemany(
+                    "INSERT INTO kv (key, value) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                    [(key, value) for key, value in values if existing.get(key) != value],
+                )
+                return
+            conn.execute("DELETE FROM ns_kv WHERE namespace = ?", (namespace,))
+            conn.executemany("INSERT INTO ns_kv (namespace, key, value) VALUES (?, ?, ?)",
+                             [(namespace, key, value) for key, value in values])
+
+    # Notes and RAG documents
+    def add_note(self, text: str, namespace=None):
+        with self.transaction() as conn:
+            if namespace is None:
+                conn.execute("INSERT INTO notes (text, created) VALUES (?, ?)", (text, time.time()))
+            else:
+                conn.execute("INSERT INTO ns_notes (namespace, text, created) VALUES (?, ?, ?)",
+                             (namespace, text, time.time()))
+
+    def notes(self, namespace=None) -> list:
+        if namespace is None:
+            return [row[0] for row in self.query("SELECT text FROM notes ORDER BY id")]
+        rows = self.query("SELECT text FROM ns_notes WHERE namespace = ? ORDER BY id", (namespace,))
+        return [row[0] for row in rows]
+
+    def delete_session(self, session):
+        """Drop a session's chat history and its namespaced memory."""
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM chat WHERE session = ?", (session,))
+            conn.execute("DELETE FROM chat_archive WHERE session = ?", (session,))
+            conn.execute("DELETE FROM ns_kv WHERE namespace = ?", (session,))
+            conn.execute("DELETE FROM ns_notes WHERE namespace = ?", (session,))
+
+    # Chat history, one row per entry
+    def load_chat(self, session) -> list:
+        rows = self.query("SELECT entry FROM chat WHERE session = ? ORDER BY seq", (session,))
+        return [json.loads(row[0]) for row in rows]
+
+    def sync_chat(self, session, history):
+        """Insert entries beyond what is stored; rewrite the session only if history shrank."""
+        with self.transaction() as conn:
+            stored = conn.execute("SELECT COUNT(*) FROM chat WHERE session = ?", (session,)).fetchone()[0]
+            if len(history) < stored:
+                conn.execute("DELETE FROM chat WHERE session = ?", (session,))
+                stored = 0
+            conn.executemany(
+                "INSERT INTO chat (session, seq, entry) VALUES (?, ?, ?)",
+                [(session, i, json.dumps(e, default=str)) for i, e in enumerate(history[stored:], start=stored)],
+            )
+
+    def compact_chat(self, session, count, summary):
+        """
+        Move the first `count` entries of a session to chat_archive and put `summary` (a history
+        entry) in their place, renumbering the rest so sync_chat keeps appending after them.
+        """
+        with self.transaction() as conn:
+            now = time.time()
+            conn.execute(
+                "INSERT INTO chat_archive (session, entry, archived) "
+                "SELECT session, entry, ? FROM chat WHERE session = ? AND seq < ? ORDER BY seq",
+                (now, session, count),
+            )
+            conn.execute("DELETE FROM chat WHERE session = ? AND seq < ?", (session, count))
+            # Through negative numbers, so no row collides with another mid-update
+            conn.execute("UPDATE chat SET seq = -(seq - ?) - 2 WHERE session = ?", (count, session))
+            conn.execute("UPDATE chat SET seq = -seq - 1 WHERE session = ?", (session,))
+            conn.execute("INSERT INTO chat (session, seq, entry) VALUES (?, 0, ?)",
+                         (session, json.dumps(summary, default=str)))
+
+    def archived_chat(self, session) -> list:
+        rows = self.query("SELECT entry FROM chat_archive WHERE session = ? ORDER BY id", (session,))
+        return [json.loads(row[0]) for row in rows]
+
+    def get_meta(self, key):
+        rows = self.query("SELECT value FROM meta WHERE key = ?", (key,))
+        return rows[0][0] if rows else None
+
+    def set_meta(self, key, value):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, str(value)),
+            )
+
+
+class SqliteDocs:
+    """RAG document source for RetrievalEngine. Document id = rowid - 1."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def append(self, text: str) -> int:
+        with self.store.transaction() as conn:
+            cur = conn.execute("INSERT INTO rag_docs (text, created) VALUES (?, ?)", (text, time.time()))
+            return cur.lastrowid - 1
+
+    def count(self) -> int:
+        return self.store.query("SELECT COALESCE(MAX(id), 0) FROM rag_docs")[0][0]
+
+    def iter_texts(self, start=0):
+        rows = self.store.query("SELECT text FROM rag_docs WHERE id > ? ORDER BY id", (start,))
+        return (row[0] for row in rows)
+
+
+def migrate_json_files(store):
+    """One-shot import of the legacy JSON files. Imported files are renamed to *.migrated."""
+    if store.get_meta('json_migrated'):
+        return
+    from agent_core.history import SessionLog
+
+    def read_json(path, default):
+        if not os.path.exists(path):
+            return default
+        with open(path, 'r') as f:
             return json.load(f)
-    return {}
+
+    def retire(path):
+        if os.path.exists(path):
+            os.rename(path, path + '.migrated')
+
+    data = read_json(MEMORY_FILE, {})
+    notes = read_json(NOTEPAD_FILE, [])
+    rag_texts = [item["text"] for item in read_json(RAG_FILE, [])]
+    if os.path.exists(RAG_DOCS_FILE):
+        rag_texts += [doc["text"] for doc in SessionLog(RAG_DOCS_FILE).iter_entries()]
+    history = read_json(LEGACY_CHAT_HISTORY_FILE, [])
+    if os.path.exists(CHAT_HISTORY_FILE):
+        history = SessionLog(CHAT_HISTORY_FILE).load()
+
+    now = time.time()
+    with store.transaction() as conn:
+        # Re-check under the write lock in case another process migrated first
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+            return
+        conn.executemany(
+            "INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)",
+            [(k, json.dumps(v, default=str)) for k, v in data.items()],
+        )
+        conn.executemany("INSERT INTO notes (text, created) VALUES (?, ?)", [(n, now) for n in notes])
+        conn.executemany("INSERT INTO rag_docs (text, created) VALUES (?, ?)", [(t, now) for t in rag_texts])
+        conn.executemany(
+            "INSERT INTO chat (session, seq, entry) VALUES (?, ?, ?)",
+            [(DEFAULT_SESSION, i, json.dumps(e, default=str)) for i, e in enumerate(history)],
+        )
+        conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (str(now),))
+    for path in (MEMORY_FILE, NOTEPAD_FILE, RAG_FILE, RAG_DOCS_FILE, CHAT_HISTORY_FILE, LEGACY_CHAT_HISTORY_FILE):
+        retire(path)
+
+
+DEFAULT_SESSION = 'default'
+
+_store = None
+_store_lock = threading.Lock()
+_rag_engine = None
+_embedder = (None, None)
+# Memory namespace for the running request (None = shared); worker threads inherit it
+_namespace = contextvars.ContextVar("memory_namespace", default=None)
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MemoryStore()
+            migrate_json_files(_store)
+        return _store
+
+def close_store():
+    """Close the database and RAG index (e.g. before deleting cache/); both reopen on next use."""
+    global _store, _rag_engine
+    with _store_lock:
+        if _rag_engine is not None:
+            _rag_engine.close()
+        if _store is not None:
+            _store.close()
+        _store = _rag_engine = None
+
+@contextmanager
+def use_namespace(namespace):
+    """Scope key/value memory and notes to `namespace` (None = shared) within the block."""
+    token = _namespace.set(namespace)
+    try:
+        yield
+    finally:
+        _namespace.reset(token)
+
+def current_namespace():
+    return _namespace.get()
+
+def load_memory():
+    return get_store().load_kv(_namespace.get())
 
 def save_memory(memory):
-    with open(MEMORY_FILE, 'w') as f:
-        json.dump(memory, f)
+    get_store().save_kv(memory, _namespace.get())
 
 # Notepad memory: persistent notes
 def add_to_notepad(note: str):
-    notes = []
-    if os.path.exists(NOTEPAD_FILE):
-        with open(NOTEPAD_FILE, 'r') as f:
-            notes = json.load(f)
-    notes.append(note)
-    with open(NOTEPAD_FILE, 'w') as f:
-        json.dump(notes, f)
+    get_store().add_note(note, _namespace.get())
 
 def get_notepad():
-    if os.path.exists(NOTEPAD_FILE):
-        with open(NOTEPAD_FILE, 'r') as f:
-            return json.load(f)
-    return []
+    return get_store().notes(_namespace.get())
+
+# RAG memory: BM25 index with optional embedding search (see agent_core/retrieval.py)
+def set_embedder(embed_fn, dim):
+    """Enable vector search; must be called before the first RAG access."""
+    global _embedder
+    _embedder = (embed_fn, dim)
+
+def _rag():
+    global _rag_engine
+    if _rag_engine is None:
+        _rag_engine = RetrievalEngine(RAG_INDEX_DIR, *_embedder, docs=SqliteDocs(get_store()))
+    return _rag_engine
 
-# RAG memory: efficient retrieval-augmented memory
 def add_to_rag(text: str):
-    # For simplicity, store as list of dicts with text and embedding (embedding is a placeholder)
-    rag = []
-    if os.path.exists(RAG_FILE):
-        with open(RAG_FILE, 'r') as f:
-            rag = json.load(f)
-    rag.append({"text": text})
-    with open(RAG_FILE, 'w') as f:
-        json.dump(rag, f)
-
-def rag_query(query: str):
-    # Simple RAG: return the most relevant note by string match (can be replaced with embedding search)
-    if not os.path.exists(RAG_FILE):
-        return "[No RAG memory yet]"
-    with open(RAG_FILE, 'r') as f:
-        rag = json.load(f)
-    # Find the note with the most word overlap
-    query_words = set(query.lower().split())
-    best = None
-    best_score = 0
-    for item in rag:
-        item_words = set(item["text"].lower().split())
-        score = len(query_words & item_words)
-        if score > best_score:
-            best = item["text"]
-            best_score = score
-    return best if best else "[No relevant memory found]"
-
-# Chat history persistence
-def load_chat_history():
-    if os.path.exists(CHAT_HISTORY_FILE):
-        with open(CHAT_HISTORY_FILE, 'r') as f:
-            return json.load(f)
-    return []
+    _rag().add(text)
+
+def rag_query(query: str, k: int = 5):
+    """Return up to k {"text", "score"} matches, best first."""
+    return _rag().search(query, k)
+
+# Chat history persistence: one row per entry, only new entries are inserted
+def load_chat_history(session=DEFAULT_SESSION):
+    return get_store().load_chat(session)
+
+def save_chat_history(history, session=DEFAULT_SESSION):
+    get_store().sync_chat(session, history)
+
+def delete_session(session):
+    get_store().delete_session(session)
+
+def compact_chat_history(session, count, summary):
+    get_store().compact_chat(session, count, summary)
 
-def save_chat_history(history):
-    os.makedirs(os.path.dirname(CHAT_HISTORY_FILE), exist_ok=True)
-    with open(CHAT_HISTORY_FILE, 'w') as f:
-        json.dump(history, f, indent=2)
+def load_archived_chat(session=DEFAULT_SESSION):
+    """Turns moved out of a session's history by compaction, oldest first."""
+    return get_store().archived_chat(session)
@@ -0,0 +1,297 @@
+"""
+Retrieval engine for RAG memory: BM25 inverted index plus an optional embedding index.
+
+Documents come from a pluggable source (the SQLite store in agent_core/memory.py, or an
+append-only JSONL log by default). The inverted index is kept in memory, snapshotted to disk
+every few hundred additions, and rebuilt on load from the snapshot plus any documents added
+after it, so `add` never rewrites the whole store. Documents added by other processes are
+picked up before each search.
+"""
+import os
+import re
+import json
+import math
+import heapq
+import threading
+from collections import Counter
+
+from agent_core.history import SessionLog
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str):
+    return _TOKEN_RE.findall(text.lower())
+
+
+class JsonlDocs:
+    """
+    Document source backed by an append-only JSONL log. Positions are document ids.
+
+    The number of documents read so far is kept with the byte offset they end at, so catching
+    up seeks there and parses only the lines appended since, by this or another process (a
+    file size past the offset means there is something new).
+    """
+
+    def __init__(self, path):
+        self.log = SessionLog(path)
+        self._read = (0, 0)  # (documents, byte offset just past the last one)
+
+    def append(self, text: str) -> int:
+        n = self.count()
+        self.log.append([{"text": text}])
+        return n
+
+    def count(self) -> int:
+        count, offset = self._read
+        if self._size() == offset:
+            return count
+        # Count without moving the mark: the caller reads the new documents next
+        return count + sum(1 for _ in self._lines(offset))
+
+    def iter_texts(self, start=0):
+        count, offset = self._read
+        if start < count:
+            count, offset = 0, 0
+        for end, text in self._lines(offset):
+            if count >= start:
+                yield text
+            count += 1
+            if count > self._read[0]:
+                self._read = (count, end)
+
+    def _size(self) -> int:
+        try:
+            size = os.path.getsize(self.log.path)
+        except OSError:
+            size = 0
+        if size < self._read[1]:
+            self._read = (0, 0)  # replaced or truncated: start over
+        return size
+
+    def _lines(self, offset):
+        """(end offset, text) of each complete document line from `offset` on."""
+        if not os.path.exists(self.log.path):
+            return
+        with open(self.log.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    return  # still being written
+                offset += len(line)
+                try:
+                    doc = json.loads(line)
+                except ValueError:
+                    continue  # torn write from a crash
+                if isinstance(doc, dict) and "text" in doc:
+                    yield offset, doc["text"]
+
+
+class BM25Index:
+    def __init__(self, index_dir, docs=None, k1=1.5, b=0.75, snapshot_every=200):
+        self.index_dir = index_dir
+        self.k1 = k1
+        self.b = b
+        self.snapshot_every = snapshot_every
+        self.docs = docs or JsonlDocs(os.path.join(index_dir, 'docs.jsonl'))
+        self.snapshot_file = os.path.join(index_dir, 'bm25.json')
+        self.texts = []
+        self.doc_lens = []
+        self.postings = {}  # term -> {doc_id: term frequency}
+        self.total_len = 0
+        self._unsnapshotted = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, text: str) -> int:
+        with self._lock:
+            doc_id = self.docs.append(text)
+            self._catch_up()
+            return doc_id
+
+    def refresh(self):
+        """Index documents added to the source since the last call (e.g. by another process)."""
+        with self._lock:
+            self._catch_up()
+
+    def search(self, query: str, k=5):
+        """Return up to k (doc_id, score) pairs, best first."""
+        self.refresh()
+        terms = set(tokenize(query))
+        n = len(self.texts)
+        if not terms or not n:
+            return []
+        avg_len = self.total_len / n
+        scores = Counter()
+        for term in terms:
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lens[doc_id] / avg_len)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def save_snapshot(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        tmp = self.snapshot_file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({"n_docs": len(self.texts), "doc_lens": self.doc_lens, "postings": self.postings}, f)
+        os.replace(tmp, self.snapshot_file)
+        self._unsnapshotted = 0
+
+    def _index(self, doc_id, text):
+        counts = Counter(tokenize(text))
+        self.texts.append(text)
+        length = sum(counts.values())
+        self.doc_lens.append(length)
+        self.total_len += length
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+
+    def _catch_up(self):
+        if self.docs.count() <= len(self.texts):
+            return
+        for text in self.docs.iter_texts(start=len(self.texts)):
+            self._index(len(self.texts), text)
+            self._unsnapshotted += 1
+        if self._unsnapshotted >= self.snapshot_every:
+            self.save_snapshot()
+
+    def _load(self):
+        texts = list(self.docs.iter_texts())
+        snapshot = None
+        if os.path.exists(self.snapshot_file):
+            try:
+                with open(self.snapshot_file, 'r') as f:
+                    snapshot = json.load(f)
+            except ValueError:
+                snapshot = None
+        start = 0
+        if snapshot and snapshot["n_docs"] <= len(texts):
+            start = snapshot["n_docs"]
+            self.texts = texts[:start]
+            self.doc_lens = snapshot["doc_lens"]
+            self.total_len = sum(self.doc_lens)
+            self.postings = {
+                term: {int(doc_id): tf for doc_id, tf in posting.items()}
+                for term, posting in snapshot["postings"].items()
+            }
+        for doc_id in range(start, len(texts)):
+            self._index(doc_id, texts[doc_id])
+        self._unsnapshotted = len(texts) - start
+
+
+class VectorIndex:
+    """
+    Dense embedding index stored as a float32 memory-mapped matrix (one row per document).
+    Rows are L2-normalized on insert so search is a single matrix-vector product.
+    Requires NumPy; callers should check `VectorIndex.available()`.
+    """
+
+    def __init__(self, index_dir, dim):
+        import numpy as np
+        self.np = np
+        self.path = os.path.join(index_dir, f'vectors_{dim}.f32')
+        self.dim = dim
+        self._matrix = None
+        self._lock = threading.Lock()
+        os.makedirs(index_dir, exist_ok=True)
+
+    @staticmethod
+    def available() -> bool:
+        try:
+            import numpy  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def __len__(self):
+        if not os.path.exists(self.path):
+            return 0
+        return os.path.getsize(self.path) // (4 * self.dim)
+
+    def add(self, vector, doc_id=None):
+        """Append a row. If doc_id is given, zero rows are padded in so row index == doc id."""
+        np = self.np
+        vec = np.asarray(vector, dtype=np.float32).reshape(self.dim)
+        norm = np.linalg.norm(vec)
+        if norm:
+            vec = vec / norm
+        with self._lock:
+            rows = len(self)
+            with open(self.path, 'ab') as f:
+                if doc_id is not None and doc_id > rows:
+                    f.write(np.zeros((doc_id - rows, self.dim), dtype=np.float32).tobytes())
+                f.write(vec.tobytes())
+            self._matrix = None
+
+    def search(self, vector, k=5):
+        """Return up to k (row, cosine similarity) pairs, best first."""
+        np = self.np
+        with self._lock:
+            if self._matrix is None:
+                rows = len(self)
+                if not rows:
+                    return []
+                self._matrix = np.memmap(self.path, dtype=np.float32, mode='r', shape=(rows, self.dim))
+            matrix = self._matrix
+        query = np.asarray(vector, dtype=np.float32).reshape(self.dim)
+        norm = np.linalg.norm(query)
+        if not norm:
+            return []
+        sims = matrix @ (query / norm)
+        k = min(k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [(int(i), float(sims[i])) for i in top]
+
+    def close(self):
+        with self._lock:
+            self._matrix = None  # drops the memory map
+
+
+class RetrievalEngine:
+    """BM25 search with optional embedding search, merged by reciprocal rank fusion."""
+
+    def __init__(self, index_dir, embedder=None, embed_dim=None, docs=None):
+        self.bm25 = BM25Index(index_dir, docs=docs)
+        self.embedder = embedder
+        self.vectors = None
+        if embedder and embed_dim and VectorIndex.available():
+            self.vectors = VectorIndex(index_dir, embed_dim)
+
+    def __len__(self):
+        return len(self.bm25)
+
+    def close(self):
+        if self.vectors is not None:
+            self.vectors.close()
+
+    def add(self, text: str) -> int:
+        doc_id = self.bm25.add(text)
+        if self.vectors is not None:
+            try:
+                self.vectors.add(self.embedder(text), doc_id=doc_id)
+            except Exception:
+                pass  # embedding backend down: keyword search still works
+        return doc_id
+
+    def search(self, query: str, k=5):
+        """Return up to k {"text", "score"} dicts, best first."""
+        lexical = self.bm25.search(query, k * 2 if self.vectors is not None else k)
+        if self.vectors is None:
+            return [{"text": self.bm25.texts[i], "score": round(s, 4)} for i, s in lexical]
+        try:
+            dense = [(i, s) for i, s in self.vectors.search(self.embedder(query), k * 2) if i < len(self.bm25)]
+        except Exception:
+            dense = []
+        fused = Counter()
+        for ranking in (lexical, dense):
+            for rank, (doc_id, _) in enumerate(ranking):
+                fused[doc_id] += 1.0 / (60 + rank)
+        return [{"text": self.bm25.texts[i], "score": round(s, 4)} for i, s in fused.most_common(k)]
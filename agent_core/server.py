@@ -0,0 +1,511 @@
+"""
+Service mode: drive one warm Agent from other local programs over HTTP and WebSocket.
+
+    python main.py --serve --port 8765 --workers 4
+
+All sessions share the agent (and with it the loaded model, response cache and browser pool).
+Each session has its own history and memory namespace, and a bounded FIFO queue. Its requests
+run one after another, so a conversation stays in order. At most `workers` requests run at
+once across sessions. A full session queue is answered with 429 and a Retry-After header.
+
+    GET    /health
+    GET    /sessions                          list sessions
+    POST   /sessions            {"name"}      create (name optional)
+    GET    /sessions/<name>                   state, queue and recent requests
+    DELETE /sessions/<name>[?purge=1]         close; purge also deletes its history and memory
+    POST   /sessions/<name>/requests {"request", "wait"}
+                                              queue a request: 202 {"id"}, or 200 with the result when wait
+    GET    /sessions/<name>/requests/<id>     request status and result
+    POST   /sessions/<name>/cancel            cancel the running request
+    GET    /sessions/<name>/events            WebSocket: JSON events (queued, started, plan,
+                                              result, done, error, cancelled); send
+                                              {"request": "..."} to queue a request
+
+Sessions are created on first use. Their history, memory and shell are stored under
+`srv:<name>`, so a server session never shares state with the CLI's default session (the
+name `default` itself is refused). A WebSocket client that reads too slowly to keep up with
+its event buffer is disconnected (close code 1008) instead of holding events in memory.
+Every call needs `Authorization: Bearer <token>` (WebSockets may pass ?token=). The token is
+--token or COMMANDER_TOKEN, else a random one written to cache/server_token (mode 0600).
+Browsers are kept out: a request whose Origin is not a loopback page, or whose Host is not the
+address served on (DNS rebinding), gets 403, and bodies must be `application/json`, which a
+cross-origin page cannot send without a preflight. Only stdlib asyncio is used: HTTP/1.1 with
+one request per connection, and RFC 6455 text frames.
+"""
+import os
+import json
+import time
+import uuid
+import base64
+import struct
+import asyncio
+import hashlib
+import secrets
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from agent_core import memory, blobs
+from modules import command
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 4
+SESSION_QUEUE = 8
+MAX_SESSIONS = 64
+EVENT_BUFFER = 256
+REQUESTS_KEPT = 50
+MAX_BODY = 1024 * 1024
+RETRY_AFTER = 1
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+# Storage key prefix for server sessions (history, memory namespace, shell)
+SESSION_PREFIX = "srv:"
+TOKEN_FILE = os.path.join(memory.CACHE_DIR, "server_token")
+LOOPBACK_HOSTS = ("localhost", "127.0.0.1", "::1")
+WILDCARD_HOSTS = ("0.0.0.0", "::", "")
+
+STATUS_TEXT = {200: "OK", 201: "Created", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized",
+               403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+               415: "Unsupported Media Type", 429: "Too Many Requests", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class _Subscriber:
+    def __init__(self):
+        self.queue = asyncio.Queue(EVENT_BUFFER)
+        self.overflowed = False
+
+
+class ServerSession:
+    """One client conversation: its AgentSession, request queue, request records and event subscribers."""
+
+    def __init__(self, name, queue_size=SESSION_QUEUE):
+        from agent_core.async_agent import AgentSession
+        self.name = name
+        self.key = SESSION_PREFIX + name
+        self.agent_session = AgentSession(self.key, namespace=self.key, on_event=self.publish)
+        self.queue = asyncio.Queue(queue_size)
+        self.requests = OrderedDict()  # id -> record
+        self.subscribers = set()
+        self.running = None  # (record, task) of the request being run
+        self.consumer = None
+        self.created = time.time()
+
+    def publish(self, event):
+        # Clients know the session by its name, not the storage key the agent reports
+        event["session"] = self.name
+        if self.running is not None:
+            event.setdefault("id", self.running[0]["id"])
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscriber.overflowed = True
+                self.subscribers.discard(subscriber)
+
+    def submit(self, text) -> dict:
+        record = {"id": uuid.uuid4().hex[:12], "request": text, "status": "queued", "queued_at": time.time(),
+                  "done": asyncio.get_running_loop().create_future()}
+        try:
+            self.queue.put_nowait(record)
+        except asyncio.QueueFull:
+            raise HTTPError(429, f"Session {self.name} has {self.queue.qsize()} requests queued; retry later",
+                            {"Retry-After": str(RETRY_AFTER)})
+        self.requests[record["id"]] = record
+        while len(self.requests) > REQUESTS_KEPT:
+            oldest = next(iter(self.requests.values()))
+            if oldest["status"] in ("queued", "running"):
+                break
+            self.requests.popitem(last=False)
+        self.publish({"type": "queued", "session": self.name, "id": record["id"], "position": self.queue.qsize()})
+        return record
+
+    def info(self) -> dict:
+        return {
+            "name": self.name,
+            "queued": self.queue.qsize(),
+            "running": self.running[0]["id"] if self.running else None,
+            "history_entries": len(self.agent_session.history),
+            "subscribers": len(self.subscribers),
+            "created": self.created,
+        }
+
+
+def public(record) -> dict:
+    return {k: v for k, v in record.items() if k != "done"}
+
+
+class AgentServer:
+    def __init__(self, agent, host=DEFAULT_HOST, port=DEFAULT_PORT, workers=DEFAULT_WORKERS,
+                 queue_size=SESSION_QUEUE, max_sessions=MAX_SESSIONS, token=None):
+        """
+        Args:
+            agent: The shared Agent
+            workers: Requests allowed to run at once across all sessions
+            queue_size: Requests a session may have waiting before 429s
+            token: Bearer token required on every call (None = generate one)
+        """
+        self.agent = agent
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_sessions = max_sessions
+        self.token = token or secrets.token_urlsafe(24)
+        self.sessions = {}
+        self.slots = None
+        self.server = None
+
+    async def start(self):
+        self.slots = asyncio.Semaphore(self.workers)
+        self.server = await asyncio.start_server(self._connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        for name in list(self.sessions):
+            await self.close_session(name)
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    # Sessions
+
+    def session(self, name, create=True) -> ServerSession:
+        session = self.sessions.get(name)
+        if session is None:
+            if not create:
+                raise HTTPError(404, f"No session {name}")
+            if name == memory.DEFAULT_SESSION:
+                raise HTTPError(400, f"Session name {name!r} is reserved")
+            if len(self.sessions) >= self.max_sessions:
+                raise HTTPError(503, f"Session limit ({self.max_sessions}) reached", {"Retry-After": str(RETRY_AFTER)})
+            session = ServerSession(name, self.queue_size)
+            session.consumer = asyncio.get_running_loop().create_task(self._consume(session))
+            self.sessions[name] = session
+        return session
+
+    async def close_session(self, name, purge=False):
+        session = self.sessions.pop(name, None)
+        if session is None:
+            raise HTTPError(404, f"No session {name}")
+        session.consumer.cancel()
+        await asyncio.gather(session.consumer, return_exceptions=True)
+        # Requests still waiting in the queue never start: answer their waiters
+        while not session.queue.empty():
+            self._finish(session, session.queue.get_nowait(), "cancelled", time.perf_counter())
+        for subscriber in list(session.subscribers):
+            subscriber.overflowed = subscriber.queue.full()
+            if not subscriber.overflowed:
+                subscriber.queue.put_nowait(None)
+        # The session's shell (and anything still running in it) goes with the session
+        await asyncio.get_running_loop().run_in_executor(None, command.close_session, session.key)
+        if purge:
+            # After the cancelled request's own save, which runs on the agent's persist thread
+            await asyncio.get_running_loop().run_in_executor(
+                self.agent.async_agent.persist_pool, memory.delete_session, session.key)
+            # Then drop the stored outputs nothing refers to any more, without holding up the reply
+            self.agent.async_agent.persist_pool.submit(blobs.collect_garbage)
+
+    async def _consume(self, session):
+        while True:
+            record = await session.queue.get()
+            async with self.slots:
+                await self._run(session, record)
+
+    async def _run(self, session, record):
+        record["status"] = "running"
+        started = time.perf_counter()
+        session.publish({"type": "started", "session": session.name, "id": record["id"]})
+        task = asyncio.get_running_loop().create_task(
+            self.agent.async_agent.handle_request(record["request"], session=session.agent_session))
+        session.running = (record, task)
+        try:
+            await asyncio.wait({task})
+        except asyncio.CancelledError:
+            # The session is closing
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            self._finish(session, record, "cancelled", started)
+            raise
+        finally:
+            session.running = None
+        if task.cancelled():
+            self._finish(session, record, "cancelled", started)
+        elif task.exception() is not None:
+            self._finish(session, record, "error", started, error=f"{type(task.exception()).__name__}: {task.exception()}")
+        else:
+            self._finish(session, record, "done", started, response=task.result())
+
+    def _finish(self, session, record, status, started, **fields):
+        record.update(fields, status=status, ms=round((time.perf_counter() - started) * 1000, 1))
+        if status != "done":
+            session.publish(dict(fields, type=status, session=session.name, id=record["id"]))
+        if not record["done"].done():
+            record["done"].set_result(record)
+
+    # HTTP
+
+    async def _connection(self, reader, writer):
+        try:
+            method, target, headers, body = await self._read_request(reader)
+            url = urlsplit(target)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            self._check_origin(headers)
+            self._authorize(headers, query)
+            if headers.get("upgrade", "").lower() == "websocket":
+                await self._websocket(url.path, headers, reader, writer)
+                return
+            if body and headers.get("content-type", "").split(";")[0].strip().lower() != "application/json":
+                raise HTTPError(415, "Body must be application/json")
+            status, payload = await self._route(method, url.path, query, body)
+            await self._respond(writer, status, payload)
+        except HTTPError as e:
+            await self._respond(writer, e.status, {"error": str(e)}, e.headers)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise HTTPError(413, "Headers too large")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Bad request line")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HTTPError(400, "Bad Content-Length")
+        if length < 0:
+            raise HTTPError(400, "Bad Content-Length")
+        if length > MAX_BODY:
+            raise HTTPError(413, f"Body over {MAX_BODY} bytes")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, headers, body
+
+    def _check_origin(self, headers):
+        """Refuse calls made by web pages: a foreign Origin, or a Host that isn't us (DNS rebinding)."""
+        origin = headers.get("origin")
+        if origin is not None and _hostname(urlsplit(origin)) not in LOOPBACK_HOSTS:
+            raise HTTPError(403, f"Origin {origin} not allowed")
+        if self.host not in WILDCARD_HOSTS:
+            host = _hostname(urlsplit("//" + headers.get("host", "")))
+            if host not in LOOPBACK_HOSTS + (self.host,):
+                raise HTTPError(403, f"Host {headers.get('host')!r} not allowed")
+
+    def _authorize(self, headers, query):
+        if secrets.compare_digest(headers.get("authorization", ""), f"Bearer {self.token}"):
+            return
+        if secrets.compare_digest(query.get("token", ""), self.token):
+            return
+        raise HTTPError(401, "Missing or wrong token")
+
+    async def _respond(self, writer, status, payload, headers=None):
+        data = json.dumps(payload, default=str).encode()
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}", "Content-Type: application/json",
+                 f"Content-Length: {len(data)}", "Connection: close"]
+        lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + data)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def _route(self, method, path, query, body):
+        parts = [unquote(p) for p in path.strip("/").split("/") if p]
+        if parts == ["health"] and method == "GET":
+            running = sum(1 for s in self.sessions.values() if s.running)
+            return 200, {"ok": True, "sessions": len(self.sessions), "running": running, "workers": self.workers}
+        if not parts or parts[0] != "sessions":
+            raise HTTPError(404, f"No route for {path}")
+        data = self._json(body)
+        if len(parts) == 1:
+            if method == "GET":
+                return 200, {"sessions": [s.info() for s in self.sessions.values()]}
+            if method == "POST":
+                name = data.get("name") or uuid.uuid4().hex[:12]
+                if name in self.sessions:
+                    return 200, self.sessions[name].info()
+                return 201, self.session(name).info()
+        elif len(parts) == 2:
+            if method == "GET":
+                session = self.session(parts[1], create=False)
+                return 200, dict(session.info(), requests=[public(r) for r in session.requests.values()])
+            if method == "DELETE":
+                await self.close_session(parts[1], purge=query.get("purge") in ("1", "true"))
+                return 200, {"closed": parts[1]}
+        elif parts[2] == "requests" and len(parts) == 3 and method == "POST":
+            text = data.get("request")
+            if not isinstance(text, str) or not text.strip():
+                raise HTTPError(400, 'Body needs a "request" string')
+            record = self.session(parts[1]).submit(text)
+            if data.get("wait"):
+                return 200, public(await asyncio.shield(record["done"]))
+            return 202, public(record)
+        elif parts[2] == "requests" and len(parts) == 4 and method == "GET":
+            record = self.session(parts[1], create=False).requests.get(parts[3])
+            if record is None:
+                raise HTTPError(404, f"No request {parts[3]}")
+            return 200, public(record)
+        elif parts[2] == "cancel" and len(parts) == 3 and method == "POST":
+            session = self.session(parts[1], create=False)
+            if session.running is None:
+                return 200, {"cancelled": None}
+            session.running[1].cancel()
+            return 200, {"cancelled": session.running[0]["id"]}
+        raise HTTPError(405 if parts[0] == "sessions" else 404, f"{method} not supported on {path}")
+
+    @staticmethod
+    def _json(body) -> dict:
+        if not body:
+            return {}
+        try:
+            data = json.loads(body)
+        except ValueError:
+            raise HTTPError(400, "Body is not JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Body must be a JSON object")
+        return data
+
+    # WebSocket
+
+    async def _websocket(self, path, headers, reader, writer):
+        parts = [unquote(p) for p in path.strip("/").split("/") if p]
+        if len(parts) != 3 or parts[0] != "sessions" or parts[2] != "events":
+            raise HTTPError(404, f"No WebSocket endpoint at {path}")
+        key = headers.get("sec-websocket-key")
+        if not key:
+            raise HTTPError(400, "Missing Sec-WebSocket-Key")
+        session = self.session(parts[1])
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        await writer.drain()
+        subscriber = _Subscriber()
+        session.subscribers.add(subscriber)
+        receiving = asyncio.get_running_loop().create_task(self._ws_receive(session, subscriber, reader))
+        try:
+            while True:
+                getter = asyncio.ensure_future(subscriber.queue.get())
+                done, _ = await asyncio.wait({getter, receiving}, return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    break
+                event = getter.result()
+                if event is None:
+                    await _ws_send(writer, 0x8, struct.pack("!H", 1001) + b"session closed")
+                    break
+                await _ws_send(writer, 0x1, json.dumps(event, default=str).encode())
+                if subscriber.overflowed and subscriber.queue.empty():
+                    await _ws_send(writer, 0x8, struct.pack("!H", 1008) + b"event buffer overflow")
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            session.subscribers.discard(subscriber)
+            receiving.cancel()
+
+    async def _ws_receive(self, session, subscriber, reader):
+        """Handle client frames: text frames queue requests, close ends the connection."""
+        while True:
+            opcode, payload = await _ws_read(reader)
+            if opcode == 0x8:
+                return
+            if opcode != 0x1:
+                continue
+            try:
+                text = json.loads(payload).get("request")
+                if not isinstance(text, str) or not text.strip():
+                    raise ValueError('needs a "request" string')
+                session.submit(text)
+            except (ValueError, AttributeError, HTTPError) as e:
+                try:
+                    subscriber.queue.put_nowait({"type": "rejected", "session": session.name, "error": str(e)})
+                except asyncio.QueueFull:
+                    pass
+
+
+def _hostname(parts):
+    try:
+        return parts.hostname
+    except ValueError:
+        return None
+
+
+async def _ws_read(reader):
+    """One client frame as (opcode, payload). Client frames are always masked."""
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", await reader.readexactly(8))[0]
+    if length > MAX_BODY:
+        raise ConnectionError("WebSocket frame too large")
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return first & 0x0F, payload
+
+
+async def _ws_send(writer, opcode, payload):
+    header = bytes([0x80 | opcode])
+    if len(payload) < 126:
+        header += bytes([len(payload)])
+    elif len(payload) < 1 << 16:
+        header += bytes([126]) + struct.pack("!H", len(payload))
+    else:
+        header += bytes([127]) + struct.pack("!Q", len(payload))
+    writer.write(header + payload)
+    await writer.drain()
+
+
+def main(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=DEFAULT_WORKERS, queue_size=SESSION_QUEUE, token=None) -> int:
+    """CLI entry (main.py --serve)."""
+    from agent_core.agent import Agent
+    agent = Agent()
+    token = token or os.environ.get("COMMANDER_TOKEN")
+    server = AgentServer(agent, host, port, workers, queue_size, token=token)
+    if token is None:
+        os.makedirs(os.path.dirname(TOKEN_FILE), exist_ok=True)
+        fd = os.open(TOKEN_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(server.token + "\n")
+
+    async def run():
+        await server.start()
+        print(f"Commander AI serving on http://{server.host}:{server.port} ({workers} workers)", flush=True)
+        if token is None:
+            print(f"Token: {server.token} (saved to {os.path.normpath(TOKEN_FILE)})", flush=True)
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
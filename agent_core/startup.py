@@ -0,0 +1,112 @@
+"""
+Startup profiling: how long `python main.py` takes to reach the menu, and what it imports.
+
+Measurements run main.py in a fresh interpreter (`--startup-probe`), so they see a cold
+start no matter what the calling process already imported. The probe also lists heavy
+optional dependencies that got imported before the menu: those should only load when the
+tool that needs them first runs.
+"""
+import os
+import sys
+import json
+import time
+import subprocess
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
+STARTUP_BUDGET_MS = 1500
+CHECK_RUNS = 3
+TOP_IMPORTS = 15
+
+# Dependencies of individual tools; none of these belong on the path to the menu
+HEAVY_MODULES = [
+    "pytesseract", "PIL", "mss", "pyautogui", "pynput", "selenium", "playwright",
+    "openai", "numpy", "PyQt5",
+]
+
+
+def probe(ui=True) -> dict:
+    """
+    Import the app and build the Agent the way main.py does, timing each phase (run in a child).
+    ui=False leaves out the CLI, for installs without its dependencies (rich).
+    """
+    phases = {}
+    started = time.perf_counter()
+    from agent_core.agent import Agent
+    phases["import_agent_ms"] = (time.perf_counter() - started) * 1000
+    if ui:
+        mark = time.perf_counter()
+        from ui.cli import start_cli  # noqa: F401
+        phases["import_ui_ms"] = (time.perf_counter() - mark) * 1000
+    mark = time.perf_counter()
+    error = None
+    try:
+        Agent()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    phases["agent_init_ms"] = (time.perf_counter() - mark) * 1000
+    return {
+        "phases": {k: round(v, 1) for k, v in phases.items()},
+        "heavy_loaded": [m for m in HEAVY_MODULES if m in sys.modules],
+        "error": error,
+    }
+
+
+def _run_probe(importtime=False, root=ROOT):
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["main.py", "--startup-probe"]
+    started = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=root, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+    lines = proc.stdout.strip().splitlines()
+    try:
+        result = json.loads(lines[-1])
+    except (IndexError, ValueError):
+        result = {"phases": {}, "heavy_loaded": [], "error": (proc.stderr.strip().splitlines() or ["probe failed"])[-1]}
+    result["to_menu_ms"] = round(wall_ms, 1)
+    return result, proc.stderr
+
+
+def parse_importtime(stderr) -> list:
+    """Top-level imports from `-X importtime` output as (name, cumulative_us), slowest first."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        # Nested imports are indented by two spaces per level
+        if name.startswith("  "):
+            continue
+        rows.append((name.strip(), int(cumulative)))
+    return sorted(rows, key=lambda row: row[1], reverse=True)
+
+
+def report(top=TOP_IMPORTS, root=ROOT) -> str:
+    result, stderr = _run_probe(importtime=True, root=root)
+    lines = [f"Time to menu: {result['to_menu_ms']:.0f} ms (with -X importtime overhead)"]
+    for phase, ms in result["phases"].items():
+        lines.append(f"  {phase[:-3]:<14} {ms:8.1f} ms")
+    if result["error"]:
+        lines.append(f"  startup error: {result['error']}")
+    lines.append(f"Heavy modules loaded before the menu: {', '.join(result['heavy_loaded']) or 'none'}")
+    lines.append("Slowest top-level imports (cumulative):")
+    for name, us in parse_importtime(stderr)[:top]:
+        lines.append(f"  {us / 1000:8.1f} ms  {name}")
+    return "\n".join(lines)
+
+
+def check(budget_ms=STARTUP_BUDGET_MS, runs=CHECK_RUNS, root=ROOT):
+    """
+    Best-of-`runs` time to menu against `budget_ms`, plus the heavy-import rule.
+    `root` is the checkout to start (tests use a copy with a stub config). Returns (ok, message).
+    """
+    results = [_run_probe(root=root)[0] for _ in range(runs)]
+    best = min(results, key=lambda r: r["to_menu_ms"])
+    problems = []
+    if best["error"]:
+        problems.append(f"startup failed: {best['error']}")
+    if best["to_menu_ms"] > budget_ms:
+        problems.append(f"time to menu {best['to_menu_ms']:.0f} ms exceeds budget {budget_ms} ms")
+    if best["heavy_loaded"]:
+        problems.append(f"heavy modules imported at startup: {', '.join(best['heavy_loaded'])}")
+    if problems:
+        return False, "Startup check FAILED: " + "; ".join(problems)
+    return True, f"Startup check passed: {best['to_menu_ms']:.0f} ms to menu (budget {budget_ms} ms)"
@@ -0,0 +1,244 @@
+"""
+Tool registry: maps tool names to handlers, argument schemas, UI descriptions,
+concurrency classes and side-effect flags.
+
+Built-in tools live in agent_core/builtin_tools.py. Plugins are found in plugins/ by
+reading a module-level `TOOLS` list from each file's source (parsed with ast, not
+executed), so startup never imports plugin code; a plugin module is imported the first
+time one of its tools is invoked. The prompt's tool list is generated from the registry.
+"""
+import os
+import ast
+import json
+import threading
+import importlib.util
+
+from models import tracing
+
+PLUGIN_DIR = os.path.join(os.path.dirname(__file__), '..', 'plugins')
+DEFAULT_GROUP = "Plugins"
+DEFAULT_CLASS = "io"
+UI_WIDTH = 50
+
+# Prompt sections, in order; groups not listed here follow in registration order
+GROUP_ORDER = ["Input/Output", "Files", "System & Web", "Memory & Communication"]
+
+
+def shorten(value, width=UI_WIDTH):
+    text = value if isinstance(value, str) else ', '.join(map(str, value)) if isinstance(value, list) else str(value)
+    return text if len(text) <= width else text[:width - 3] + "..."
+
+
+class Tool:
+    def __init__(self, name, handler=None, args=None, required=(), description=None, ui=None,
+                 ui_width=UI_WIDTH, group=DEFAULT_GROUP, concurrency=DEFAULT_CLASS, examples=(),
+                 side_effects=False, plugin=None, function=None):
+        """
+        Args:
+            handler: Callable(agent, args) -> result; None for plugin tools until first use
+            args: Example arguments shown in the prompt ({"path": "/path"})
+            required: Argument names that must be present and non-empty
+            description: Prompt text; tools without one are callable but not advertised
+            ui: Format string for the UI status line, filled with (shortened) args, or a callable(args)
+            examples: Extra (args, description) prompt lines, e.g. alternate argument forms
+            side_effects: True if the tool changes state (files, shell, GUI, memory); such plans are never cached
+            plugin/function: Plugin file and function name, imported lazily
+        """
+        self.name = name
+        self.handler = handler
+        self.args = args or {}
+        self.required = tuple(required)
+        self.description = description
+        self.ui = ui
+        self.ui_width = ui_width
+        self.group = group
+        self.concurrency = concurrency
+        self.examples = list(examples)
+        self.side_effects = bool(side_effects)
+        self.plugin = plugin
+        self.function = function
+
+    @property
+    def loaded(self) -> bool:
+        return self.handler is not None
+
+    def prompt_lines(self) -> list:
+        if not self.description:
+            return []
+        lines = [f'{json.dumps({"tool": self.name, "args": self.args})} - {self.description}']
+        for args, description in self.examples:
+            lines.append(f'{json.dumps({"tool": self.name, "args": args})} - {description}')
+        return lines
+
+    def describe(self, args):
+        if self.ui is None:
+            return None
+        if callable(self.ui):
+            return self.ui(args)
+        values = {name: '' for name in self.args}
+        values.update({k: shorten(v, self.ui_width) for k, v in args.items()})
+        try:
+            return self.ui.format(**values)
+        except (KeyError, IndexError, ValueError):
+            return self.ui
+
+
+class ToolRegistry:
+    def __init__(self):
+        self.tools = {}
+        self.errors = []  # (plugin file, message) for plugins that could not be loaded
+        self._modules = {}
+        self._lock = threading.Lock()
+        self._prompt = None
+
+    def add(self, tool: Tool, replace=False):
+        if tool.name in self.tools and not replace:
+            raise ValueError(f"Tool already registered: {tool.name}")
+        self.tools[tool.name] = tool
+        self._prompt = None
+
+    def get(self, name):
+        return self.tools.get(name)
+
+    def names(self) -> list:
+        return list(self.tools)
+
+    def concurrency_class(self, name) -> str:
+        tool = self.tools.get(name)
+        return tool.concurrency if tool is not None else DEFAULT_CLASS
+
+    def has_side_effects(self, name) -> bool:
+        tool = self.tools.get(name)
+        return tool is not None and tool.side_effects
+
+    def dispatch(self, agent, plan):
+        """Run a single {"tool": ..., "args": ...} plan."""
+        name = plan.get('tool')
+        tool = self.tools.get(name)
+        if tool is None:
+            return f"Unknown tool: {name}"
+        args = plan.get('args') or {}
+        missing = [arg for arg in tool.required if args.get(arg) in (None, '')]
+        if missing:
+            return f"Missing {' or '.join(missing)}."
+        with tracing.span(name, kind="tool") as span:
+            try:
+                return self._handler(tool)(agent, args)
+            except Exception as e:
+                span.set(error=str(e))
+                return f"Error in tool execution: {e}"
+
+    def describe(self, plan) -> dict:
+        """Attach the UI description for a plan (plan['ui']['description']) if the tool has one."""
+        if not plan or 'tool' not in plan:
+            return plan
+        if isinstance(plan.get('calls'), list):
+            names = [call.get('tool', '?') for call in plan['calls']]
+            desc = f"⚡ Running {len(names)} tools: {', '.join(names)}"
+        else:
+            tool = self.tools.get(plan['tool'])
+            desc = tool.describe(plan.get('args') or {}) if tool is not None else None
+        if desc is None:
+            return plan
+        plan.setdefault('ui', {})['description'] = desc
+        return plan
+
+    def prompt(self) -> str:
+        """Tool list for the LLM prompt. Cached until the registry changes, so the text is stable."""
+        if self._prompt is None:
+            groups = {}
+            for tool in self.tools.values():
+                lines = tool.prompt_lines()
+                if lines:
+                    groups.setdefault(tool.group, []).extend(lines)
+            order = [g for g in GROUP_ORDER if g in groups] + [g for g in groups if g not in GROUP_ORDER]
+            text = "AVAILABLE TOOLS:\n\n"
+            for group in order:
+                text += f"{group}:\n" + "\n".join(groups[group]) + "\n\n"
+            self._prompt = text
+        return self._prompt
+
+    def discover(self, plugin_dir=PLUGIN_DIR):
+        """Register tools declared by plugin files without importing them."""
+        if not os.path.isdir(plugin_dir):
+            return
+        for filename in sorted(os.listdir(plugin_dir)):
+            if not filename.endswith('.py') or filename.startswith('_'):
+                continue
+            path = os.path.join(plugin_dir, filename)
+            try:
+                entries = read_plugin_metadata(path)
+            except (OSError, SyntaxError, ValueError) as e:
+                self.errors.append((filename, str(e)))
+                continue
+            for entry in entries:
+                name = entry.get('name')
+                if not name or not entry.get('function'):
+                    self.errors.append((filename, f"tool entry needs 'name' and 'function': {entry}"))
+                    continue
+                if name in self.tools:
+                    self.errors.append((filename, f"tool name already taken: {name}"))
+                    continue
+                self.add(Tool(
+                    name,
+                    args=entry.get('args'),
+                    required=entry.get('required', ()),
+                    description=entry.get('description'),
+                    ui=entry.get('ui'),
+                    group=entry.get('group', DEFAULT_GROUP),
+                    concurrency=entry.get('concurrency', DEFAULT_CLASS),
+                    side_effects=entry.get('side_effects', False),
+                    plugin=path,
+                    function=entry['function'],
+                ))
+
+    def _handler(self, tool):
+        if tool.handler is None:
+            with self._lock:
+                if tool.handler is None:
+                    module = self._modules.get(tool.plugin)
+                    if module is None:
+                        module = self._modules[tool.plugin] = _import_plugin(tool.plugin)
+                    tool.handler = getattr(module, tool.function)
+        return tool.handler
+
+
+def read_plugin_metadata(path) -> list:
+    """The literal value of a module-level `TOOLS = [...]` in `path`, read without executing it."""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+    for node in tree.body:
+        if isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            if any(isinstance(t, ast.Name) and t.id == 'TOOLS' for t in targets):
+                tools = ast.literal_eval(node.value)
+                if not isinstance(tools, list):
+                    raise ValueError("TOOLS must be a list of dicts")
+                return [t for t in tools if isinstance(t, dict)]
+    return []
+
+
+def _import_plugin(path):
+    name = "plugins." + os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def default_registry() -> ToolRegistry:
+    """Shared registry with the built-in tools and any plugins in plugins/."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            from agent_core import builtin_tools
+            registry = ToolRegistry()
+            for tool in builtin_tools.TOOLS:
+                registry.add(tool)
+            registry.discover()
+            _registry = registry
+        return _registry
@@ -0,0 +1,255 @@
+"""
+Stand-in LLM server for benchmarks: speaks enough of the Ollama and OpenAI HTTP APIs for the
+agent, and replays recorded model responses (a cassette) instead of running a model.
+
+Latency is simulated per call as
+    latency_ms + prefill_tokens / prefill_tokens_per_sec    before the first token
+    1 / tokens_per_sec                                      between streamed tokens
+so prompt growth shows up in timings the way it would against a real model. Like Ollama's
+runner, the server keeps the last prompt's KV state: the part of a prompt shared with the
+previous one is not prefilled again (prefix_cache=False turns this off).
+
+Endpoints: /api/generate, /api/chat, /api/embed, /api/tags (Ollama) and
+/v1/chat/completions (OpenAI, streaming and not). Responses are taken from the cassette in
+order, whichever endpoint asks; an entry with "match" is only used for a prompt containing
+that text. A generate request without a prompt only loads the model (OllamaClient.warm) and
+uses no cassette entry.
+"""
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from models.context import estimate_tokens
+
+DEFAULT_LATENCY_MS = 30
+DEFAULT_PREFILL_RATE = 5000
+DEFAULT_TOKEN_RATE = 400
+EXHAUSTED_RESPONSE = 'Nothing left to do. TASK_END {"tool": "none", "args": {}}'
+
+
+def split_tokens(text) -> list:
+    """Chop text into token-sized pieces (words and the whitespace before them)."""
+    return re.findall(r'\s*\S{1,8}|\s+', text) or [""]
+
+
+class Cassette:
+    def __init__(self, responses):
+        self.responses = [r if isinstance(r, dict) else {"text": r} for r in responses]
+        self._used = set()
+        self._lock = threading.Lock()
+
+    def next(self, prompt) -> str:
+        with self._lock:
+            for i, response in enumerate(self.responses):
+                if i in self._used:
+                    continue
+                if response.get("match") and response["match"] not in prompt:
+                    continue
+                self._used.add(i)
+                return response["text"]
+        return EXHAUSTED_RESPONSE
+
+    @property
+    def remaining(self) -> int:
+        return len(self.responses) - len(self._used)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-stream or dropping keep-alive connections is expected
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+class FakeLLMServer:
+    def __init__(self, responses=(), latency_ms=DEFAULT_LATENCY_MS,
+                 prefill_tokens_per_sec=DEFAULT_PREFILL_RATE, tokens_per_sec=DEFAULT_TOKEN_RATE,
+                 prefix_cache=True, host="127.0.0.1", port=0):
+        self.cassette = Cassette(responses)
+        self.prefix_cache = prefix_cache
+        self._last_prompt = ""
+        self.latency_ms = latency_ms
+        self.prefill_rate = prefill_tokens_per_sec
+        self.token_rate = tokens_per_sec
+        # One record per model call: path, prompt/completion tokens, keep_alive, whether the client hung up early
+        self.calls = []
+        self._lock = threading.Lock()
+        self.httpd = _Server((host, port), _handler_for(self))
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def record(self, **call):
+        with self._lock:
+            self.calls.append(call)
+
+    def uncached_tokens(self, prompt) -> int:
+        """Tokens to prefill for `prompt`, given what's left in the KV cache from the last one."""
+        with self._lock:
+            shared = os.path.commonprefix([self._last_prompt, prompt]) if self.prefix_cache else ""
+            self._last_prompt = prompt
+        return estimate_tokens(prompt) - estimate_tokens(shared)
+
+    def prefill_delay(self, prompt_tokens) -> float:
+        return self.latency_ms / 1000 + prompt_tokens / self.prefill_rate
+
+    def token_delay(self) -> float:
+        return 1.0 / self.token_rate
+
+
+def _prompt_text(payload) -> str:
+    if "prompt" in payload:
+        return payload["prompt"] or ""
+    parts = []
+    for message in payload.get("messages", []):
+        content = message.get("content")
+        parts.append(content if isinstance(content, str) else json.dumps(content))
+    return "\n".join(parts)
+
+
+def _embedding(text, dim=64) -> list:
+    """Deterministic pseudo-embedding so vector search has something stable to rank."""
+    digest = hashlib.sha256(text.encode()).digest()
+    return [((digest[i % len(digest)] + i) % 256) / 255.0 - 0.5 for i in range(dim)]
+
+
+def _handler_for(server):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                return self._json({"models": [{"name": "bench"}]})
+            self._json({"error": "not found"}, status=404)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if self.path == "/api/embed":
+                inputs = payload.get("input")
+                inputs = inputs if isinstance(inputs, list) else [inputs or ""]
+                return self._json({"embeddings": [_embedding(text) for text in inputs]})
+            if self.path not in ("/api/generate", "/api/chat", "/v1/chat/completions"):
+                return self._json({"error": "not found"}, status=404)
+            if self.path == "/api/generate" and not payload.get("prompt"):
+                return self._json({"model": payload.get("model"), "response": "", "done": True,
+                                   "done_reason": "load", "load_duration": 0})
+            prompt = _prompt_text(payload)
+            prompt_tokens = estimate_tokens(prompt)
+            prefill_tokens = server.uncached_tokens(prompt)
+            text = server.cassette.next(prompt)
+            tokens = split_tokens(text)
+            time.sleep(server.prefill_delay(prefill_tokens))
+            self._timings = {"prompt_eval_count": prefill_tokens,
+                             "prompt_eval_duration": int(prefill_tokens / server.prefill_rate * 1e9)}
+            started = time.perf_counter()
+            sent, aborted = len(tokens), False
+            stream = payload.get("stream", self.path != "/v1/chat/completions")
+            try:
+                if not stream:
+                    time.sleep(server.token_delay() * len(tokens))
+                    self._json(self._complete(payload, text, prompt_tokens, len(tokens)))
+                elif self.path == "/v1/chat/completions":
+                    sent = self._stream_openai(payload, tokens)
+                else:
+                    sent = self._stream_ollama(payload, tokens)
+            except (BrokenPipeError, ConnectionResetError):
+                # The agent stops reading once its plan is complete
+                aborted = True
+                sent = getattr(self, "_sent", sent)
+            server.record(path=self.path, prompt_tokens=prompt_tokens, prefill_tokens=prefill_tokens,
+                          completion_tokens=sent, keep_alive=payload.get("keep_alive"),
+                          stream=bool(stream), aborted=aborted,
+                          generation_ms=round((time.perf_counter() - started) * 1000, 1))
+
+        def _complete(self, payload, text, prompt_tokens, completion_tokens):
+            if self.path == "/api/generate":
+                return dict(self._timings, model=payload.get("model"), response=text, done=True,
+                        eval_count=completion_tokens)
+            if self.path == "/api/chat":
+                return dict(self._timings, model=payload.get("model"), done=True, eval_count=completion_tokens,
+                        message={"role": "assistant", "content": text})
+            return {"id": "bench", "object": "chat.completion", "model": payload.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                                 "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}}
+
+        def _stream_ollama(self, payload, tokens):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            chat = self.path == "/api/chat"
+            self._sent = 0
+            for token in tokens:
+                time.sleep(server.token_delay())
+                body = {"model": payload.get("model"), "done": False}
+                if chat:
+                    body["message"] = {"role": "assistant", "content": token}
+                else:
+                    body["response"] = token
+                self._chunk(json.dumps(body) + "\n")
+                self._sent += 1
+            self._chunk(json.dumps(dict(self._timings, model=payload.get("model"), done=True,
+                                        eval_count=self._sent)) + "\n")
+            self._chunk("")
+            return self._sent
+
+        def _stream_openai(self, payload, tokens):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self._sent = 0
+            for token in tokens:
+                time.sleep(server.token_delay())
+                chunk = {"id": "bench", "object": "chat.completion.chunk", "model": payload.get("model"),
+                         "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                self._chunk(f"data: {json.dumps(chunk)}\n\n")
+                self._sent += 1
+            self._chunk("data: [DONE]\n\n")
+            self._chunk("")
+            return self._sent
+
+        def _chunk(self, text):
+            data = text.encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def _json(self, body, status=200):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
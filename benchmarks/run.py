@@ -0,0 +1,207 @@
+"""
+End-to-end benchmark harness.
+
+Each scenario in benchmarks/scenarios/ runs the real agent loop (Agent.handle_request, or the
+CLI loop for "mode": "cli") in a fresh process inside a throwaway copy of the repo, against
+a local stand-in LLM server replaying the scenario's cassette (benchmarks/fake_llm.py).
+Tools really run, so tool time is real; model time is simulated but deterministic.
+
+Reports per-task and per-step latency, prompt tokens sent (and how many of them missed the
+server's prefix cache), tool time and the worker's peak RSS, and exits 1 when a metric regresses past its tolerance against benchmarks/baseline.json.
+
+    python -m benchmarks.run                   # run all scenarios, compare with the baseline
+    python -m benchmarks.run -s file_roundtrip # one scenario
+    python -m benchmarks.run --save-baseline   # accept the current numbers
+"""
+import os
+import sys
+import json
+import glob
+import shutil
+import argparse
+import tempfile
+import importlib.util
+import subprocess
+import statistics
+
+from benchmarks.fake_llm import FakeLLMServer
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
+SCENARIO_DIR = os.path.join(ROOT, 'benchmarks', 'scenarios')
+BASELINE_FILE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+COPY_IGNORE = shutil.ignore_patterns('.git', 'cache', 'config', '__pycache__', '*.pyc', 'requests.jsonl')
+WORKER_TIMEOUT = 300
+
+# Config every worker gets; scenarios can override keys with "config"
+BASE_CONFIG = {
+    "USE_API": True,
+    "OPENAI_API_KEY": "bench",
+    "API_MODEL": "bench",
+    "LOCAL_MODEL": "bench",
+    # Cached replies would hide the model latency being measured
+    "RESPONSE_CACHE": False,
+}
+
+# metric -> (relative tolerance, absolute slack); a regression must exceed both
+METRICS = {
+    "task_ms_total": (0.25, 50.0),
+    "step_ms_p50": (0.25, 20.0),
+    "tool_ms": (0.50, 50.0),
+    "prompt_tokens": (0.05, 0),
+    "prefill_tokens": (0.05, 0),
+    "llm_calls": (0.0, 0),
+    "peak_rss_kb": (0.25, 10240),
+}
+
+
+def load_scenarios(names=None) -> list:
+    scenarios = []
+    for path in sorted(glob.glob(os.path.join(SCENARIO_DIR, '*.json'))):
+        with open(path) as f:
+            scenario = json.load(f)
+        scenario.setdefault("name", os.path.splitext(os.path.basename(path))[0])
+        if not names or scenario["name"] in names:
+            scenarios.append(scenario)
+    return scenarios
+
+
+def _write_config(workdir, config):
+    os.makedirs(os.path.join(workdir, 'config'), exist_ok=True)
+    with open(os.path.join(workdir, 'config', 'config.yaml'), 'w') as f:
+        # JSON is valid YAML, and avoids importing yaml here
+        json.dump(config, f, indent=2)
+
+
+def run_scenario(scenario) -> dict:
+    """Run one scenario in a fresh worker process and return its summarized metrics."""
+    missing = [m for m in scenario.get("requires", []) if importlib.util.find_spec(m) is None]
+    if missing:
+        return {"skipped": f"needs {', '.join(missing)}"}
+    timing = scenario.get("timing", {})
+    server = FakeLLMServer(
+        scenario.get("cassette", []),
+        latency_ms=timing.get("latency_ms", 30),
+        prefill_tokens_per_sec=timing.get("prefill_tokens_per_sec", 5000),
+        tokens_per_sec=timing.get("tokens_per_sec", 400),
+    )
+    workdir = tempfile.mkdtemp(prefix='commander_bench_')
+    try:
+        repo = os.path.join(workdir, 'repo')
+        shutil.copytree(ROOT, repo, ignore=COPY_IGNORE)
+        for name, content in scenario.get("files", {}).items():
+            with open(os.path.join(repo, name), 'w') as f:
+                f.write(content)
+        scenario_file = os.path.join(workdir, 'scenario.json')
+        with open(scenario_file, 'w') as f:
+            json.dump(scenario, f)
+        with server:
+            _write_config(repo, dict(BASE_CONFIG, OLLAMA_HOST=server.url, **scenario.get("config", {})))
+            env = dict(os.environ, OPENAI_BASE_URL=server.url + "/v1", OPENAI_API_KEY="bench")
+            proc = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.worker', scenario_file],
+                cwd=repo, env=env, capture_output=True, text=True, timeout=WORKER_TIMEOUT,
+            )
+        if proc.returncode != 0:
+            tail = (proc.stderr.strip().splitlines() or ["worker failed"])[-1]
+            return {"error": tail}
+        raw = json.loads(proc.stdout.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return summarize(raw, server)
+
+
+def summarize(raw, server) -> dict:
+    llm_ms = raw["llm_ms"] or [0.0]
+    return {
+        "tasks": len(raw["task_ms"]),
+        "task_ms": raw["task_ms"],
+        "task_ms_total": round(sum(raw["task_ms"]), 1),
+        "steps": len(raw["llm_ms"]),
+        "step_ms_p50": round(statistics.median(llm_ms), 1),
+        "step_ms_max": round(max(llm_ms), 1),
+        "tool_ms": round(sum(ms for _, ms in raw["tools"]), 1),
+        "tools": [name for name, _ in raw["tools"]],
+        "llm_calls": len(server.calls),
+        "prompt_tokens": sum(call["prompt_tokens"] for call in server.calls),
+        # Prompt tokens the server had to prefill, i.e. not covered by its cached prefix
+        "prefill_tokens": sum(call["prefill_tokens"] for call in server.calls),
+        "prompt_tokens_max": max((call["prompt_tokens"] for call in server.calls), default=0),
+        "completion_tokens": sum(call["completion_tokens"] for call in server.calls),
+        "cassette_left": server.cassette.remaining,
+        "startup_ms": raw["startup_ms"],
+        "peak_rss_kb": raw["peak_rss_kb"],
+    }
+
+
+def compare(results, baseline) -> list:
+    """Human-readable regressions of `results` against `baseline`."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or "error" in result or "skipped" in result:
+            continue
+        for metric, (relative, slack) in METRICS.items():
+            if metric not in base or metric not in result:
+                continue
+            limit = base[metric] * (1 + relative) + slack
+            if result[metric] > limit:
+                regressions.append(f"{name}: {metric} {result[metric]} > {base[metric]} (limit {round(limit, 1)})")
+    return regressions
+
+
+def format_table(results) -> str:
+    header = f"{'scenario':<22}{'tasks':>6}{'steps':>6}{'task ms':>10}{'step p50':>10}{'tool ms':>9}{'prompt tok':>11}{'prefill tok':>12}{'RSS MB':>8}"
+    lines = [header, "-" * len(header)]
+    for name, r in results.items():
+        if "error" in r or "skipped" in r:
+            lines.append(f"{name:<22}  {'ERROR: ' + r['error'] if 'error' in r else 'skipped: ' + r['skipped']}")
+            continue
+        lines.append(f"{name:<22}{r['tasks']:>6}{r['steps']:>6}{r['task_ms_total']:>10.1f}{r['step_ms_p50']:>10.1f}"
+                     f"{r['tool_ms']:>9.1f}{r['prompt_tokens']:>11}{r['prefill_tokens']:>12}{r['peak_rss_kb'] / 1024:>8.1f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Commander AI end-to-end benchmarks")
+    parser.add_argument("-s", "--scenario", action="append", help="run only these scenarios")
+    parser.add_argument("--save-baseline", action="store_true", help="write results to the baseline file")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--json", help="also write full results to this file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for scenario in load_scenarios(args.scenario):
+        results[scenario["name"]] = run_scenario(scenario)
+    print(format_table(results))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    failed = [name for name, r in results.items() if "error" in r]
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        for name, r in results.items():
+            if "error" not in r and "skipped" not in r:
+                baseline[name] = {metric: r[metric] for metric in METRICS}
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline saved to {args.baseline}")
+        return 1 if failed else 0
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f))
+    else:
+        print("No baseline yet; run with --save-baseline to record one.")
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if failed or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+Benchmark worker: runs one scenario inside a throwaway copy of the repo and prints its
+measurements as one JSON line. Started by benchmarks/run.py, which owns the fake LLM server
+and the config; running it by hand is only useful for debugging a scenario.
+
+    python -m benchmarks.worker path/to/scenario.json
+"""
+import io
+import sys
+import json
+import time
+import resource
+import threading
+import contextlib
+
+
+class Recorder:
+    """Times LLM calls and tool runs. Nested LLM calls (plan -> fallback) count once."""
+
+    def __init__(self):
+        self.llm_ms = []
+        self.tools = []  # (tool name, ms)
+        self._depth = threading.local()
+
+    def llm(self, fn):
+        def timed(*args, **kwargs):
+            depth = getattr(self._depth, "value", 0)
+            self._depth.value = depth + 1
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._depth.value = depth
+                if depth == 0:
+                    self.llm_ms.append((time.perf_counter() - started) * 1000)
+        return timed
+
+    def tool(self, fn):
+        def timed(plan, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(plan, *args, **kwargs)
+            finally:
+                self.tools.append((plan.get("tool"), (time.perf_counter() - started) * 1000))
+        return timed
+
+
+def instrument(agent) -> Recorder:
+    recorder = Recorder()
+    agent.llm.plan = recorder.llm(agent.llm.plan)
+    agent.llm.plan_followup = recorder.llm(agent.llm.plan_followup)
+    agent.llm.answer_question = recorder.llm(agent.llm.answer_question)
+    agent.execute_plan = recorder.tool(agent.execute_plan)
+    return recorder
+
+
+def run_agent(agent, requests) -> list:
+    task_ms = []
+    for request in requests:
+        started = time.perf_counter()
+        agent.handle_request(request)
+        task_ms.append((time.perf_counter() - started) * 1000)
+    return task_ms
+
+
+def run_cli(agent, requests) -> list:
+    """Drive ui.cli.run_agent_cli with the requests on stdin; a task ends when it asks for input again."""
+    from ui import cli
+    marks = []
+    base = cli.Prompt
+
+    class TimedPrompt(base):
+        @classmethod
+        def ask(cls, *args, **kwargs):
+            marks.append(time.perf_counter())
+            return base.ask(*args, **kwargs)
+
+    cli.Prompt = TimedPrompt
+    stdin = sys.stdin
+    sys.stdin = io.StringIO("\n".join(list(requests) + ["exit"]) + "\n")
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            cli.console = cli.Console(file=io.StringIO())
+            cli.run_agent_cli(agent, new_session=True)
+    finally:
+        sys.stdin = stdin
+        cli.Prompt = base
+    return [(b - a) * 1000 for a, b in zip(marks, marks[1:])]
+
+
+def main(path):
+    with open(path) as f:
+        scenario = json.load(f)
+    started = time.perf_counter()
+    from agent_core.agent import Agent
+    agent = Agent()
+    startup_ms = (time.perf_counter() - started) * 1000
+    recorder = instrument(agent)
+    if scenario.get("mode", "agent") == "cli":
+        task_ms = run_cli(agent, scenario["requests"])
+    else:
+        task_ms = run_agent(agent, scenario["requests"])
+    # Let background persistence finish so its memory counts toward the high-water mark
+    agent.async_agent.persist_pool.shutdown(wait=True)
+    print(json.dumps({
+        "startup_ms": round(startup_ms, 1),
+        "task_ms": [round(ms, 1) for ms in task_ms],
+        "llm_ms": [round(ms, 1) for ms in recorder.llm_ms],
+        "tools": [(name, round(ms, 1)) for name, ms in recorder.tools],
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1])
@@ -4,10 +4,67 @@ Commander AI - Entrypoint
 - Loads config
 - Initializes core agent
 - Starts CLI
+
+`--startup-report` prints where cold-start time goes; `--startup-check` exits non-zero when
+time-to-menu exceeds the budget or a heavy tool dependency is imported at startup.
+`--batch FILE` (or `-` for stdin) runs a JSONL queue of requests headless; see agent_core/batch.py.
+`--serve` exposes the agent over HTTP/WebSocket on localhost; see agent_core/server.py.
 """
-from agent_core.agent import Agent
-from ui.cli import start_cli
+import sys
+import argparse
 
-if __name__ == "__main__":
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Commander AI")
+    parser.add_argument("--startup-report", action="store_true", help="print startup timings and slowest imports")
+    parser.add_argument("--startup-check", action="store_true", help="fail if startup is over budget")
+    parser.add_argument("--budget-ms", type=float, default=None, help="time-to-menu budget for --startup-check")
+    parser.add_argument("--startup-probe", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--batch", metavar="FILE", help="run requests from a JSONL file ('-' = stdin) without the menu")
+    parser.add_argument("--output", help="batch results file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=None, help="batch worker processes / requests run at once when serving")
+    parser.add_argument("--llm-concurrency", type=int, default=None, help="model calls allowed at once across workers")
+    parser.add_argument("--answers", help="JSON map of answers for questions the agent asks in batch mode")
+    parser.add_argument("--serve", action="store_true", help="serve the agent over HTTP/WebSocket")
+    parser.add_argument("--host", default=None, help="address to serve on (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=None, help="port to serve on")
+    parser.add_argument("--queue-size", type=int, default=None, help="requests a session may queue when serving")
+    parser.add_argument("--token", help="bearer token required by the server (default: $COMMANDER_TOKEN)")
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        from agent_core import server
+        return server.main(args.host or server.DEFAULT_HOST, args.port or server.DEFAULT_PORT,
+                           workers=args.workers or server.DEFAULT_WORKERS,
+                           queue_size=args.queue_size or server.SESSION_QUEUE, token=args.token)
+
+    if args.batch:
+        from agent_core import batch
+        return batch.main(args.batch, args.output,
+                          workers=args.workers or batch.DEFAULT_WORKERS,
+                          llm_concurrency=args.llm_concurrency or batch.DEFAULT_LLM_CONCURRENCY,
+                          answers_path=args.answers)
+
+    if args.startup_probe or args.startup_report or args.startup_check:
+        from agent_core import startup
+        if args.startup_probe:
+            import json
+            print(json.dumps(startup.probe()))
+            return 0
+        if args.startup_report:
+            print(startup.report())
+        if args.startup_check:
+            ok, message = startup.check(args.budget_ms or startup.STARTUP_BUDGET_MS)
+            print(message)
+            return 0 if ok else 1
+        return 0
+
+    from agent_core.agent import Agent
+    from ui.cli import start_cli
     agent = Agent()
     start_cli(agent)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
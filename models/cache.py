@@ -0,0 +1,176 @@
+"""
+Response cache: two-tier (in-memory LRU + on-disk) store for LLM replies.
+
+Keys are built from the normalized prompt, model name and temperature, so the same
+question asked twice (or with different spacing) is only sent to a model once.
+"""
+import os
+import json
+import time
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+
+CACHE_DIR = os.path.join(os.path.dirname(__file__), '../cache/llm_responses')
+
+
+def normalize_prompt(prompt: str) -> str:
+    # Whitespace only: case can change the meaning (paths, commands, quoted text)
+    return " ".join(prompt.split())
+
+
+def make_key(prompt, model, temperature=None) -> str:
+    if not isinstance(prompt, str):
+        prompt = json.dumps(prompt, sort_keys=True)
+    raw = f"{model}\x00{temperature}\x00{normalize_prompt(prompt)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def is_cacheable_plan(plan, has_side_effects=lambda name: False) -> bool:
+    """
+    Plans that change the machine state (has_side_effects(tool name), e.g.
+    ToolRegistry.has_side_effects) are never cached: replaying them from cache would be wrong.
+    """
+    if not isinstance(plan, dict) or plan.get("error") or plan.get("fallback_to_api"):
+        return False
+    if isinstance(plan.get("calls"), list):
+        return all(is_cacheable_plan(call, has_side_effects) for call in plan["calls"])
+    return not has_side_effects(plan.get("tool"))
+
+
+class ResponseCache:
+    def __init__(self, cache_dir=CACHE_DIR, max_entries=256, ttl=3600, max_disk_bytes=50 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires >= now:
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return copy.deepcopy(value)
+                del self._mem[key]
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is not None and entry["expires"] >= now:
+                self._remember(key, entry["expires"], copy.deepcopy(entry["value"]))
+                self.hits += 1
+                self.disk_hits += 1
+                return entry["value"]
+            self.misses += 1
+        if entry is not None:
+            self._remove_disk(key)
+        return None
+
+    def put(self, key, value, ttl=None):
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._remember(key, expires, copy.deepcopy(value))
+        self._write_disk(key, expires, value)
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+        if os.path.isdir(self.cache_dir):
+            for path, _ in self._disk_entries():
+                os.remove(path)
+        self._disk_bytes = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self._mem),
+            "disk_bytes": self._disk_bytes or 0,
+        }
+
+    def _remember(self, key, expires, value):
+        self._mem[key] = (expires, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def _read_disk(self, key):
+        try:
+            with open(self._path(key), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, expires, value):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = json.dumps({"expires": expires, "value": value})
+            tmp = path + ".tmp"
+            with open(tmp, 'w') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except (OSError, TypeError):
+            return
+        if self._disk_bytes is None:
+            self._disk_bytes = sum(size for _, size in self._disk_entries())
+        else:
+            self._disk_bytes += len(data)
+        if self._disk_bytes > self.max_disk_bytes:
+            self._evict_disk()
+
+    def _remove_disk(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _disk_entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    yield path, os.path.getsize(path)
+                except OSError:
+                    continue
+
+    def _evict_disk(self):
+        """Drop expired files, then the least recently written ones, until under 90% of the budget."""
+        now = time.time()
+        entries = []
+        for path, size in self._disk_entries():
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            entries.append((mtime, path, size))
+        entries.sort()
+        total = sum(size for _, _, size in entries)
+        target = self.max_disk_bytes * 0.9
+        for mtime, path, size in entries:
+            if total <= target and mtime + self.ttl >= now:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
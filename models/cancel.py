@@ -0,0 +1,46 @@
+"""
+Cooperative cancellation for blocking LLM/tool calls running in worker threads.
+
+A CancelToken is bound to the calling context with a ContextVar. Streaming loops call
+`check_cancelled()` between chunks, so cancelling the token stops the generation and closes
+the HTTP connection (which makes Ollama stop generating too).
+"""
+import threading
+import contextvars
+
+
+class Cancelled(BaseException):
+    """
+    Raised inside a worker when its cancel token fires. Derives from BaseException (like
+    asyncio.CancelledError) so the `except Exception` fallbacks in the LLM/tool code don't
+    turn a cancellation into an error reply.
+    """
+
+
+_current = contextvars.ContextVar("cancel_token", default=None)
+
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+def current_token():
+    return _current.get()
+
+
+def set_token(token):
+    return _current.set(token)
+
+
+def check_cancelled():
+    token = _current.get()
+    if token is not None and token.cancelled:
+        raise Cancelled("operation cancelled")
@@ -0,0 +1,104 @@
+"""
+Context builder: fits chat history into a token budget for LLM prompts.
+
+Pinned text (system prompt, tool description, current request) is always kept. History is
+filled newest-first until the budget runs out; oversized tool outputs are cut down to
+their head and tail first so one large `read_file` can't push out the whole conversation.
+"""
+
+TOOL_ROLES = ("tool", "tool_followup")
+# Head-of-history entry holding the rolling summary of compacted turns (agent_core/compaction.py)
+SUMMARY_ROLE = "summary"
+TRUNCATION_MARKER = "\n...[truncated {} chars]...\n"
+
+
+def estimate_tokens(text) -> int:
+    """Cheap token estimate (~4 characters per token for English text and code)."""
+    if not text:
+        return 0
+    return len(text) // 4 + 1
+
+
+def truncate_middle(text: str, max_tokens: int) -> str:
+    """Keep the head and tail of `text` so it fits in roughly `max_tokens` tokens."""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    half = max_chars // 2
+    return text[:half] + TRUNCATION_MARKER.format(len(text) - 2 * half) + text[-half:]
+
+
+def split_summary(history):
+    """(summary text or "", the other entries) of a history."""
+    if history and history[0].get("role") == SUMMARY_ROLE:
+        return history[0].get("content", ""), history[1:]
+    return "", history
+
+
+class ContextWindow:
+    """Result of ContextBuilder.build: the history entries that made it into the prompt."""
+
+    def __init__(self, entries, pinned_tokens, kept_tokens, evicted_tokens, evicted_turns, truncated_turns):
+        self.entries = entries
+        self.pinned_tokens = pinned_tokens
+        self.kept_tokens = kept_tokens
+        self.evicted_tokens = evicted_tokens
+        self.evicted_turns = evicted_turns
+        self.truncated_turns = truncated_turns
+
+    def stats(self) -> dict:
+        return {
+            "pinned_tokens": self.pinned_tokens,
+            "kept_tokens": self.kept_tokens,
+            "evicted_tokens": self.evicted_tokens,
+            "kept_turns": len(self.entries),
+            "evicted_turns": self.evicted_turns,
+            "truncated_turns": self.truncated_turns,
+        }
+
+
+class ContextBuilder:
+    def __init__(self, budget=3000, max_tool_tokens=300):
+        self.budget = budget
+        self.max_tool_tokens = max_tool_tokens
+
+    def build(self, history, pinned=()) -> ContextWindow:
+        """
+        Select the most recent history entries that fit in the budget.
+
+        Args:
+            history: List of {"role": ..., "content": ...} entries, oldest first
+            pinned: Strings that are always part of the prompt and count against the budget
+        """
+        pinned_tokens = sum(estimate_tokens(p) for p in pinned)
+        remaining = self.budget - pinned_tokens
+        kept = []
+        kept_tokens = 0
+        evicted_tokens = 0
+        truncated = 0
+        history = history or []
+        cutoff = len(history)
+        for i in range(len(history) - 1, -1, -1):
+            entry = history[i]
+            content = str(entry.get('content', '')).strip()
+            full_tokens = estimate_tokens(content)
+            if entry.get('role') in TOOL_ROLES and full_tokens > self.max_tool_tokens:
+                content = truncate_middle(content, self.max_tool_tokens)
+                evicted_tokens += full_tokens - estimate_tokens(content)
+                truncated += 1
+            tokens = estimate_tokens(content)
+            if tokens > remaining:
+                evicted_tokens += tokens
+                cutoff = i
+                break
+            remaining -= tokens
+            kept_tokens += tokens
+            kept.append(dict(entry, content=content))
+        else:
+            cutoff = 0
+        # Everything older than the first entry that didn't fit is evicted too
+        for entry in history[:cutoff]:
+            evicted_tokens += estimate_tokens(str(entry.get('content', '')).strip())
+        kept.reverse()
+        return ContextWindow(kept, pinned_tokens, kept_tokens, evicted_tokens,
+                             len(history) - len(kept), truncated)
@@ -2,26 +2,100 @@
 LLMManager: Handles local and API LLMs, prompt engineering, and RAG.
 """
 import os
-import requests
-
-
-import yaml
 import json
-import subprocess
+
+from models.ollama_client import OllamaClient, DEFAULT_HOST, DEFAULT_MODEL, DEFAULT_KEEP_ALIVE
+from models.cache import ResponseCache, make_key, is_cacheable_plan
+from models.context import ContextBuilder, estimate_tokens, truncate_middle, split_summary, TOOL_ROLES
+from models.cancel import check_cancelled
+from models.stream_parser import StreamingPlanParser
+from models.router import ModelRouter
+from models import tracing
 
 TASK_END_TOKEN = "TASK_END"
+API_MODEL = "gpt-4.1-2025-04-14"
 
 class LLMManager:
     """
     Handles both local (Ollama) and OpenAI API LLMs for planning and tool-use.
     """
-    def __init__(self):
+    def __init__(self, tools=None):
+        if tools is None:
+            from agent_core.tools import default_registry
+            tools = default_registry()
+        # Tool registry: prompt tool list and UI descriptions come from here
+        self.tools = tools
         # Load config
+        import yaml
         with open("config/config.yaml", "r") as f:
             cfg = yaml.safe_load(f)
         self.use_api = cfg.get("USE_API", False)
         self.api_key = cfg.get("OPENAI_API_KEY", None)
         self.local_llm = cfg.get("LOCAL_LLM", "ollama")
+        self.local_model = cfg.get("LOCAL_MODEL", DEFAULT_MODEL)
+        self.ollama = OllamaClient(
+            host=cfg.get("OLLAMA_HOST", DEFAULT_HOST),
+            model=self.local_model,
+            keep_alive=cfg.get("OLLAMA_KEEP_ALIVE", DEFAULT_KEEP_ALIVE),
+            timeout=cfg.get("OLLAMA_TIMEOUT", 60),
+        )
+        # Load the local model now, in the background, so the first request doesn't pay for it
+        if self.local_llm == "ollama" and cfg.get("OLLAMA_WARM", True):
+            self.ollama.warm_in_background()
+        self.api_model = cfg.get("API_MODEL", API_MODEL)
+        # Optional embedding model (e.g. nomic-embed-text) for vector search in RAG memory
+        self.embedding_model = cfg.get("EMBEDDING_MODEL")
+        self.embedding_dim = cfg.get("EMBEDDING_DIM")
+        # Token budgets for history in prompts; the small local model gets a tighter window
+        tool_tokens = cfg.get("TOOL_OUTPUT_TOKENS", 300)
+        self.local_context = ContextBuilder(cfg.get("LOCAL_CONTEXT_TOKENS", 3000), tool_tokens)
+        self.api_context = ContextBuilder(cfg.get("API_CONTEXT_TOKENS", 12000), tool_tokens)
+        self.last_context_stats = {}
+        # Seconds allowed per LLM call or tool run in the agent loop (None = no limit)
+        self.step_timeout = cfg.get("STEP_TIMEOUT")
+        self.max_plan_tokens = cfg.get("MAX_PLAN_TOKENS", 512)
+        # Time-to-first-action, tokens generated and unused token budget of the last streamed plan
+        self.last_stream_stats = {}
+        self.temperature = cfg.get("TEMPERATURE", 0.2)
+        # Spans for every LLM call and tool run (cache/traces) and a Prometheus textfile
+        tracing.configure(
+            enabled=cfg.get("TRACING", True),
+            path=cfg.get("TRACE_FILE", tracing.TRACE_FILE),
+            metrics_path=cfg.get("METRICS_FILE", tracing.METRICS_FILE),
+            max_bytes=cfg.get("TRACE_MAX_BYTES", tracing.TRACE_MAX_BYTES),
+        )
+        # Local vs API per call from rolling latency/success stats, against a latency SLO (seconds)
+        self.plan_slo = cfg.get("PLAN_SLO", 8)
+        self.answer_slo = cfg.get("ANSWER_SLO", 5)
+        self.router = ModelRouter(
+            hedge=cfg.get("HEDGE", False),
+            hedge_delay=cfg.get("HEDGE_DELAY"),
+            window=cfg.get("ROUTER_WINDOW", 50),
+        )
+        # Rolling summary of old history (agent_core/compaction.py); sizes in tokens
+        self.history_compaction = cfg.get("HISTORY_COMPACTION", True)
+        self.compact_trigger_tokens = cfg.get("COMPACT_TRIGGER_TOKENS", 6000)
+        self.compact_keep_tokens = cfg.get("COMPACT_KEEP_TOKENS", 2000)
+        self.summary_tokens = cfg.get("SUMMARY_TOKENS", 400)
+        # Summaries are routed too, but with their own stats: long background calls mustn't skew plan routing
+        self.summary_router = ModelRouter(hedge=False, window=cfg.get("ROUTER_WINDOW", 50))
+        # Tool outputs longer than this go to the blob store, leaving a handle and excerpt in history (0 = off)
+        self.blob_inline_chars = cfg.get("BLOB_INLINE_CHARS", 4000)
+        # Byte cap on each file read/search result (see modules/file.py)
+        self.file_result_bytes = cfg.get("FILE_RESULT_BYTES", 32 * 1024)
+        # Capture the screen in the background once the screen tool is first used
+        self.screen_frame_buffer = cfg.get("SCREEN_FRAME_BUFFER", False)
+        self.screen_buffer_fps = cfg.get("SCREEN_BUFFER_FPS", 5)
+        # Optional semaphore shared with other processes capping concurrent model calls (batch mode)
+        self.call_limit = None
+        # Response cache for repeated plans/answers; disable with RESPONSE_CACHE: false
+        self.cache = None
+        if cfg.get("RESPONSE_CACHE", True):
+            self.cache = ResponseCache(
+                max_entries=cfg.get("RESPONSE_CACHE_SIZE", 256),
+                ttl=cfg.get("RESPONSE_CACHE_TTL", 3600),
+                max_disk_bytes=cfg.get("RESPONSE_CACHE_MAX_BYTES", 50 * 1024 * 1024),
+            )
 
     def plan(self, request: str, chat_history=None) -> dict:
         """
@@ -32,180 +106,193 @@ class LLMManager:
             request: The user's request
             chat_history: List of previous interactions in the format [{"role": role, "content": content}, ...]
         """
-        # Add UI message about tool execution
-        def add_tool_description(plan: dict) -> dict:
-            if not plan or 'tool' not in plan:
-                return plan
-                
-            tool = plan['tool']
-            args = plan.get('args', {})
-            
-            if tool == 'read_file':
-                path = args.get('path', '')
-                desc = f"📖 Reading file: {path}"
-            elif tool == 'write_file' or tool == 'append_file':
-                path = args.get('path', '')
-                desc = f"✍️ {'Writing to' if tool == 'write_file' else 'Appending to'} file: {path}"
-            elif tool == 'run_command':
-                cmd = args.get('cmd', '')
-                if len(cmd) > 50:
-                    cmd = cmd[:47] + "..."
-                desc = f"🔧 Running command: {cmd}"
-            elif tool == 'search_web':
-                query = args.get('query', '')
-                if len(query) > 50:
-                    query = query[:47] + "..."
-                desc = f"🔍 Searching web for: {query}"
-            elif tool == 'screen_ocr':
-                desc = "👀 Capturing screen text"
-            elif tool == 'move_mouse':
-                x, y = args.get('x', 0), args.get('y', 0)
-                desc = f"🖱️ Moving mouse to ({x}, {y})"
-            elif tool == 'click':
-                desc = "🖱️ Clicking mouse"
-            elif tool == 'type_text':
-                text = args.get('text', '')
-                if len(text) > 30:
-                    text = text[:27] + "..."
-                desc = f"⌨️ Typing: {text}"
-            elif tool == 'memory_notepad_add':
-                note = args.get('note', '')
-                if len(note) > 50:
-                    note = note[:47] + "..."
-                desc = f"📝 Adding note: {note}"
-            elif tool == 'memory_rag_query':
-                query = args.get('query', '')
-                if len(query) > 50:
-                    query = query[:47] + "..."
-                desc = f"🧠 Querying memory: {query}"
-            else:
-                return plan
-
-            if 'ui' not in plan:
-                plan['ui'] = {}
-            plan['ui']['description'] = desc
-            return plan
-
         # Memory triggers
         if request.lower().startswith("remember that") or request.lower().startswith("remember this"):
             plan = {"tool": "memory_notepad_add", "args": {"note": request}}
-            return add_tool_description(plan)
+            return self.tools.describe(plan)
 
         # Direct answer shortcut (if question is simple)
         if self._is_simple_question(request):
             answer = self.answer_question(request)
             return {"tool": "none", "args": {}, "message": answer}
             
-        # Try local LLM first, fallback to API if needed
-        plan = self._plan_with_local(request, chat_history=chat_history)
-        if plan.get("fallback_to_api") and self.use_api and self.api_key:
-            plan = self._plan_with_api(request, chat_history)
-            
-        return add_tool_description(plan)
+        plan = self._route_plan(request, chat_history)
+        return self.tools.describe(plan)
+
+    def plan_followup(self, prompt: str, chat_history=None) -> dict:
+        """Plan the next agentic step; routed like `plan`, without the shortcuts."""
+        return self._route_plan(prompt, chat_history)
+
+    def _backends(self, local, api) -> dict:
+        calls = {"local": local}
+        if self.use_api and self.api_key:
+            calls["api"] = api
+        if self.call_limit is not None:
+            calls = {name: self._limited(fn) for name, fn in calls.items()}
+        return calls
+
+    def _limited(self, fn):
+        def call():
+            with self.call_limit:
+                return fn()
+        return call
+
+    def _route_plan(self, request: str, chat_history=None) -> dict:
+        calls = self._backends(lambda: self._plan_with_local(request, chat_history=chat_history),
+                               lambda: self._plan_with_api(request, chat_history))
+        plan, _ = self.router.call(calls, slo=self.plan_slo, purpose="plan",
+                                   validate=lambda p: isinstance(p, dict) and not p.get("error"))
+        return plan
 
     def _is_simple_question(self, request: str) -> bool:
         # Heuristic: if it looks like a factual or short question, answer directly
         q = request.strip().lower()
         return q.endswith('?') and not any(x in q for x in ["file", "screen", "mouse", "type", "command", "search", "web", "run", "move", "click", "read", "write", "append"])
 
+    @tracing.traced("plan_local", kind="llm")
     def _plan_with_local(self, request: str, chat_history=None) -> dict:
         prompt = self._get_prompt(request, local=True, chat_history=chat_history)
+        tracing.annotate(model=self.local_model, prompt_tokens=estimate_tokens(prompt))
+        key = make_key(prompt, self.local_model)
+        cached = self._cache_get(key)
+        if cached is not None:
+            tracing.annotate(cached=True)
+            return cached
         try:
-            # Run ollama and capture the complete response
-            process = subprocess.Popen(
-                ["ollama", "run", "llama3.2:3b"],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1  # Line buffered
-            )
-            
-            # Send prompt
-            process.stdin.write(prompt)
-            process.stdin.close()
-            
-            # Read full output without printing line by line to avoid
-            # duplicate messages in the CLI
-            output = process.stdout.read()
-
-            process.stdout.close()
-            process.wait(timeout=60)
-            
-            plan = self._parse_plan_from_output(output.strip())
+            stream = self.ollama.stream_generate(prompt, options={"num_predict": self.max_plan_tokens})
+            try:
+                plan = self._stream_plan(chunk.get("response", "") for chunk in stream)
+            finally:
+                stream.close()
+            if is_cacheable_plan(plan, self.tools.has_side_effects):
+                self._cache_put(key, plan)
             return plan
         except Exception as e:
+            tracing.annotate(error=str(e))
             return {"tool": "none", "args": {}, "error": str(e), "fallback_to_api": True}
 
+    @tracing.traced("plan_api", kind="llm")
     def _plan_with_api(self, request: str, chat_history=None) -> dict:
         import openai
         openai.api_key = self.api_key
-        prompt = self._get_prompt(request, local=False, chat_history=chat_history)
+        # History goes in as chat messages, so the user prompt itself carries none
+        prompt = self._get_prompt(request, local=False)
+        system = self._system_prompt(api=True)
 
         # Build the messages array with chat history
-        messages = [{"role": "system", "content": self._system_prompt(api=True)}]
-        
-        # Add chat history if provided
+        messages = [{"role": "system", "content": system}]
+
+        # Add chat history if provided, newest turns first within the token budget
         if chat_history:
-            for entry in chat_history:
-                role = entry.get('role', '')
-                content = entry.get('content', '')
-                # Convert roles to OpenAI format
-                if role == 'user':
-                    messages.append({"role": "user", "content": content})
-                elif role == 'assistant' or role.startswith('llm_'):
-                    messages.append({"role": "assistant", "content": content})
-                    
+            summary, chat_history = split_summary(chat_history)
+            if summary:
+                messages[0]["content"] += f"\nSummary of the earlier conversation:\n{summary}\n"
+            # Convert roles to OpenAI format
+            convertible = [
+                e for e in chat_history
+                if e.get('role') in ('user', 'assistant') or e.get('role', '').startswith('llm_')
+            ]
+            window = self.api_context.build(convertible, pinned=(messages[0]["content"], prompt))
+            self.last_context_stats = window.stats()
+            for entry in window.entries:
+                role = "user" if entry.get('role') == 'user' else "assistant"
+                messages.append({"role": role, "content": entry['content']})
+
         # Add the current request
         messages.append({"role": "user", "content": prompt})
-        
+
+        tracing.annotate(model=self.api_model,
+                         prompt_tokens=sum(estimate_tokens(m["content"]) for m in messages))
+        key = make_key(messages, self.api_model, self.temperature)
+        cached = self._cache_get(key)
+        if cached is not None:
+            tracing.annotate(cached=True)
+            return cached
         try:
-            # Request completion and capture the full response without printing
-            output = ""
-            for chunk in openai.chat.completions.create(
-                model="gpt-4.1-2025-04-14",
+            # Stream the completion and stop as soon as the tool object is complete
+            stream = openai.chat.completions.create(
+                model=self.api_model,
                 messages=messages,
-                temperature=0.2,
-                max_tokens=512,
+                temperature=self.temperature,
+                max_tokens=self.max_plan_tokens,
                 stream=True
-            ):
-                if chunk.choices[0].delta.content is not None:
-                    output += chunk.choices[0].delta.content
-                    
-            plan = self._parse_plan_from_output(output.strip())
+            )
+            try:
+                plan = self._stream_plan(
+                    chunk.choices[0].delta.content or "" for chunk in stream if chunk.choices
+                )
+            finally:
+                stream.close()
+            if is_cacheable_plan(plan, self.tools.has_side_effects):
+                self._cache_put(key, plan)
             return plan
         except Exception as e:
+            tracing.annotate(error=str(e))
             return {"tool": "none", "args": {}, "error": str(e)}
 
+    def _stream_plan(self, chunks) -> dict:
+        """
+        Feed streamed text into the incremental parser and return the first complete plan.
+        Leaving the loop early closes `chunks`, which aborts the underlying HTTP stream.
+        """
+        parser = StreamingPlanParser(TASK_END_TOKEN)
+        try:
+            for text in chunks:
+                check_cancelled()
+                if parser.feed(text):
+                    break
+        finally:
+            chunks.close()
+            self.last_stream_stats = parser.stats(self.max_plan_tokens)
+            tracing.annotate(completion_tokens=self.last_stream_stats["tokens_generated"],
+                             ttft_s=self.last_stream_stats["time_to_first_token"],
+                             stopped_early=self.last_stream_stats["stopped_early"])
+        if parser.plan is not None:
+            return parser.plan
+        return self._parse_plan_from_output(parser.text.strip())
+
     def _get_prompt(self, request: str, local: bool, chat_history=None) -> str:
         """
         Returns a detailed prompt for the LLM, describing available tools and expected output format.
         Includes chat history for context if available.
+
+        Layout: static prefix (instructions, tools, rules), then history, then the request.
+        The prefix is byte-identical on every call, so the local server can keep its KV cache
+        for it between turns and only prefill what changed.
         """
-        tool_desc = self._tool_description()
-        
-        # Format chat history if available
+        # Format chat history if available, trimmed to the token budget
         history_context = ""
         if chat_history:
-            history_context = "Previous conversation:\n"
-            for entry in chat_history:
-                role = "User" if entry.get('role') == 'user' else "Assistant"
-                content = entry.get('content', '').strip()
-                if content:
-                    history_context += f"{role}: {content}\n"
-            history_context += "\n"  # separate from the new request
+            summary, chat_history = split_summary(chat_history)
+            if summary:
+                history_context = f"Summary of the earlier conversation:\n{summary}\n\n"
+            builder = self.local_context if local else self.api_context
+            # The history-free prompt holds the pinned parts: tool list, request and rules
+            window = builder.build(chat_history, pinned=(self._get_prompt(request, local), history_context))
+            self.last_context_stats = window.stats()
+            if window.entries:
+                history_context += "Previous conversation:\n"
+                for entry in window.entries:
+                    role = "User" if entry.get('role') == 'user' else "Assistant"
+                    content = entry['content']
+                    if content:
+                        history_context += f"{role}: {content}\n"
+                history_context += "\n"  # separate from the new request
+
+        return f"{self._prompt_prefix()}{history_context}User request: {request}\n"
 
+    def _prompt_prefix(self) -> str:
+        """The part of every planning prompt that doesn't depend on the turn."""
         return f"""
 You are a command-running agent on a real Linux machine. Follow the rules and use the tools provided.
 
-{tool_desc}
-{history_context}User request: {request}
-
+{self._tool_description()}
 Rules:
 1. Begin with a short progress sentence.
-2. After that, output ONE JSON tool command.
+2. After that, output ONE JSON tool command, or one batch of independent tool calls.
 3. Keep using tools step by step until the job is finished.
 4. When everything is done, append '{TASK_END_TOKEN}' to your last sentence and output {{"tool": "none", "args": {{}}}}.
+
 """
 
     def _system_prompt(self, api: bool) -> str:
@@ -213,75 +300,132 @@ Rules:
             f"You control a real Linux machine. Follow these rules exactly:\n"
             "1. Start with a brief progress note.\n"
             "2. Output one JSON tool command after your note.\n"
-            "3. Use one tool per response until the job is done.\n"
+            "3. Use one tool (or one batch of independent tools) per response until the job is done.\n"
             f"4. When finished, append '{TASK_END_TOKEN}' to your last note and output {{\"tool\": \"none\", \"args\": {{}}}}.\n"
         )
 
     def _tool_description(self) -> str:
-        return (
-            "AVAILABLE TOOLS:\n\n"
-            "Input/Output:\n"
-            '{"tool": "screen_ocr", "args": {}} - Capture screen text\n'
-            '{"tool": "move_mouse", "args": {"x": 123, "y": 456}} - Move mouse\n'
-            '{"tool": "click", "args": {}} - Click mouse\n'
-            '{"tool": "type_text", "args": {"text": "text"}} - Type text\n\n'
-            "Files:\n"
-            '{"tool": "read_file", "args": {"path": "/path"}} - Read file\n'
-            '{"tool": "write_file", "args": {"path": "/path", "content": "text"}} - Write file\n'
-            '{"tool": "append_file", "args": {"path": "/path", "content": "text"}} - Append to file\n\n'
-            "System & Web:\n"
-            '{"tool": "search_web", "args": {"query": "terms"}} - Web search\n'
-            '{"tool": "run_command", "args": {"cmd": "command"}} - Shell command\n\n'
-            "Memory & Communication:\n"
-            '{"tool": "memory_notepad_add", "args": {"note": "text"}} - Add note\n'
-            '{"tool": "memory_rag_query", "args": {"query": "text"}} - Query memory\n'
-            '{"tool": "inquiry", "args": {"text": "question"}} - Ask user\n'
-            '{"tool": "none", "args": {}} - No action needed\n'
+        return self.tools.prompt() + (
+            "Batch (independent calls run in parallel; use \"after\" to wait for other calls):\n"
+            '{"tool": "batch", "calls": [{"id": "a", "tool": "read_file", "args": {"path": "/x"}}, '
+            '{"id": "b", "tool": "run_command", "args": {"cmd": "ls"}, "after": ["a"]}]}\n'
         )
 
+    @tracing.traced("answer", kind="llm")
     def answer_question(self, question: str) -> str:
-        """Answer a question directly using the best available LLM, routing easy questions to Ollama and harder ones to OpenAI if available."""
-        # Heuristic: if question is very short/simple, use Ollama; else use OpenAI if available
-        q = question.strip().lower()
-        easy_greetings = ["hi", "hello", "hey", "how are you", "good morning", "good evening", "good night"]
-        is_easy = (
-            q in easy_greetings or
-            (len(q.split()) <= 8 and not any(x in q for x in ["explain", "why", "how", "summarize", "analyze", "compare", "difference", "write", "code", "generate", "complex", "difficult"]))
-        )
-        if is_easy:
-            try:
-                prompt = f"Answer the following question concisely and factually.\nQuestion: {question}"
-                result = subprocess.run([
-                    "ollama", "run", "llama3.2:3b"
-                ], input=prompt, capture_output=True, text=True, timeout=60)
-                return result.stdout.strip()
-            except Exception as e:
-                return f"[Local LLM error: {e}]"
-        # Otherwise, use OpenAI if available
-        if self.use_api and self.api_key:
-            try:
-                import openai
-                openai.api_key = self.api_key
-                response = openai.chat.completions.create(
-                    model="gpt-4.1-2025-04-14",
-                    messages=[{"role": "system", "content": "You are a helpful assistant."},
-                              {"role": "user", "content": question}],
-                    temperature=0.2,
-                    max_tokens=512
-                )
-                return response.choices[0].message.content.strip()
-            except Exception as e:
-                return f"[API error: {e}]"
-        # Fallback to Ollama if OpenAI is not available
+        """Answer a question directly, serving repeated questions from the response cache."""
+        tracing.annotate(prompt_tokens=estimate_tokens(question))
+        key = make_key(question, "answer:" + self.local_model + ":" + self.api_model, self.temperature)
+        cached = self._cache_get(key)
+        if cached is not None:
+            tracing.annotate(cached=True)
+            return cached
+        answer = self._answer_question_uncached(question)
+        tracing.annotate(completion_tokens=estimate_tokens(answer))
+        if answer and answer.startswith("["):
+            tracing.annotate(error=answer)
+        # Error replies look like "[Local LLM error: ...]" and must not be cached
+        if answer and not answer.startswith("["):
+            self._cache_put(key, answer)
+        return answer
+
+    def _answer_question_uncached(self, question: str) -> str:
+        """Answer a question directly with whichever backend the router picks for the answer SLO."""
+        calls = self._backends(lambda: self._answer_with_local(question),
+                               lambda: self._answer_with_api(question))
+        answer, _ = self.router.call(calls, slo=self.answer_slo, purpose="answer",
+                                     validate=lambda a: bool(a) and not a.startswith("["))
+        return answer
+
+    def _answer_with_api(self, question: str) -> str:
+        try:
+            import openai
+            openai.api_key = self.api_key
+            response = openai.chat.completions.create(
+                model=self.api_model,
+                messages=[{"role": "system", "content": "You are a helpful assistant."},
+                          {"role": "user", "content": question}],
+                temperature=self.temperature,
+                max_tokens=512
+            )
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            return f"[API error: {e}]"
+
+    def _answer_with_local(self, question: str) -> str:
         try:
             prompt = f"Answer the following question concisely and factually.\nQuestion: {question}"
-            result = subprocess.run([
-                "ollama", "run", "llama3.2:3b"
-            ], input=prompt, capture_output=True, text=True, timeout=60)
-            return result.stdout.strip()
+            return self.ollama.generate_text(prompt)
+        except Exception as e:
+            return f"[Local LLM error: {e}]"
+
+    @tracing.traced("summarize", kind="llm")
+    def summarize_history(self, previous: str, entries) -> str:
+        """
+        Fold `entries` (old chat turns) into the rolling summary `previous`. Routed and limited like
+        any other model call (local first); raises if no backend produced a summary.
+        """
+        lines = []
+        for entry in entries:
+            role = "User" if entry.get('role') == 'user' else "Assistant"
+            content = str(entry.get('content', '')).strip()
+            if entry.get('role') in TOOL_ROLES:
+                role, content = "Tool", truncate_middle(content, self.local_context.max_tool_tokens)
+            if content:
+                lines.append(f"{role}: {content}")
+        prompt = (
+            "You maintain a running summary of a conversation between a user and a command-running agent.\n"
+            "Keep facts, decisions, file paths, results and open tasks; drop chatter. Reply with the summary only.\n\n"
+            f"Summary so far:\n{previous or '(none)'}\n\n"
+            "New conversation turns:\n" + "\n".join(lines) + "\n\nUpdated summary:"
+        )
+        tracing.annotate(prompt_tokens=estimate_tokens(prompt))
+        calls = self._backends(lambda: self._summarize_with_local(prompt),
+                               lambda: self._summarize_with_api(prompt))
+        summary, backend = self.summary_router.call(
+            calls, purpose="summarize", validate=lambda s: bool(s and s.strip()) and not s.startswith("["))
+        if not summary or not summary.strip() or summary.startswith("["):
+            raise RuntimeError(summary or "empty summary")
+        tracing.annotate(model=self.local_model if backend == "local" else self.api_model,
+                         completion_tokens=estimate_tokens(summary))
+        return summary
+
+    def _summarize_with_local(self, prompt: str) -> str:
+        try:
+            return self.ollama.generate_text(prompt, options={"num_predict": self.summary_tokens})
         except Exception as e:
             return f"[Local LLM error: {e}]"
 
+    def _summarize_with_api(self, prompt: str) -> str:
+        try:
+            import openai
+            openai.api_key = self.api_key
+            response = openai.chat.completions.create(
+                model=self.api_model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=self.temperature,
+                max_tokens=self.summary_tokens
+            )
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            return f"[API error: {e}]"
+
+    def embed(self, text: str) -> list:
+        return self.ollama.embed(text, self.embedding_model)
+
+    def _cache_get(self, key):
+        if self.cache is None:
+            return None
+        return self.cache.get(key)
+
+    def _cache_put(self, key, value):
+        if self.cache is not None:
+            self.cache.put(key, value)
+
+    def cache_stats(self) -> dict:
+        """Hit/miss counters of the response cache (empty if caching is disabled)."""
+        return self.cache.stats() if self.cache is not None else {}
+
     def _output_format(self) -> str:
         # Note: This method is kept for compatibility but no longer used
         # All format information is now included in _tool_description
@@ -298,6 +442,8 @@ Rules:
             end = output.rfind('}') + 1
             if start != -1 and end != -1:
                 plan = json.loads(output[start:end])
+                if isinstance(plan.get('calls'), list):
+                    plan['tool'] = 'batch'
                 text = (output[:start] + output[end:]).strip()
                 if text:
                     plan['message'] = text
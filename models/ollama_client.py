@@ -0,0 +1,176 @@
+"""
+Ollama HTTP client: talks to a running Ollama server over a pooled keep-alive session.
+
+Replaces spawning `ollama run <model>` per call. The server keeps the model loaded
+(`keep_alive`, -1 = until the server stops; `warm` loads it ahead of the first request) and the
+TCP connection is reused between agent steps. `requests` is only imported when the first
+request is made, keeping it off the startup path.
+
+Every call notes its prefill time on the current trace span: from the server's
+prompt_eval_duration when the reply completes, else the time to the first streamed chunk
+(plans usually stop reading before the final chunk). `prefill_tokens` below the prompt size
+means the server reused its KV cache for the shared prompt prefix.
+"""
+import json
+import time
+import threading
+
+from models.cancel import check_cancelled, current_token
+from models import tracing
+
+DEFAULT_HOST = "http://127.0.0.1:11434"
+DEFAULT_MODEL = "llama3.2:3b"
+DEFAULT_KEEP_ALIVE = "30m"
+
+
+class OllamaError(RuntimeError):
+    """Raised when the Ollama server is unreachable or returns an error."""
+
+
+def server_timings(reply) -> dict:
+    """Prefill/load/generation timings from a final Ollama reply (durations there are in ns)."""
+    timings = {}
+    if reply.get("prompt_eval_duration") is not None:
+        timings["prefill_ms"] = round(reply["prompt_eval_duration"] / 1e6, 1)
+    if reply.get("prompt_eval_count") is not None:
+        timings["prefill_tokens"] = reply["prompt_eval_count"]
+    if reply.get("load_duration"):
+        timings["load_ms"] = round(reply["load_duration"] / 1e6, 1)
+    if reply.get("eval_count") and reply.get("eval_duration"):
+        timings["eval_tokens_per_sec"] = round(reply["eval_count"] / (reply["eval_duration"] / 1e9), 1)
+    return timings
+
+
+class OllamaClient:
+    def __init__(self, host=DEFAULT_HOST, model=DEFAULT_MODEL, keep_alive=DEFAULT_KEEP_ALIVE,
+                 timeout=60, connect_timeout=5, pool_size=4):
+        self.host = host.rstrip('/')
+        self.model = model
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.pool_size = pool_size
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+
+    def generate(self, prompt, model=None, timeout=None, options=None, **extra) -> dict:
+        """Single-shot completion via /api/generate. Returns the server's JSON reply."""
+        payload = self._payload(model, options, extra, prompt=prompt, stream=False)
+        reply = self._post("/api/generate", payload, timeout=timeout).json()
+        tracing.annotate(**server_timings(reply))
+        return reply
+
+    def stream_generate(self, prompt, model=None, timeout=None, options=None, **extra):
+        """Yield /api/generate chunks as they arrive. Closing the generator aborts the request."""
+        payload = self._payload(model, options, extra, prompt=prompt, stream=True)
+        yield from self._stream("/api/generate", payload, timeout)
+
+    def chat(self, messages, model=None, timeout=None, options=None, **extra) -> dict:
+        """Single-shot chat completion via /api/chat."""
+        payload = self._payload(model, options, extra, messages=messages, stream=False)
+        reply = self._post("/api/chat", payload, timeout=timeout).json()
+        tracing.annotate(**server_timings(reply))
+        return reply
+
+    def stream_chat(self, messages, model=None, timeout=None, options=None, **extra):
+        """Yield /api/chat chunks as they arrive. Closing the generator aborts the request."""
+        payload = self._payload(model, options, extra, messages=messages, stream=True)
+        yield from self._stream("/api/chat", payload, timeout)
+
+    def embed(self, text, model, timeout=None) -> list:
+        """Embedding vector for `text` via /api/embed."""
+        payload = self._payload(model, None, {}, input=text)
+        return self._post("/api/embed", payload, timeout=timeout).json()["embeddings"][0]
+
+    def warm(self, model=None, timeout=None) -> dict:
+        """
+        Load the model and pin it for `keep_alive` without generating anything (a request with
+        no prompt). Returns the server timings, e.g. {"load_ms": ...}.
+        """
+        payload = self._payload(model, None, {})
+        return server_timings(self._post("/api/generate", payload, timeout=timeout).json())
+
+    def warm_in_background(self, model=None):
+        """`warm` on a daemon thread; failures are ignored (the first real call will report them)."""
+        def run():
+            try:
+                self.warm(model)
+            except Exception:
+                pass
+        threading.Thread(target=run, name="ollama-warm", daemon=True).start()
+
+    def generate_text(self, prompt, **kwargs) -> str:
+        """Convenience wrapper returning only the generated text."""
+        if current_token() is not None:
+            # Stream so a cancelled caller stops the generation between chunks
+            return "".join(c.get("response", "") for c in self.stream_generate(prompt, **kwargs)).strip()
+        return self.generate(prompt, **kwargs).get("response", "").strip()
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+    def _payload(self, model, options, extra, **fields) -> dict:
+        payload = {"model": model or self.model, "keep_alive": self.keep_alive}
+        payload.update(fields)
+        if options:
+            payload["options"] = options
+        payload.update(extra)
+        return payload
+
+    def _post(self, path, payload, timeout=None, stream=False):
+        import requests
+        try:
+            resp = self.session.post(
+                self.host + path,
+                json=payload,
+                stream=stream,
+                timeout=(self.connect_timeout, timeout or self.timeout),
+            )
+        except requests.RequestException as e:
+            raise OllamaError(f"Ollama request failed: {e}") from e
+        if resp.status_code != 200:
+            body = resp.text[:200]
+            resp.close()
+            raise OllamaError(f"Ollama returned HTTP {resp.status_code}: {body}")
+        return resp
+
+    def _stream(self, path, payload, timeout):
+        import requests
+        started = time.perf_counter()
+        resp = self._post(path, payload, timeout=timeout, stream=True)
+        first = True
+        try:
+            for line in resp.iter_lines():
+                check_cancelled()
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise OllamaError(chunk["error"])
+                if first:
+                    first = False
+                    tracing.annotate(prefill_ms=round((time.perf_counter() - started) * 1000, 1))
+                if chunk.get("done"):
+                    tracing.annotate(**server_timings(chunk))
+                yield chunk
+                if chunk.get("done"):
+                    break
+        except requests.RequestException as e:
+            raise OllamaError(f"Ollama stream failed: {e}") from e
+        finally:
+            resp.close()
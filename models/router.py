@@ -0,0 +1,195 @@
+"""
+Model router: picks between the local model and the API per call from observed latency and
+success rates, instead of keyword lists.
+
+Each backend keeps a rolling window of recent calls. For a call with a latency SLO the router
+prefers, in configured order (local first: it's free), the first backend whose p95 fits the
+SLO and whose success rate is acceptable. If none qualifies, it picks the backend with the
+lowest p95. With hedging on, when the primary hasn't answered after its own p95 (capped at
+half the SLO), the next backend is started too. The first valid answer wins and the other
+call is cancelled through its cancel token (streams stop between chunks). A failed or
+invalid answer starts the next backend at once. What counts for tail latency is the hedge,
+not the average.
+"""
+import time
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from models.cancel import CancelToken, Cancelled, set_token, check_cancelled
+from models import tracing
+
+WINDOW = 50
+# Samples older than this are dropped, so a backend that failed a while ago gets retried
+SAMPLE_TTL = 600
+MIN_SUCCESS = 0.8
+# Fewer samples than this aren't enough to call a backend unhealthy
+MIN_SAMPLES = 3
+# Assumed p95 (seconds) for a backend with no history yet
+PRIOR_LATENCY = {"local": 2.0, "api": 4.0}
+POLL_INTERVAL = 0.1
+
+
+class BackendStats:
+    """Rolling latency and success window for one backend."""
+
+    def __init__(self, prior=2.0, window=WINDOW, ttl=SAMPLE_TTL):
+        self.prior = prior
+        self.ttl = ttl
+        self.samples = deque(maxlen=window)  # (recorded at, seconds, ok)
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok):
+        with self._lock:
+            self.samples.append((time.monotonic(), seconds, bool(ok)))
+
+    def _recent(self) -> list:
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            while self.samples and self.samples[0][0] < cutoff:
+                self.samples.popleft()
+            return [(seconds, ok) for _, seconds, ok in self.samples]
+
+    def percentile(self, q) -> float:
+        latencies = sorted(seconds for seconds, ok in self._recent() if ok)
+        if not latencies:
+            return self.prior
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    @property
+    def success_rate(self) -> float:
+        samples = self._recent()
+        if len(samples) < MIN_SAMPLES:
+            return 1.0
+        return sum(ok for _, ok in samples) / len(samples)
+
+    def summary(self) -> dict:
+        return {"calls": len(self._recent()), "p50_s": round(self.percentile(0.5), 3),
+                "p95_s": round(self.percentile(0.95), 3), "success_rate": round(self.success_rate, 3)}
+
+
+class ModelRouter:
+    def __init__(self, order=("local", "api"), hedge=True, hedge_delay=None, window=WINDOW,
+                 min_success=MIN_SUCCESS, priors=None):
+        """
+        Args:
+            order: Backend preference when several meet the SLO (cheapest first)
+            hedge: Start the next backend when the primary is slow, keeping the first valid answer
+            hedge_delay: Fixed seconds before hedging; None = primary's p95, capped at half the SLO
+        """
+        self.order = list(order)
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.min_success = min_success
+        priors = dict(PRIOR_LATENCY, **(priors or {}))
+        self.stats = {name: BackendStats(priors.get(name, 2.0), window) for name in self.order}
+        self.pool = ThreadPoolExecutor(max_workers=2 * len(self.order), thread_name_prefix="router")
+
+    def rank(self, names, slo) -> list:
+        """Backends in the order they should be tried for a call with latency budget `slo`."""
+        names = [n for n in self.order if n in names]
+        healthy = [n for n in names if self.stats[n].success_rate >= self.min_success]
+        fits = [n for n in healthy if slo is None or self.stats[n].percentile(0.95) <= slo]
+        if fits:
+            primary = fits[0]
+        else:
+            primary = min(healthy or names, key=lambda n: self.stats[n].percentile(0.95))
+        rest = sorted((n for n in names if n != primary), key=lambda n: self.stats[n].percentile(0.95))
+        return [primary] + rest
+
+    def call(self, calls, slo=None, validate=None, purpose="call"):
+        """
+        Run `calls` ({backend: zero-arg callable}) as routed. Returns (result, backend).
+        If nothing returns a valid result, the last result is returned.
+        """
+        validate = validate or (lambda result: result is not None)
+        order = self.rank(calls, slo)
+        with tracing.span(purpose, kind="route", primary=order[0], slo_s=slo) as span:
+            if not self.hedge or len(order) == 1:
+                result, backend = self._sequential(order, calls, validate, span)
+            else:
+                result, backend = self._hedged(order, calls, validate, slo, span)
+            span.set(backend=backend)
+            if backend != order[0]:
+                # A hedge that beat a still-running primary, or a failed primary's replacement
+                failed = span.attrs.get(f"{order[0]}_failed")
+                tracing.count(f"fallback_to_{backend}" if failed else "hedge_win")
+            return result, backend
+
+    def summary(self) -> dict:
+        return {name: stats.summary() for name, stats in self.stats.items()}
+
+    def _sequential(self, order, calls, validate, span):
+        result = None
+        for name in order:
+            started = time.monotonic()
+            result = calls[name]()
+            ok = validate(result)
+            self.stats[name].record(time.monotonic() - started, ok)
+            if ok:
+                return result, name
+            span.set(**{f"{name}_failed": True})
+        return result, order[-1]
+
+    def _hedged(self, order, calls, validate, slo, span):
+        waiting = list(order)
+        running = {}  # future -> (backend, token, started)
+        result, backend = None, order[-1]
+
+        def launch():
+            if running:
+                # Started while an earlier backend is still working on it
+                span.set(hedged=True)
+            name = waiting.pop(0)
+            token = CancelToken()
+            ctx = contextvars.copy_context()
+            ctx.run(set_token, token)
+            running[self.pool.submit(ctx.run, calls[name])] = (name, token, time.monotonic())
+
+        def cancel_all():
+            for _, token, _ in running.values():
+                token.cancel()
+
+        launch()
+        delay = self.hedge_delay
+        if delay is None:
+            delay = self.stats[order[0]].percentile(0.95)
+            if slo is not None:
+                delay = min(delay, slo / 2)
+        hedge_at = time.monotonic() + delay
+        while running:
+            try:
+                check_cancelled()
+            except Cancelled:
+                cancel_all()
+                raise
+            timeout = POLL_INTERVAL
+            if waiting:
+                timeout = max(0.0, min(timeout, hedge_at - time.monotonic()))
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, _, started = running.pop(future)
+                try:
+                    value = future.result()
+                except Cancelled:
+                    continue
+                except Exception:
+                    value = None
+                ok = validate(value)
+                self.stats[name].record(time.monotonic() - started, ok)
+                if ok:
+                    cancel_all()
+                    # The losers took at least this long: count it so a slow primary's p95 rises
+                    for loser, _, loser_started in running.values():
+                        self.stats[loser].record(time.monotonic() - loser_started, True)
+                    return value, name
+                span.set(**{f"{name}_failed": True})
+                result, backend = value, name
+                if waiting:
+                    # Failed: don't wait for the hedge delay
+                    hedge_at = time.monotonic()
+            if waiting and time.monotonic() >= hedge_at:
+                launch()
+                hedge_at = time.monotonic() + delay
+        return result, backend
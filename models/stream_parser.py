@@ -0,0 +1,104 @@
+"""
+Streaming plan parser: finds the first complete JSON tool object in a token stream.
+
+The model replies with a short note followed by one JSON object, then often keeps talking.
+Feeding chunks into StreamingPlanParser lets the caller stop the generation as soon as the
+object closes, instead of paying for the rambling tail and parsing afterwards.
+"""
+import json
+import time
+
+from models.context import estimate_tokens
+
+
+class StreamingPlanParser:
+    def __init__(self, end_token):
+        self.end_token = end_token
+        self.text = ""
+        self.plan = None
+        self.task_end = False
+        self.chunks = 0
+        self.started = time.monotonic()
+        self.first_token_at = None
+        self.plan_at = None
+        self._start = -1  # index of the '{' opening the current candidate object
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._pos = 0
+
+    def feed(self, chunk: str) -> bool:
+        """Consume a chunk. Returns True once a complete plan object has been parsed."""
+        if self.plan is not None:
+            return True
+        if chunk and self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+        self.chunks += 1
+        self.text += chunk
+        if self.end_token in self.text:
+            self.task_end = True
+        while self._pos < len(self.text):
+            ch = self.text[self._pos]
+            self._pos += 1
+            if self._start == -1:
+                if ch == '{':
+                    self._start = self._pos - 1
+                    self._depth = 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == '{':
+                self._depth += 1
+            elif ch == '}':
+                self._depth -= 1
+                if self._depth == 0 and self._try_parse(self._start, self._pos):
+                    return True
+        return False
+
+    def _try_parse(self, start, end) -> bool:
+        try:
+            obj = json.loads(self.text[start:end])
+        except ValueError:
+            obj = None
+        if not isinstance(obj, dict) or not ("tool" in obj or "calls" in obj):
+            # Braces in prose, not a tool object: resume scanning after this '{'
+            self._pos = start + 1
+            self._start = -1
+            self._in_string = False
+            self._escape = False
+            return False
+        if isinstance(obj.get("calls"), list):
+            obj["tool"] = "batch"
+        message = self.text[:start].replace(self.end_token, "").strip()
+        if message:
+            obj["message"] = message
+        if self.task_end:
+            obj["task_end"] = True
+        self.plan = obj
+        self.plan_at = time.monotonic()
+        return True
+
+    def stats(self, max_tokens=None) -> dict:
+        """
+        Timing and token counts for the stream. `unused_budget` is how much of `max_tokens`
+        (num_predict) was left when the stream stopped at the plan. It is not the number of
+        tokens saved: the model might have stopped on its own before using its whole budget.
+        """
+        generated = estimate_tokens(self.text)
+        stats = {
+            "chunks": self.chunks,
+            "tokens_generated": generated,
+            "stopped_early": self.plan is not None,
+            "time_to_first_token": round(self.first_token_at - self.started, 4) if self.first_token_at else None,
+            "time_to_first_action": round(self.plan_at - self.started, 4) if self.plan_at else None,
+        }
+        if max_tokens is not None:
+            stats["unused_budget"] = max(0, max_tokens - generated) if self.plan is not None else 0
+        return stats
@@ -0,0 +1,334 @@
+"""
+Tracing: spans for requests, agent steps, LLM calls and tool runs, plus metrics derived from them.
+
+    with span("plan_local", kind="llm", model=...):
+        ...
+        annotate(prompt_tokens=..., completion_tokens=...)
+
+The current span lives in a ContextVar, so spans opened on worker threads (which run in a
+copy of the caller's context, see agent_core/async_agent.py) nest under the request that
+started them. Finished spans go to a size-rotated JSONL file (cache/traces/spans.jsonl) and
+into in-process aggregates that are written as a Prometheus textfile for node_exporter's
+textfile collector. `summarize` turns spans back into p50/p95 latency and token-throughput
+rows for the CLI stats view.
+
+Batch workers and other processes share the trace file: appends and rotation happen under
+an flock on spans.jsonl.lock, so no process writes into a file another has just rotated away.
+Metrics are per process, so each writes its own textfile (cache/metrics/commander.<pid>.prom,
+series labelled with the pid) and removes the files of processes that are gone.
+"""
+import os
+import glob
+import json
+import time
+import uuid
+import fcntl
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+
+CACHE_DIR = os.path.join(os.path.dirname(__file__), '../cache')
+TRACE_FILE = os.path.join(CACHE_DIR, 'traces', 'spans.jsonl')
+METRICS_FILE = os.path.join(CACHE_DIR, 'metrics', 'commander.prom')
+TRACE_MAX_BYTES = 5 * 1024 * 1024
+TRACE_BACKUPS = 3
+METRICS_INTERVAL = 5.0
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_current = contextvars.ContextVar("commander_span", default=None)
+
+
+class Span:
+    def __init__(self, name, kind, parent=None, attrs=None):
+        self.name = name
+        self.kind = kind
+        self.id = uuid.uuid4().hex[:16]
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex[:16]
+        self.parent_id = parent.id if parent is not None else None
+        self.attrs = dict(attrs or {})
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.duration_ms = None
+        self.status = "ok"
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self):
+        self.duration_ms = round((time.perf_counter() - self._t0) * 1000, 3)
+        if self.attrs.get("error") and self.status == "ok":
+            self.status = "error"
+
+    def to_dict(self) -> dict:
+        return {
+            "trace": self.trace_id, "span": self.id, "parent": self.parent_id,
+            "kind": self.kind, "name": self.name, "start": round(self.start, 6),
+            "ms": self.duration_ms, "status": self.status, "attrs": self.attrs,
+        }
+
+
+class _Series:
+    __slots__ = ("count", "sum", "errors", "buckets", "prompt_tokens", "completion_tokens")
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+        self.buckets = [0] * len(BUCKETS)
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+
+class Tracer:
+    def __init__(self, path=TRACE_FILE, metrics_path=METRICS_FILE, max_bytes=TRACE_MAX_BYTES,
+                 backups=TRACE_BACKUPS, enabled=True):
+        self.path = path
+        self.metrics_path = metrics_path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.enabled = enabled
+        self._reset()
+
+    def _reset(self):
+        # Also run in a forked child, which must not report its parent's counts as its own
+        self.pid = os.getpid()
+        self.series = {}  # (kind, name) -> _Series
+        self.events = {}  # event name -> count
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._metrics_written = 0.0
+        self._pruned = False
+
+    @property
+    def metrics_file(self) -> str:
+        """This process's textfile: commander.prom -> commander.<pid>.prom"""
+        root, ext = os.path.splitext(self.metrics_path)
+        return f"{root}.{self.pid}{ext}"
+
+    def _append(self, line):
+        """Append a line to the trace file, rotating it first when full, under the shared file lock."""
+        data = (line + "\n").encode("utf-8")
+        with self._write_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # Opened per write: a lock file deleted with cache/ must not keep locking a stale inode
+            with open(self.path + ".lock", "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+                    if size and size + len(data) > self.max_bytes:
+                        self._rotate()
+                    with open(self.path, "ab") as f:
+                        f.write(data)
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def record(self, span: Span):
+        if not self.enabled:
+            return
+        if os.getpid() != self.pid:
+            self._reset()
+        self._append(json.dumps(span.to_dict(), default=str))
+        seconds = span.duration_ms / 1000
+        with self._lock:
+            series = self.series.setdefault((span.kind, span.name), _Series())
+            series.count += 1
+            series.sum += seconds
+            series.errors += span.status != "ok"
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    series.buckets[i] += 1
+            series.prompt_tokens += int(span.attrs.get("prompt_tokens") or 0)
+            series.completion_tokens += int(span.attrs.get("completion_tokens") or 0)
+        # Requests finishing always refresh the textfile; other spans at most every few seconds
+        if span.kind == "request" or time.monotonic() - self._metrics_written >= METRICS_INTERVAL:
+            self.write_metrics()
+
+    def count(self, event, n=1):
+        """Bump an event counter (e.g. fallback_to_api) and note it on the current span."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.events[event] = self.events.get(event, 0) + n
+        annotate(**{event: True})
+
+    def write_metrics(self):
+        """Write all series as this process's Prometheus textfile (atomically, via rename)."""
+        self._metrics_written = time.monotonic()
+        with self._lock:
+            text = self._prometheus()
+        path = self.metrics_file
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if not self._pruned:
+            self._pruned = True
+            self._prune_metrics()
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+    def _prune_metrics(self):
+        """Remove the textfiles of processes that have exited."""
+        root, ext = os.path.splitext(self.metrics_path)
+        for path in glob.glob(f"{glob.escape(root)}.*{ext}"):
+            pid = path[len(root) + 1:-len(ext) or None]
+            if pid.isdigit() and not _alive(int(pid)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _prometheus(self) -> str:
+        pid = f'pid="{self.pid}"'
+        lines = [
+            "# HELP commander_span_duration_seconds Duration of requests, agent steps, LLM calls and tools.",
+            "# TYPE commander_span_duration_seconds histogram",
+        ]
+        for (kind, name), s in sorted(self.series.items()):
+            labels = f'{pid},kind="{kind}",name="{name}"'
+            for bound, count in zip(BUCKETS, s.buckets):
+                lines.append(f'commander_span_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'commander_span_duration_seconds_bucket{{{labels},le="+Inf"}} {s.count}')
+            lines.append(f"commander_span_duration_seconds_sum{{{labels}}} {s.sum:.6f}")
+            lines.append(f"commander_span_duration_seconds_count{{{labels}}} {s.count}")
+        lines += ["# HELP commander_span_errors_total Spans that ended in an error.",
+                  "# TYPE commander_span_errors_total counter"]
+        for (kind, name), s in sorted(self.series.items()):
+            lines.append(f'commander_span_errors_total{{{pid},kind="{kind}",name="{name}"}} {s.errors}')
+        lines += ["# HELP commander_llm_tokens_total Prompt and completion tokens per LLM call type.",
+                  "# TYPE commander_llm_tokens_total counter"]
+        for (kind, name), s in sorted(self.series.items()):
+            if kind == "llm":
+                lines.append(f'commander_llm_tokens_total{{{pid},name="{name}",type="prompt"}} {s.prompt_tokens}')
+                lines.append(f'commander_llm_tokens_total{{{pid},name="{name}",type="completion"}} {s.completion_tokens}')
+        lines += ["# HELP commander_events_total Notable events such as fallback_to_api.",
+                  "# TYPE commander_events_total counter"]
+        for event, count in sorted(self.events.items()):
+            lines.append(f'commander_events_total{{{pid},event="{event}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def _alive(pid) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def configure(**kwargs) -> Tracer:
+    """Replace the global tracer, e.g. configure(enabled=False) or a different trace path."""
+    global _tracer
+    _tracer = Tracer(**kwargs)
+    return _tracer
+
+
+def current_span():
+    return _current.get()
+
+
+def annotate(**attrs):
+    """Set attributes on the current span, if any."""
+    current = _current.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def count(event, n=1):
+    _tracer.count(event, n)
+
+
+@contextmanager
+def span(name, kind="internal", **attrs):
+    s = Span(name, kind, _current.get(), attrs)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.status = "error"
+        s.attrs.setdefault("error", f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current.reset(token)
+        s.finish()
+        _tracer.record(s)
+
+
+def traced(name, kind="internal"):
+    """Decorator form of `span`."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, kind):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def read_spans(path=TRACE_FILE, limit=20000, backups=TRACE_BACKUPS) -> list:
+    """Most recent spans from the trace file and its rotated backups, oldest first."""
+    spans = []
+    for i in range(backups, -1, -1):
+        file = f"{path}.{i}" if i else path
+        if not os.path.exists(file):
+            continue
+        with open(file, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    spans.append(json.loads(line))
+                except ValueError:
+                    continue
+    return spans[-limit:]
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def summarize(spans) -> list:
+    """
+    Per (kind, name): count, p50/p95 ms, errors and, for LLM calls, median prefill time, tokens
+    and completion tokens per second. Slowest total time first.
+    """
+    groups = {}
+    for s in spans:
+        groups.setdefault((s.get("kind"), s.get("name")), []).append(s)
+    rows = []
+    for (kind, name), items in groups.items():
+        durations = sorted(s.get("ms") or 0.0 for s in items)
+        prefill = sorted(s["attrs"]["prefill_ms"] for s in items if s.get("attrs", {}).get("prefill_ms") is not None)
+        completion = sum(int(s.get("attrs", {}).get("completion_tokens") or 0) for s in items)
+        total_ms = sum(durations)
+        rows.append({
+            "kind": kind, "name": name, "count": len(items),
+            "p50_ms": round(_percentile(durations, 0.5), 1),
+            "p95_ms": round(_percentile(durations, 0.95), 1),
+            "prefill_p50_ms": round(_percentile(prefill, 0.5), 1) if prefill else None,
+            "total_ms": round(total_ms, 1),
+            "errors": sum(1 for s in items if s.get("status") != "ok"),
+            "prompt_tokens": sum(int(s.get("attrs", {}).get("prompt_tokens") or 0) for s in items),
+            "completion_tokens": completion,
+            "tokens_per_sec": round(completion / (total_ms / 1000), 1) if completion and total_ms else None,
+        })
+    return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
@@ -0,0 +1,158 @@
+"""
+Capture module: screen grabbing backends, region capture and a ring buffer of recent frames.
+
+On X11 the `mss` package grabs through the MIT-SHM extension (shared memory, no copy over
+the X socket); elsewhere, or when mss is missing, PIL.ImageGrab is used. FrameBuffer keeps
+capturing on a background thread so callers can take the latest frame without waiting.
+Works under Xvfb, e.g. `xvfb-run python -m modules.capture` prints a throughput benchmark.
+"""
+import time
+import threading
+from collections import deque
+
+
+class MSSBackend:
+    name = "mss"
+
+    def __init__(self):
+        import mss  # noqa: F401  (fail early if unavailable)
+        self._local = threading.local()  # mss handles are not thread-safe
+
+    def grab(self, region=None):
+        from PIL import Image
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            import mss
+            sct = self._local.sct = mss.mss()
+        if region is None:
+            monitor = sct.monitors[0]
+        else:
+            left, top, right, bottom = region
+            monitor = {"left": left, "top": top, "width": right - left, "height": bottom - top}
+        shot = sct.grab(monitor)
+        return Image.frombytes("RGB", shot.size, shot.bgra, "raw", "BGRX")
+
+
+class ImageGrabBackend:
+    name = "imagegrab"
+
+    def grab(self, region=None):
+        from PIL import ImageGrab
+        return ImageGrab.grab(bbox=region)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Fastest available backend: mss (X11 shared memory) first, then PIL.ImageGrab."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            try:
+                _backend = MSSBackend()
+            except Exception:
+                _backend = ImageGrabBackend()
+        return _backend
+
+
+def preprocess(img, grayscale=False, scale=1.0):
+    if grayscale:
+        img = img.convert("L")
+    if scale != 1.0:
+        from PIL import Image
+        size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+        img = img.resize(size, Image.BILINEAR)
+    return img
+
+
+def capture(region=None, grayscale=False, scale=1.0, backend=None):
+    """
+    Grab the screen or a region.
+
+    Args:
+        region: (left, top, right, bottom) in screen pixels, or None for the whole display
+        grayscale: Convert to 8-bit grayscale (smaller, and all OCR needs)
+        scale: Downscale factor applied after capture
+    """
+    img = (backend or get_backend()).grab(region)
+    return preprocess(img, grayscale, scale)
+
+
+class FrameBuffer:
+    """Bounded ring buffer of recent frames filled by a background capture thread."""
+
+    def __init__(self, size=8, fps=5, region=None, grayscale=False, scale=1.0, backend=None):
+        self.frames = deque(maxlen=size)
+        self.interval = 1.0 / fps
+        self.region = region
+        self.grayscale = grayscale
+        self.scale = scale
+        self.backend = backend
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._ready = threading.Event()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="frame-buffer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def latest(self, wait=0.0):
+        """(timestamp, image) of the newest frame, or None. Only blocks if `wait` > 0 and empty."""
+        if not self.frames and wait:
+            self._ready.wait(wait)
+        try:
+            return self.frames[-1]
+        except IndexError:
+            return None
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                img = capture(self.region, self.grayscale, self.scale, self.backend)
+                self.frames.append((time.time(), img))
+                self._ready.set()
+            except Exception:
+                self.errors += 1
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+
+def benchmark(seconds=3.0, region=None, grayscale=False, scale=1.0) -> dict:
+    """Frames per second for each available backend."""
+    backends = [ImageGrabBackend()]
+    try:
+        backends.insert(0, MSSBackend())
+    except Exception:
+        pass
+    results = {}
+    for backend in backends:
+        frames, deadline = 0, time.monotonic() + seconds
+        started = time.monotonic()
+        try:
+            while time.monotonic() < deadline:
+                capture(region, grayscale, scale, backend)
+                frames += 1
+        except Exception as e:
+            results[backend.name] = f"error: {e}"
+            continue
+        results[backend.name] = round(frames / (time.monotonic() - started), 2)
+    return results
+
+
+if __name__ == "__main__":
+    print(benchmark())
@@ -1,15 +1,282 @@
 """
 Command module: Run shell commands and capture output.
+
+Commands run in a persistent bash session on a pty, so `cd`, `export` and shell variables
+carry over between agent steps. There is one shell per agent session (`use_session`), so
+server sessions and batch jobs don't share a cwd or environment. Each command is followed by
+a sentinel line that marks its end and exit code. Output is streamed into a bounded buffer that keeps the head and tail
+(with a truncation marker in between), and a timed-out command has its process group killed
+without losing the session. Long jobs can run in the background and be polled.
 """
+import os
+import pty
+import uuid
+import signal
+import termios
+import tempfile
+import threading
 import subprocess
+import contextvars
+from contextlib import contextmanager
+
+DEFAULT_TIMEOUT = 120
+HEAD_BYTES = 8 * 1024
+TAIL_BYTES = 24 * 1024
+
+
+class OutputBuffer:
+    """Keeps the first `head` and last `tail` bytes of a stream, counting what was dropped."""
+
+    def __init__(self, head=HEAD_BYTES, tail=TAIL_BYTES):
+        self.head_limit = head
+        self.tail_limit = tail
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, data: bytes):
+        self.total += len(data)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data
+            if len(self.tail) > 2 * self.tail_limit:
+                del self.tail[:-self.tail_limit]
+
+    def render(self) -> str:
+        tail = bytes(self.tail[-self.tail_limit:])
+        dropped = self.total - len(self.head) - len(tail)
+        text = self.head.decode(errors='replace')
+        if dropped > 0:
+            text += f"\n...[truncated {dropped} bytes]...\n"
+        text += tail.decode(errors='replace')
+        return text.replace('\r\n', '\n')
+
+
+class ShellSession:
+    def __init__(self, shell='/bin/bash', head=HEAD_BYTES, tail=TAIL_BYTES):
+        self.shell = shell
+        self.head = head
+        self.tail = tail
+        self.jobs = {}
+        self._lock = threading.Lock()  # one foreground command at a time
+        self._job_dir = tempfile.mkdtemp(prefix='commander_jobs_')
+        self._start()
+
+    def _start(self):
+        master, slave = pty.openpty()
+        attrs = termios.tcgetattr(slave)
+        attrs[3] &= ~termios.ECHO  # don't echo commands back into the output
+        termios.tcsetattr(slave, termios.TCSANOW, attrs)
+        # HISTFILE: the pty makes bash interactive, which would otherwise load ~/.bash_history
+        env = dict(os.environ, PS1='', PS2='', TERM='dumb', PAGER='cat', GIT_PAGER='cat', HISTFILE=os.devnull)
+        self.proc = subprocess.Popen(
+            [self.shell, '--noprofile', '--norc'],
+            stdin=slave, stdout=slave, stderr=slave,
+            start_new_session=True, env=env, close_fds=True,
+        )
+        os.close(slave)
+        self.master = master
+        self._current = None  # (buffer, marker, done event, result holder)
+        self._pending = b''
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+        # Job control gives each command its own process group, so timeouts can kill it alone.
+        # No history expansion: a "!" in a generated command must not pull in an earlier line.
+        self._send('set -m +H +o history; unset HISTFILE\n')
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def run(self, cmd, timeout=DEFAULT_TIMEOUT):
+        """Run `cmd` in the session. Returns (exit_code or None on timeout, output text)."""
+        with self._lock:
+            if not self.alive:
+                self._start()
+            marker = f"__COMMANDER_DONE_{uuid.uuid4().hex}__"
+            buffer = OutputBuffer(self.head, self.tail)
+            done = threading.Event()
+            holder = {}
+            self._current = (buffer, marker.encode(), done, holder)
+            self._pending = b''
+            # stdin is /dev/null: a command reading input must not swallow the sentinel line
+            self._send(f"{{ {cmd}\n}} </dev/null\nprintf '\\n{marker}:%s\\n' \"$?\"\n")
+            if not done.wait(timeout):
+                self._kill_children()
+                if not done.wait(5):
+                    # Shell itself is stuck: start a fresh one
+                    self.close()
+                    self._start()
+                output = buffer.render().rstrip('\n')
+                self._current = None
+                return None, output + f"\n[command timed out after {timeout}s and was killed]"
+            self._current = None
+            if holder.get('exited'):
+                # The command ended the shell itself (e.g. `exit`); the next run starts a new one
+                code = self.proc.wait()
+                return code, (buffer.render().strip('\n') + "\n[shell exited; the next command starts a new one]").lstrip('\n')
+            return holder.get('code'), buffer.render().strip('\n')
+
+    def run_background(self, cmd) -> str:
+        """Start `cmd` as a background job in the session's cwd/env. Returns a job id."""
+        job_id = str(len(self.jobs) + 1)
+        log = os.path.join(self._job_dir, f'job_{job_id}.log')
+        status = os.path.join(self._job_dir, f'job_{job_id}.exit')
+        # Launched from a subshell so the job isn't in the session's job table (no "Done" notices)
+        code, output = self.run(
+            f"( set +m; {{ ( {cmd} ) > '{log}' 2>&1; echo $? > '{status}'; }} & echo $! )", timeout=10)
+        pid = output.strip().splitlines()[-1] if output.strip() else ''
+        self.jobs[job_id] = {"cmd": cmd, "log": log, "status": status, "pid": pid}
+        return job_id
+
+    def poll_job(self, job_id) -> dict:
+        """Status and bounded output of a background job."""
+        job = self.jobs.get(str(job_id))
+        if job is None:
+            return {"error": f"No such job: {job_id}"}
+        code = None
+        if os.path.exists(job["status"]):
+            with open(job["status"]) as f:
+                text = f.read().strip()
+            code = int(text) if text.lstrip('-').isdigit() else None
+        buffer = OutputBuffer(self.head, self.tail)
+        if os.path.exists(job["log"]):
+            size = os.path.getsize(job["log"])
+            with open(job["log"], 'rb') as f:
+                buffer.head = bytearray(f.read(self.head))
+                # Read only the tail; the middle of a huge log is never loaded
+                f.seek(max(len(buffer.head), size - self.tail))
+                buffer.tail = bytearray(f.read(self.tail))
+            buffer.total = size
+        return {"job": str(job_id), "cmd": job["cmd"], "running": code is None,
+                "exit_code": code, "output": buffer.render()}
+
+    def close(self):
+        try:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        try:
+            os.close(self.master)
+        except OSError:
+            pass
+        self.proc.wait()
+
+    def _send(self, text):
+        os.write(self.master, text.encode())
+
+    def _read_loop(self):
+        master = self.master
+        while True:
+            try:
+                data = os.read(master, 65536)
+            except OSError:
+                data = b''
+            if not data:
+                # Shell gone: end the running command now rather than at its timeout
+                current = self._current
+                if current is not None:
+                    buffer, _, done, holder = current
+                    buffer.write(self._pending)
+                    holder['exited'] = True
+                    done.set()
+                return
+            current = self._current
+            if current is None:
+                continue
+            buffer, marker, done, holder = current
+            pending = self._pending + data
+            idx = pending.find(marker)
+            if idx != -1:
+                end = pending.find(b'\n', idx)
+                if end == -1:
+                    self._pending = pending
+                    continue
+                out = pending[:idx]
+                # Drop the newline printf put before the marker
+                if out.endswith(b'\r\n'):
+                    out = out[:-2]
+                elif out.endswith(b'\n'):
+                    out = out[:-1]
+                buffer.write(out)
+                code = pending[idx + len(marker) + 1:end].strip()
+                holder['code'] = int(code) if code.lstrip(b'-').isdigit() else None
+                self._pending = b''
+                done.set()
+                continue
+            # Hold back enough bytes to recognise a marker split across reads
+            keep = len(marker) + 32
+            if len(pending) > keep:
+                buffer.write(pending[:-keep])
+                pending = pending[-keep:]
+            self._pending = pending
 
-def run_command(cmd):
+    def _kill_children(self):
+        """Kill the foreground job's process group, leaving the shell alive."""
+        try:
+            pgid = os.tcgetpgrp(self.master)
+            shell_pgid = os.getpgid(self.proc.pid)
+        except OSError:
+            return
+        # 0 once the shell has exited: killpg(0) would hit our own process group
+        if pgid > 0 and pgid not in (shell_pgid, os.getpgrp()):
+            try:
+                os.killpg(pgid, signal.SIGKILL)
+            except OSError:
+                pass
+
+
+DEFAULT_SESSION = 'default'
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_current = contextvars.ContextVar("shell_session", default=DEFAULT_SESSION)
+
+
+@contextmanager
+def use_session(name):
+    """Run commands in the shell keyed by `name` (e.g. the agent session) within the block."""
+    token = _current.set(name or DEFAULT_SESSION)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def get_session(name=None) -> ShellSession:
+    name = name or _current.get()
+    with _sessions_lock:
+        session = _sessions.get(name)
+        if session is None or not session.alive:
+            session = _sessions[name] = ShellSession()
+        return session
+
+
+def close_session(name):
+    """Stop the shell kept for `name`, if any (when its agent session ends)."""
+    with _sessions_lock:
+        session = _sessions.pop(name, None)
+    if session is not None:
+        session.close()
+
+
+def run_command(cmd, timeout=DEFAULT_TIMEOUT, session=None):
     try:
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        output = result.stdout.strip()
-        if result.returncode != 0 and result.stderr:
+        code, output = get_session(session).run(cmd, timeout=timeout)
+        if code not in (0, None):
             # Include error message if command failed
-            output = f"Error: {result.stderr.strip()}"
+            return f"Error (exit code {code}): {output}" if output else f"Error: exit code {code}"
         return output or "Command executed successfully (no output)"
     except Exception as e:
         return f"Error executing command: {str(e)}"
+
+
+def start_job(cmd, session=None):
+    return get_session(session).run_background(cmd)
+
+
+def job_status(job_id, session=None):
+    return get_session(session).poll_job(job_id)
@@ -1,14 +1,181 @@
 """
 File module: Read, write, edit files.
+
+Reads are ranged (byte offset/length or line ranges, head/tail) and every result is capped at
+`max_bytes` (the file tools pass FILE_RESULT_BYTES from the config, default MAX_RESULT_BYTES),
+so a huge log can't blow up memory or the prompt. search_file scans the file
+through mmap with a regex and returns matching lines with context. Large writes are streamed
+in chunks.
 """
-def read_file(path):
-    with open(path, 'r') as f:
-        return f.read()
+import os
+import re
+import mmap
+
+MAX_RESULT_BYTES = 32 * 1024
+READ_CHUNK = 64 * 1024
+WRITE_CHUNK = 1024 * 1024
+
+
+def _cap(text, max_bytes, hint=""):
+    data = text.encode(errors='replace')
+    if len(data) <= max_bytes:
+        return text
+    kept = data[:max_bytes].decode(errors='ignore')
+    return kept + f"\n...[truncated: showing {max_bytes} of {len(data)} bytes{hint}]"
+
+
+def read_file(path, offset=0, length=None, max_bytes=MAX_RESULT_BYTES):
+    """Read `length` bytes from `offset` (default: from the start), capped at `max_bytes`."""
+    size = os.path.getsize(path)
+    want = size - offset if length is None else min(length, size - offset)
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read(max(0, min(want, max_bytes)))
+    text = data.decode(errors='replace')
+    if want > max_bytes:
+        end = offset + len(data)
+        text += (f"\n...[truncated: showing bytes {offset}-{end} of {size}; "
+                 f"use offset/length or start_line/end_line to read more]")
+    return text
+
+
+def read_lines(path, start=1, end=None, max_bytes=MAX_RESULT_BYTES):
+    """
+    Lines `start`..`end` (1-based, inclusive), streamed without loading the whole file. Reading
+    stops once `max_bytes` are collected, and reads are bounded, so neither a missing `end` nor
+    one huge line without newlines is buffered whole.
+    """
+    out, size, number = [], 0, 1
+    with open(path, 'rb') as f:
+        while end is None or number <= end:
+            piece = f.readline(READ_CHUNK if number < start else max_bytes + 1 - size)
+            if not piece:
+                break
+            if number >= start:
+                out.append(piece)
+                size += len(piece)
+                if size > max_bytes:
+                    kept = b"".join(out)[:max_bytes].decode(errors='ignore')
+                    return kept + f"\n...[truncated at {max_bytes} bytes; narrow the line range]"
+            if piece.endswith(b'\n'):
+                number += 1
+    return b"".join(out).decode(errors='replace')
+
+
+def head(path, lines=20, max_bytes=MAX_RESULT_BYTES):
+    return read_lines(path, 1, lines, max_bytes)
+
 
-def write_file(path, content):
+def tail(path, lines=20, max_bytes=MAX_RESULT_BYTES, block=64 * 1024):
+    """
+    Last `lines` lines, reading backwards from the end in blocks. Reading stops once more than
+    `max_bytes` are in hand; an over-long result keeps its last `max_bytes`.
+    """
+    if lines <= 0:
+        return ""  # not [-0:], which would be every line read
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b''
+        while pos > 0 and data.count(b'\n') <= lines and len(data) <= max_bytes:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    selected = b'\n'.join(data.splitlines()[-lines:])
+    # Stopped short of the first wanted line, or the lines themselves are too long
+    if len(selected) > max_bytes or (pos > 0 and data.count(b'\n') <= lines):
+        kept = selected[-max_bytes:].decode(errors='ignore')
+        return f"...[truncated: showing the last {max_bytes} bytes; request fewer lines]\n" + kept
+    return selected.decode(errors='replace')
+
+
+def _count_newlines(mm, start, end, block=WRITE_CHUNK):
+    # mmap.count only exists on newer Pythons; count in bounded slices instead
+    total = 0
+    for i in range(start, end, block):
+        total += mm[i:min(end, i + block)].count(b'\n')
+    return total
+
+
+def _line_at(mm, start):
+    """(line bytes, offset of the next line) for the line starting at `start`."""
+    end = mm.find(b'\n', start)
+    end = len(mm) if end == -1 else end
+    return mm[start:end], end + 1
+
+
+def search_file(path, pattern, context=2, max_matches=50, ignore_case=False, max_bytes=MAX_RESULT_BYTES):
+    """
+    Regex search over the file via mmap. Returns matching lines with `context` lines around
+    them, prefixed with line numbers (':' marks a match, '-' a context line, '--' a gap).
+    """
+    if os.path.getsize(path) == 0:
+        return "No matches."
+    regex = re.compile(pattern.encode(), re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+    shown = {}  # line number -> (text, is_match)
+    matches = 0
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        line_no, counted_to, pos = 1, 0, 0
+        while matches < max_matches and pos <= len(mm):
+            m = regex.search(mm, pos)
+            if m is None:
+                break
+            start = mm.rfind(b'\n', 0, m.start()) + 1
+            line_no += _count_newlines(mm, counted_to, start)
+            counted_to = start
+            matches += 1
+            text, next_start = _line_at(mm, start)
+            shown[line_no] = (text, True)
+            # Context before: walk back line by line
+            b_start, b_no = start, line_no
+            for _ in range(context):
+                if b_start == 0:
+                    break
+                prev = mm.rfind(b'\n', 0, b_start - 1) + 1
+                b_no -= 1
+                shown.setdefault(b_no, (mm[prev:b_start - 1], False))
+                b_start = prev
+            # Context after
+            a_start, a_no = next_start, line_no
+            for _ in range(context):
+                if a_start >= len(mm):
+                    break
+                a_text, a_next = _line_at(mm, a_start)
+                a_no += 1
+                shown.setdefault(a_no, (a_text, False))
+                a_start = a_next
+            pos = next_start  # one hit per line
+    if not shown:
+        return "No matches."
+    out, prev = [], None
+    for number in sorted(shown):
+        if prev is not None and number > prev + 1:
+            out.append("--")
+        text, is_match = shown[number]
+        out.append(f"{number}{':' if is_match else '-'}{text.decode(errors='replace').rstrip(chr(13))}")
+        prev = number
+    text = "\n".join(out)
+    if matches >= max_matches:
+        text += f"\n...[stopped after {max_matches} matches]"
+    return _cap(text, max_bytes, "; use a narrower pattern")
+
+
+def _write_chunks(f, content, chunk_size):
+    if isinstance(content, str):
+        for i in range(0, len(content), chunk_size):
+            f.write(content[i:i + chunk_size])
+    else:
+        # Any iterable of strings (e.g. a generator) is streamed as it is produced
+        for piece in content:
+            f.write(piece)
+
+
+def write_file(path, content, chunk_size=WRITE_CHUNK):
     with open(path, 'w') as f:
-        f.write(content)
+        _write_chunks(f, content, chunk_size)
+
 
-def append_file(path, content):
+def append_file(path, content, chunk_size=WRITE_CHUNK):
     with open(path, 'a') as f:
-        f.write(content)
+        _write_chunks(f, content, chunk_size)
@@ -1,17 +1,193 @@
 """
 Screen module: Capture screen, OCR, and visual context.
 Requires: Tesseract OCR (install with `sudo apt install tesseract-ocr`)
+
+Repeated reads go through IncrementalOCR: each capture is cut into tiles, tiles are hashed,
+and only tiles that changed since the previous frame are OCR'd again (in parallel across a
+process pool). Recognized words keep their screen bounding boxes, so the merged text layout
+and a diff against the previous read can be produced without touching unchanged tiles.
+
+With SCREEN_FRAME_BUFFER set, the screen tool starts a FrameBuffer on first use so reads
+take the newest buffered frame instead of waiting for a capture; it is stopped at exit.
 """
-import pytesseract
-from PIL import ImageGrab
+import time
+import atexit
+import hashlib
+from difflib import SequenceMatcher
+from concurrent.futures import ProcessPoolExecutor
+
+from modules import capture
+
+TILE_WIDTH = 480
+TILE_HEIGHT = 240
+# Tiles are OCR'd with this much context around them so words on a seam aren't cut in half;
+# a word belongs to the tile containing its center.
+TILE_MARGIN = 24
+OCR_WORKERS = 4
+
+_frame_buffer = None
+
+def capture_screen(region=None, grayscale=False, scale=1.0):
+    # Capture the screen (cross-platform); see modules/capture.py for backends
+    return capture.capture(region, grayscale, scale)
 
-def capture_screen():
-    # Capture the screen (cross-platform)
-    img = ImageGrab.grab()
-    return img
+def start_frame_buffer(size=8, fps=5, **kwargs):
+    """Keep recent frames in a ring buffer so reads don't wait for a capture."""
+    global _frame_buffer
+    if _frame_buffer is None:
+        _frame_buffer = capture.FrameBuffer(size=size, fps=fps, **kwargs)
+        atexit.register(stop_frame_buffer)
+    return _frame_buffer.start()
+
+def stop_frame_buffer():
+    global _frame_buffer
+    if _frame_buffer is not None:
+        _frame_buffer.stop()
+        _frame_buffer = None
+
+def latest_frame(max_age=1.0):
+    """Newest buffered frame if the buffer runs and the frame is fresh, else a new capture."""
+    if _frame_buffer is not None and _frame_buffer.running:
+        frame = _frame_buffer.latest()
+        if frame is not None and time.time() - frame[0] <= max_age:
+            return frame[1]
+    return capture_screen()
 
 def ocr_screen(img=None):
+    import pytesseract
     if img is None:
         img = capture_screen()
     text = pytesseract.image_to_string(img)
     return text
+
+
+def _ocr_tile(job):
+    """Process-pool worker: OCR one padded tile and return words in screen coordinates."""
+    import pytesseract
+    image, (ox, oy), core = job
+    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+    words = []
+    for i, text in enumerate(data["text"]):
+        text = text.strip()
+        if not text or float(data["conf"][i]) < 0:
+            continue
+        left, top = data["left"][i] + ox, data["top"][i] + oy
+        width, height = data["width"][i], data["height"][i]
+        cx, cy = left + width / 2, top + height / 2
+        if core[0] <= cx < core[2] and core[1] <= cy < core[3]:
+            words.append({"text": text, "left": left, "top": top, "width": width, "height": height,
+                          "conf": float(data["conf"][i])})
+    return words
+
+
+def layout_text(words) -> list:
+    """Group words into reading-order lines using their bounding boxes."""
+    if not words:
+        return []
+    words = sorted(words, key=lambda w: w["top"] + w["height"] / 2)
+    heights = sorted(w["height"] for w in words)
+    tolerance = max(4, heights[len(heights) // 2] / 2)
+    lines, current, current_y = [], [], None
+    for w in words:
+        cy = w["top"] + w["height"] / 2
+        if current and abs(cy - current_y) > tolerance:
+            lines.append(current)
+            current = []
+        if not current:
+            current_y = cy
+        current.append(w)
+    lines.append(current)
+    return [" ".join(w["text"] for w in sorted(line, key=lambda w: w["left"])) for line in lines]
+
+
+class IncrementalOCR:
+    def __init__(self, tile_width=TILE_WIDTH, tile_height=TILE_HEIGHT, margin=TILE_MARGIN, workers=OCR_WORKERS):
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.margin = margin
+        self.workers = workers
+        self._tiles = {}  # core box -> (hash, words)
+        self._lines = []
+        self._size = None
+        self._pool = None
+
+    def read(self, img=None) -> dict:
+        """
+        OCR the screen (or `img`), reusing results for unchanged tiles.
+        Returns {"text", "lines", "words", "changed_tiles", "added", "removed"}.
+        """
+        if img is None:
+            img = latest_frame()
+        img = img.convert("L")
+        if img.size != self._size:
+            # Resolution change: every tile is new
+            self._tiles = {}
+            self._size = img.size
+        jobs, fresh = [], {}
+        for core in self._grid(img.size):
+            digest = hashlib.blake2b(img.crop(core).tobytes(), digest_size=16).digest()
+            cached = self._tiles.get(core)
+            if cached is not None and cached[0] == digest:
+                fresh[core] = cached
+                continue
+            padded = (max(0, core[0] - self.margin), max(0, core[1] - self.margin),
+                      min(img.size[0], core[2] + self.margin), min(img.size[1], core[3] + self.margin))
+            jobs.append((core, digest, (img.crop(padded), padded[:2], core)))
+        for (core, digest, _), words in zip(jobs, self._run([job for _, _, job in jobs])):
+            fresh[core] = (digest, words)
+        self._tiles = fresh
+        words = [w for _, tile_words in fresh.values() for w in tile_words]
+        lines = layout_text(words)
+        added, removed = self._diff(self._lines, lines)
+        self._lines = lines
+        return {
+            "text": "\n".join(lines),
+            "lines": lines,
+            "words": words,
+            "changed_tiles": [core for core, _, _ in jobs],
+            "added": added,
+            "removed": removed,
+        }
+
+    def reset(self):
+        self._tiles = {}
+        self._lines = []
+        self._size = None
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _grid(self, size):
+        width, height = size
+        for top in range(0, height, self.tile_height):
+            for left in range(0, width, self.tile_width):
+                yield (left, top, min(width, left + self.tile_width), min(height, top + self.tile_height))
+
+    def _run(self, jobs):
+        if len(jobs) <= 1 or self.workers <= 1:
+            return [_ocr_tile(job) for job in jobs]
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return list(self._pool.map(_ocr_tile, jobs))
+
+    @staticmethod
+    def _diff(old, new):
+        added, removed = [], []
+        for tag, i1, i2, j1, j2 in SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+            if tag in ("replace", "delete"):
+                removed.extend(old[i1:i2])
+            if tag in ("replace", "insert"):
+                added.extend(new[j1:j2])
+        return added, removed
+
+
+_reader = None
+
+def read_screen(img=None) -> dict:
+    """Incremental OCR of the screen using a shared IncrementalOCR instance."""
+    global _reader
+    if _reader is None:
+        _reader = IncrementalOCR()
+    return _reader.read(img)
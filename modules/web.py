@@ -1,14 +1,202 @@
 """
 Web module: Search the web, scrape, and automate browser.
+
+Browsers are expensive to start, so searches borrow a headless Firefox from a small pool of
+long-lived sessions. Sessions are health-checked on checkout and recycled after a number of
+uses. Results are returned as structured dicts and kept in a short TTL cache per query.
 """
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-
-def search_web(query):
-    # Example: DuckDuckGo search
-    driver = webdriver.Firefox()
-    driver.get(f'https://duckduckgo.com/?q={query}')
-    results = driver.find_elements(By.CSS_SELECTOR, 'a.result__a')
-    links = [r.get_attribute('href') for r in results]
-    driver.quit()
-    return links
+import time
+import queue
+import atexit
+import threading
+from collections import OrderedDict
+from urllib.parse import quote_plus
+from concurrent.futures import ThreadPoolExecutor
+
+# DuckDuckGo's HTML endpoint; point these at a local server to test without the internet
+SEARCH_URL = 'https://html.duckduckgo.com/html/?q={query}'
+RESULT_SELECTOR = '.result'
+LINK_SELECTOR = 'a.result__a'
+SNIPPET_SELECTOR = '.result__snippet'
+
+POOL_SIZE = 2
+MAX_USES = 50
+CACHE_TTL = 600
+CACHE_SIZE = 128
+MAX_RESULTS = 10
+
+
+class BrowserUnavailable(RuntimeError):
+    """Every pooled browser stayed busy for the whole acquire timeout."""
+
+
+def _new_driver():
+    from selenium import webdriver
+    options = webdriver.FirefoxOptions()
+    options.add_argument('-headless')
+    return webdriver.Firefox(options=options)
+
+
+class BrowserPool:
+    def __init__(self, size=POOL_SIZE, max_uses=MAX_USES, factory=_new_driver):
+        self.size = size
+        self.max_uses = max_uses
+        self.factory = factory
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self.recycled = 0
+
+    def acquire(self, timeout=60):
+        """Check out a healthy browser, starting one if the pool isn't full yet."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                slot = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        return [self.factory(), 0]
+                    except Exception:
+                        # The slot was never filled: give it back
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise BrowserUnavailable(f"no browser available after {timeout}s "
+                                             f"(all {self.size} in use)")
+                try:
+                    # Short waits: a browser discarded elsewhere frees a slot without going idle
+                    slot = self._idle.get(timeout=min(remaining, 0.5))
+                except queue.Empty:
+                    continue
+            if self._healthy(slot[0]):
+                return slot
+            self._discard(slot)
+
+    def release(self, slot, broken=False):
+        slot[1] += 1
+        if broken or slot[1] >= self.max_uses:
+            self._discard(slot)
+        else:
+            self._idle.put(slot)
+
+    def close(self):
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+    def _healthy(self, driver) -> bool:
+        try:
+            return driver.execute_script('return 1') == 1
+        except Exception:
+            return False
+
+    def _discard(self, slot):
+        with self._lock:
+            self._created -= 1
+        self.recycled += 1
+        try:
+            slot[0].quit()
+        except Exception:
+            pass
+
+
+class _TTLCache:
+    def __init__(self, ttl=CACHE_TTL, size=CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.time():
+                self._data.pop(key, None)
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.time() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_cache = _TTLCache()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+            atexit.register(_pool.close)
+        return _pool
+
+
+def _scrape(driver, query, max_results):
+    from selenium.webdriver.common.by import By
+    driver.get(SEARCH_URL.format(query=quote_plus(query)))
+    results = []
+    for block in driver.find_elements(By.CSS_SELECTOR, RESULT_SELECTOR)[:max_results]:
+        links = block.find_elements(By.CSS_SELECTOR, LINK_SELECTOR)
+        if not links:
+            continue
+        snippets = block.find_elements(By.CSS_SELECTOR, SNIPPET_SELECTOR)
+        results.append({
+            "title": links[0].text.strip(),
+            "url": links[0].get_attribute('href'),
+            "snippet": snippets[0].text.strip() if snippets else "",
+        })
+    return results
+
+
+def search_web(query, max_results=MAX_RESULTS, use_cache=True):
+    """Return a list of {"title", "url", "snippet"} dicts for `query`."""
+    key = (" ".join(query.lower().split()), max_results)
+    if use_cache:
+        cached = _cache.get(key)
+        if cached is not None:
+            return cached
+    pool = get_pool()
+    slot = pool.acquire()
+    broken = False
+    try:
+        results = _scrape(slot[0], query, max_results)
+    except Exception:
+        broken = True
+        raise
+    finally:
+        pool.release(slot, broken=broken)
+    _cache.put(key, results)
+    return results
+
+
+def search_many(queries, max_results=MAX_RESULTS):
+    """Run several searches concurrently across the browser pool. Returns results in query order."""
+    with ThreadPoolExecutor(max_workers=get_pool().size) as ex:
+        return list(ex.map(lambda q: search_web(q, max_results), queries))
+
+
+def format_results(query, results) -> str:
+    if not results:
+        return f"No web results for: {query}"
+    lines = [f"Web results for: {query}"]
+    for i, r in enumerate(results, 1):
+        lines.append(f"{i}. {r['title']} - {r['url']}")
+        if r['snippet']:
+            lines.append(f"   {r['snippet']}")
+    return "\n".join(lines)
@@ -0,0 +1,43 @@
+"""
+Shared fixtures. Tests never touch the real config/ or cache/: anything that builds an Agent
+runs in a throwaway copy of the repo (`repo_copy`) pointed at the stand-in LLM server from
+the benchmarks (`fake_llm`).
+"""
+import os
+import sys
+import shutil
+
+import pytest
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.fake_llm import FakeLLMServer  # noqa: E402
+from benchmarks.run import COPY_IGNORE, _write_config  # noqa: E402
+from models import tracing  # noqa: E402
+
+# Local model only, no response cache: every call reaches the stand-in server
+TEST_CONFIG = {"USE_API": False, "LOCAL_MODEL": "test", "RESPONSE_CACHE": False}
+
+
+@pytest.fixture(autouse=True)
+def _trace_to_tmp(tmp_path, monkeypatch):
+    """Spans recorded by a test go to its tmp dir, not cache/traces."""
+    monkeypatch.setattr(tracing, "_tracer", tracing.Tracer(str(tmp_path / 'traces' / 'spans.jsonl'),
+                                                           str(tmp_path / 'metrics' / 'commander.prom')))
+
+
+@pytest.fixture
+def fake_llm():
+    with FakeLLMServer(latency_ms=0, prefill_tokens_per_sec=10 ** 9, tokens_per_sec=10 ** 6) as server:
+        yield server
+
+
+@pytest.fixture
+def repo_copy(tmp_path, fake_llm):
+    """A copy of the repo with a stub config/config.yaml pointing at `fake_llm`."""
+    repo = str(tmp_path / 'repo')
+    shutil.copytree(ROOT, repo, ignore=COPY_IGNORE)
+    _write_config(repo, dict(TEST_CONFIG, OLLAMA_HOST=fake_llm.url))
+    return repo
@@ -0,0 +1,51 @@
+import io
+import sys
+import json
+import subprocess
+
+from agent_core import batch
+
+
+def test_read_jobs_accepts_objects_and_bare_requests():
+    lines = ['{"id": "a", "request": "uptime"}', "", "how much disk is free?",
+             '{"request_id": "r7", "body": "list files"}']
+    jobs = list(batch.read_jobs(io.StringIO("\n".join(lines))))
+    assert [(j["id"], j["request"]) for j in jobs] == [("a", "uptime"), ("3", "how much disk is free?"),
+                                                        ("r7", "list files")]
+    assert not any("error" in j for j in jobs)
+
+
+def test_read_jobs_flags_unusable_lines():
+    jobs = list(batch.read_jobs(io.StringIO('[1, 2]\n42\n{"request": 5}\n"fine"\n')))
+    assert [j["id"] for j in jobs] == ["1", "2", "3", "4"]
+    assert "got list" in jobs[0]["error"] and "got int" in jobs[1]["error"]
+    assert "must be a string" in jobs[2]["error"]
+    assert "error" not in jobs[3]
+
+
+def test_match_answer():
+    answers = {"Which directory?": "/tmp", "port": "8080", "*": "yes"}
+    assert batch.match_answer("which directory?", answers) == "/tmp"
+    assert batch.match_answer("What port should I use?", answers) == "8080"
+    assert batch.match_answer("Proceed?", answers) == "yes"
+    assert batch.match_answer("Proceed?", {}) is None
+
+
+def test_batch_run_on_worker_pool(repo_copy, fake_llm, tmp_path):
+    fake_llm.cassette.responses.insert(0, {"match": "ask me", "text": '{"tool": "inquiry", "args": {"text": "Which one?"}}'})
+    jobs = tmp_path / "jobs.jsonl"
+    jobs.write_text("\n".join([json.dumps({"id": f"j{i}", "request": f"job {i}"}) for i in range(4)]
+                              + ["[1, 2]", json.dumps({"id": "q", "request": "ask me"})]) + "\n")
+    results = tmp_path / "results.jsonl"
+    proc = subprocess.run([sys.executable, "main.py", "--batch", str(jobs), "--output", str(results),
+                           "--workers", "2"], cwd=repo_copy, capture_output=True, text=True, timeout=300)
+    assert proc.returncode == 1, proc.stderr[-2000:]  # the bad line and the question aren't ok
+    records = [json.loads(line) for line in results.read_text().splitlines()]
+    by_id = {r["id"]: r for r in records}
+    # One record per job, in completion order, each carrying its input position
+    assert sorted(r["index"] for r in records) == list(range(6))
+    assert [by_id[f"j{i}"]["index"] for i in range(4)] == [0, 1, 2, 3]
+    assert all(by_id[f"j{i}"]["status"] == "ok" for i in range(4))
+    assert by_id["5"]["status"] == "error" and "got list" in by_id["5"]["error"]
+    assert by_id["q"]["status"] == "needs_input" and by_id["q"]["question"] == "Which one?"
+    assert "4 ok" in proc.stderr
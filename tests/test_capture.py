@@ -0,0 +1,96 @@
+import time
+import shutil
+
+import pytest
+
+pytest.importorskip("PIL")
+from PIL import Image, ImageDraw  # noqa: E402
+
+from modules import capture, screen  # noqa: E402
+
+
+class SyntheticBackend:
+    """Stands in for a display: each grab is a new frame with a counter drawn on it."""
+    name = "synthetic"
+
+    def __init__(self, size=(960, 480)):
+        self.size = size
+        self.grabs = 0
+
+    def grab(self, region=None):
+        self.grabs += 1
+        img = Image.new("RGB", self.size, "white")
+        ImageDraw.Draw(img).text((10, 10), f"frame {self.grabs}", fill="black")
+        return img.crop(region) if region else img
+
+
+def test_capture_region_grayscale_and_scale():
+    img = capture.capture((0, 0, 400, 200), grayscale=True, scale=0.5, backend=SyntheticBackend())
+    assert img.mode == "L"
+    assert img.size == (200, 100)
+
+
+def test_frame_buffer_keeps_recent_frames():
+    backend = SyntheticBackend()
+    buffer = capture.FrameBuffer(size=3, fps=100, backend=backend).start()
+    try:
+        assert buffer.latest(wait=2) is not None
+        deadline = time.monotonic() + 2
+        while backend.grabs < 6 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert backend.grabs >= 6
+        assert len(buffer.frames) == 3
+        stamps = [stamp for stamp, _ in buffer.frames]
+        assert stamps == sorted(stamps)
+    finally:
+        buffer.stop()
+    assert not buffer.running
+    assert buffer.errors == 0
+
+
+def test_latest_frame_uses_running_buffer():
+    buffer = screen.start_frame_buffer(fps=100, backend=SyntheticBackend())
+    try:
+        newest = buffer.latest(wait=2)
+        assert newest is not None
+        assert screen.latest_frame(max_age=10).size == (960, 480)
+    finally:
+        screen.stop_frame_buffer()
+    assert not buffer.running
+    assert screen._frame_buffer is None
+
+
+def _fake_ocr_tile(job):
+    """One 'word' per tile naming the tile and whether it is mostly dark."""
+    image, (ox, oy), core = job
+    dark = image.convert("L").resize((1, 1)).getpixel((0, 0)) < 128
+    return [{"text": f"tile{core[0]}x{core[1]}{'-dark' if dark else ''}", "left": core[0] + 10,
+             "top": core[1] + 10, "width": 40, "height": 12, "conf": 90.0}]
+
+
+def test_incremental_ocr_only_rereads_changed_tiles(monkeypatch):
+    monkeypatch.setattr(screen, "_ocr_tile", _fake_ocr_tile)
+    reader = screen.IncrementalOCR(tile_width=480, tile_height=240, margin=0, workers=1)
+    img = Image.new("L", (960, 480), 255)
+    first = reader.read(img)
+    assert len(first["changed_tiles"]) == 4
+    assert first["lines"] == ["tile0x0 tile480x0", "tile0x240 tile480x240"]
+
+    changed = img.copy()
+    changed.paste(0, (480, 240, 960, 480))
+    second = reader.read(changed)
+    assert second["changed_tiles"] == [(480, 240, 960, 480)]
+    assert second["added"] == ["tile0x240 tile480x240-dark"]
+    assert second["removed"] == ["tile0x240 tile480x240"]
+
+    assert reader.read(changed)["changed_tiles"] == []
+
+
+def test_ocr_reads_synthetic_text():
+    pytest.importorskip("pytesseract")
+    if shutil.which("tesseract") is None:
+        pytest.skip("tesseract not installed")
+    img = Image.new("L", (480, 120), 255)
+    ImageDraw.Draw(img).text((20, 40), "HELLO COMMANDER", fill=0, font_size=36)
+    reader = screen.IncrementalOCR(workers=1)
+    assert "HELLO" in reader.read(img)["text"]
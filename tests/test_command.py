@@ -0,0 +1,75 @@
+import pytest
+
+from modules import command
+from modules.command import OutputBuffer, ShellSession
+
+
+@pytest.fixture
+def shell():
+    session = ShellSession()
+    yield session
+    session.close()
+
+
+def test_cwd_and_environment_persist(shell, tmp_path):
+    assert shell.run(f"cd {tmp_path}; export COMMANDER_TEST=42") == (0, "")
+    assert shell.run("pwd; echo $COMMANDER_TEST") == (0, f"{tmp_path}\n42")
+
+
+def test_exit_code_and_output(shell):
+    assert shell.run("echo out; echo err >&2; false") == (1, "out\nerr")
+
+
+def test_commands_reading_stdin_get_eof(shell):
+    assert shell.run("cat", timeout=5) == (0, "")
+    assert shell.run("read x; echo got:$x", timeout=5) == (0, "got:")
+    assert shell.run("echo still in step") == (0, "still in step")
+
+
+def test_no_history_expansion(shell):
+    assert shell.run('echo "a!b" x!!y') == (0, "a!b x!!y")
+
+
+def test_timeout_kills_only_the_command(shell):
+    code, output = shell.run("export KEPT=yes; sleep 30", timeout=1)
+    assert code is None and "timed out after 1s" in output
+    assert shell.run("echo $KEPT") == (0, "yes")
+
+
+def test_exit_restarts_the_shell_without_harming_the_caller(shell):
+    code, output = shell.run("exit 3", timeout=30)
+    assert code == 3 and "shell exited" in output
+    assert not shell.alive
+    # Nothing may signal our own process group once the shell is gone
+    shell._kill_children()
+    assert shell.run("echo back") == (0, "back")
+
+
+def test_background_job(shell):
+    job = shell.run_background("echo started; exit 4")
+    for _ in range(100):
+        status = shell.poll_job(job)
+        if not status["running"]:
+            break
+        shell.run("sleep 0.05")
+    assert status["exit_code"] == 4 and status["output"] == "started\n"
+    assert "error" in shell.poll_job("99")
+
+
+def test_sessions_keep_separate_shells(tmp_path):
+    try:
+        with command.use_session("test-a"):
+            command.run_command(f"cd {tmp_path}")
+            assert command.run_command("pwd") == str(tmp_path)
+        with command.use_session("test-b"):
+            assert command.run_command("pwd") != str(tmp_path)
+    finally:
+        command.close_session("test-a")
+        command.close_session("test-b")
+
+
+def test_output_buffer_keeps_head_and_tail():
+    buffer = OutputBuffer(head=4, tail=4)
+    for chunk in (b"abcdef", b"ghij", b"klmnop"):
+        buffer.write(chunk)
+    assert buffer.render() == "abcd\n...[truncated 8 bytes]...\nmnop"
@@ -0,0 +1,39 @@
+import time
+import threading
+
+from agent_core.executor import BatchExecutor
+
+
+def test_single_calls_respect_class_limits():
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def run_one(call):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return call["tool"]
+
+    executor = BatchExecutor(run_one, classify=lambda tool: "gui")
+    # Single-tool plans from concurrent sessions share the one GUI slot
+    threads = [threading.Thread(target=executor.run_single, args=({"tool": "click"},)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 1
+    assert executor.run_single({"tool": "type"}) == "type"
+    executor.shutdown()
+
+
+def test_batch_keeps_input_order_and_dependencies():
+    order = []
+    executor = BatchExecutor(lambda call: order.append(call["id"]) or call["id"])
+    pairs = executor.run([{"id": "a", "tool": "x", "after": ["b"]}, {"id": "b", "tool": "y"},
+                          {"id": "c", "tool": "z", "after": ["missing"]}])
+    assert [result for _, result in pairs] == ["a", "b", "Skipped: unknown dependency missing"]
+    assert order == ["b", "a"]
+    executor.shutdown()
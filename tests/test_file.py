@@ -0,0 +1,73 @@
+from types import SimpleNamespace
+
+from agent_core import builtin_tools
+from modules import file as mod_file
+
+
+def test_tail_and_head_line_counts(tmp_path):
+    path = tmp_path / "log.txt"
+    path.write_text("".join(f"line {i}\n" for i in range(1, 101)))
+    assert mod_file.tail(str(path), 2) == "line 99\nline 100"
+    assert mod_file.tail(str(path), 0) == ""
+    assert mod_file.tail(str(path), -3) == ""
+    assert mod_file.head(str(path), 0) == ""
+    assert mod_file.tail(str(path), 500).count("\n") == 99
+
+
+def test_results_are_capped_at_max_bytes(tmp_path):
+    path = tmp_path / "big.txt"
+    path.write_text("x" * 1000 + "\n")
+    assert mod_file.tail(str(path), 1, max_bytes=100) == (
+        "...[truncated: showing the last 100 bytes; request fewer lines]\n" + "x" * 100)
+    assert mod_file.head(str(path), 1, max_bytes=100).startswith("x" * 100 + "\n...[truncated at 100 bytes")
+    text = mod_file.read_file(str(path), max_bytes=10)
+    assert text.startswith("x" * 10 + "\n...[truncated: showing bytes 0-10 of 1001")
+
+
+def test_reads_stop_at_max_bytes(tmp_path, monkeypatch):
+    path = tmp_path / "oneline.txt"
+    path.write_text("y" * 500_000)
+    sizes = []
+    real_open = open
+
+    def recording_open(*args, **kwargs):
+        return _Recorder(real_open(*args, **kwargs), sizes)
+
+    monkeypatch.setattr("builtins.open", recording_open)
+    assert mod_file.read_lines(str(path), 1, max_bytes=100).endswith("[truncated at 100 bytes; narrow the line range]")
+    assert mod_file.tail(str(path), 5, max_bytes=100).endswith("y" * 100)
+    monkeypatch.undo()
+    assert sum(sizes) < 100_000
+
+
+class _Recorder:
+    """File wrapper recording how many bytes each read returns."""
+
+    def __init__(self, f, sizes):
+        self.f, self.sizes = f, sizes
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.f.close()
+
+    def __getattr__(self, name):
+        attr = getattr(self.f, name)
+        if name not in ("read", "readline"):
+            return attr
+
+        def recorded(*args):
+            data = attr(*args)
+            self.sizes.append(len(data))
+            return data
+        return recorded
+
+
+def test_read_file_tool_treats_null_as_default(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("one\ntwo\nthree\n")
+    agent = SimpleNamespace(llm=SimpleNamespace(file_result_bytes=1000))
+    assert builtin_tools.read_file(agent, {"path": str(path), "start_line": None, "end_line": 2}) == "one\ntwo\n"
+    assert builtin_tools.read_file(agent, {"path": str(path), "start_line": 2, "end_line": None}) == "two\nthree\n"
+    assert builtin_tools.read_file(agent, {"path": str(path), "offset": None, "length": None}) == "one\ntwo\nthree\n"
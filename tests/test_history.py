@@ -0,0 +1,41 @@
+from agent_core.history import SessionLog, RESET_RECORD
+from agent_core.compaction import HistoryCompactor
+
+
+def _turns(n, start=0):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i} " + "word " * 50}
+            for i in range(start, start + n)]
+
+
+def test_sync_appends_new_entries(tmp_path):
+    path = str(tmp_path / 'session.jsonl')
+    log = SessionLog(path)
+    history = _turns(2)
+    log.sync(history)
+    history += _turns(2, start=2)
+    log.sync(history)
+    assert SessionLog(path).load() == history
+    assert RESET_RECORD not in [e for e in SessionLog(path).iter_entries()]
+
+
+def test_sync_after_compaction_rewrites_head(tmp_path):
+    path = str(tmp_path / 'session.jsonl')
+    log = SessionLog(path)
+    history = _turns(20)
+    log.sync(history)
+    compactor = HistoryCompactor(lambda summary, entries: f"summary of {len(entries)}",
+                                 trigger_tokens=200, keep_tokens=100)
+    compactor.schedule("s", history).result(10)
+    count, entry = compactor.apply("s", history)
+    compactor.shutdown()
+    assert history[0] is entry and len(history) == 20 - count + 1
+    # As many entries as before (or more) but a different head: the log must start over
+    history += _turns(count + 2, start=20)
+    log.sync(history)
+    assert SessionLog(path).load() == history
+    log.compact_in_background().join()
+    # A fresh log object (e.g. after a restart) compares against the head on disk too
+    history[:2] = [{"role": "summary", "content": "again", "turns": 99}]
+    history += _turns(5, start=100)
+    SessionLog(path).sync(history)
+    assert SessionLog(path).load() == history
@@ -0,0 +1,25 @@
+from agent_core import memory
+
+
+def test_shared_kv_keeps_other_writers_keys(tmp_path):
+    path = str(tmp_path / 'commander.db')
+    first, second = memory.MemoryStore(path), memory.MemoryStore(path)
+    a, b = first.load_kv(), second.load_kv()
+    a["last_request"] = "from a"
+    first.save_kv(a)
+    # b loaded before a saved: saving must not wipe a's key
+    b["theme"] = "dark"
+    second.save_kv(b)
+    assert first.load_kv() == {"last_request": "from a", "theme": "dark"}
+    first.close()
+    second.close()
+
+
+def test_namespaced_kv_is_separate(tmp_path):
+    store = memory.MemoryStore(str(tmp_path / 'commander.db'))
+    store.save_kv({"x": 1})
+    store.save_kv({"y": 2}, namespace="srv:alice")
+    store.save_kv({"z": 3}, namespace="srv:alice")
+    assert store.load_kv() == {"x": 1}
+    assert store.load_kv("srv:alice") == {"z": 3}
+    store.close()
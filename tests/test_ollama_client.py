@@ -0,0 +1,76 @@
+import time
+import threading
+
+import pytest
+
+pytest.importorskip("requests")
+
+from benchmarks.fake_llm import FakeLLMServer  # noqa: E402
+from models.cancel import CancelToken, Cancelled, set_token  # noqa: E402
+from models.ollama_client import OllamaClient, OllamaError  # noqa: E402
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_calls_reuse_one_pooled_connection():
+    with FakeLLMServer(["one", "two", "three"], latency_ms=0) as server:
+        client = OllamaClient(host=server.url, model="test")
+        replies = [client.generate("hello")["response"] for _ in range(3)]
+        pools = client.session.get_adapter(server.url).poolmanager.pools
+        opened = [pools[key].num_connections for key in pools.keys()]
+        client.close()
+    assert replies == ["one", "two", "three"]
+    assert opened == [1]
+
+
+def test_keep_alive_is_sent_and_warm_uses_no_response():
+    with FakeLLMServer(["answer"], latency_ms=0) as server:
+        client = OllamaClient(host=server.url, model="test", keep_alive=-1)
+        client.warm()
+        assert server.cassette.remaining == 1
+        assert client.generate_text("question") == "answer"
+        client.close()
+    assert [call["keep_alive"] for call in server.calls] == [-1]
+
+
+def test_cancelling_a_stream_hangs_up_mid_generation():
+    response = " ".join(f"word{i}" for i in range(200))
+    with FakeLLMServer([response], latency_ms=0, tokens_per_sec=200) as server:
+        client = OllamaClient(host=server.url, model="test")
+        token = CancelToken()
+        received, outcome = [], {}
+
+        def consume():
+            set_token(token)
+            try:
+                for chunk in client.stream_generate("go"):
+                    received.append(chunk)
+                    if len(received) == 5:
+                        token.cancel()
+            except Cancelled:
+                outcome["cancelled"] = True
+
+        worker = threading.Thread(target=consume)
+        worker.start()
+        worker.join(10)
+        assert outcome == {"cancelled": True}
+        assert len(received) == 5
+        # The server notices the closed connection and stops generating
+        assert _wait_for(lambda: server.calls)
+        client.close()
+    call = server.calls[0]
+    assert call["aborted"]
+    assert call["completion_tokens"] < 200
+
+
+def test_http_errors_raise_ollama_error():
+    with FakeLLMServer(latency_ms=0) as server:
+        client = OllamaClient(host=server.url + "/missing", model="test")
+        with pytest.raises(OllamaError, match="HTTP 404"):
+            client.generate("hello")
+        client.close()
@@ -0,0 +1,23 @@
+import json
+
+from agent_core.retrieval import BM25Index
+
+
+def test_appends_from_another_writer_are_picked_up(tmp_path):
+    writer, reader = BM25Index(str(tmp_path)), BM25Index(str(tmp_path))
+    for text in ("alpha notes", "beta notes", "gamma notes"):
+        writer.add(text)
+    assert reader.search("beta") and len(reader) == 3
+    offset = reader.docs._read[1]
+
+    with open(tmp_path / "docs.jsonl", "a") as f:
+        f.write(json.dumps({"text": "delta notes"}) + "\n")
+        f.write('{"text": "half written')
+    assert reader.search("delta")[0][0] == 3
+    # Caught up from the stored offset; the unfinished line is left for later
+    assert reader.docs._read == (4, offset + len(json.dumps({"text": "delta notes"})) + 1)
+
+    with open(tmp_path / "docs.jsonl", "a") as f:
+        f.write(' line"}\n')
+    assert reader.search("half")[0][0] == 4
+    assert BM25Index(str(tmp_path)).texts == reader.texts
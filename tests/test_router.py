@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+
+from benchmarks.fake_llm import FakeLLMServer  # noqa: E402
+from models.ollama_client import OllamaClient  # noqa: E402
+from models.router import ModelRouter  # noqa: E402
+
+LONG_REPLY = " ".join(f"word{i}" for i in range(100))
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def _calls(local, api):
+    """Backends that ask a stand-in server each, the way LLMManager's _backends do."""
+    clients = {"local": OllamaClient(host=local.url, model="local"), "api": OllamaClient(host=api.url, model="api")}
+
+    def ask(name):
+        def call():
+            try:
+                return clients[name].generate_text("question")
+            except Exception as e:
+                return f"[{name} error: {e}]"
+        return call
+    return {name: ask(name) for name in clients}
+
+
+def _valid(text):
+    return bool(text) and not text.startswith("[")
+
+
+def test_routes_away_from_a_backend_slower_than_the_slo():
+    with FakeLLMServer(["slow"] * 3, latency_ms=300) as local, FakeLLMServer(["fast"] * 3, latency_ms=0) as api:
+        router = ModelRouter(hedge=False, priors={"local": 0.05, "api": 0.05})
+        calls = _calls(local, api)
+        # No history: the local model is preferred, and turns out to miss the SLO
+        assert router.call(calls, slo=0.2, validate=_valid) == ("slow", "local")
+        assert router.rank(calls, slo=0.2) == ["api", "local"]
+        assert router.call(calls, slo=0.2, validate=_valid) == ("fast", "api")
+        # Without a latency budget the cheaper local model stays first
+        assert router.rank(calls, slo=None)[0] == "local"
+    assert router.stats["local"].percentile(0.95) >= 0.3
+
+
+def test_failed_primary_falls_back_at_once():
+    with FakeLLMServer(latency_ms=0) as local, FakeLLMServer(["from api"], latency_ms=0) as api:
+        calls = _calls(local, api)
+        calls["local"] = lambda: "[Local LLM error: model not found]"
+        router = ModelRouter(hedge=True, hedge_delay=5)
+        started = time.monotonic()
+        assert router.call(calls, validate=_valid) == ("from api", "api")
+        assert time.monotonic() - started < 2
+    assert router.stats["local"].samples[-1][2] is False
+
+
+def test_hedge_wins_over_slow_primary_and_cancels_it():
+    with FakeLLMServer([LONG_REPLY], latency_ms=600, tokens_per_sec=50) as local, \
+            FakeLLMServer(["hedged"], latency_ms=0) as api:
+        router = ModelRouter(hedge=True, hedge_delay=0.1)
+        started = time.monotonic()
+        result = router.call(_calls(local, api), validate=_valid)
+        elapsed = time.monotonic() - started
+        assert result == ("hedged", "api")
+        assert elapsed < 0.5
+        # The slow local generation is abandoned between chunks instead of running to the end
+        assert _wait_for(lambda: local.calls)
+    assert local.calls[0]["aborted"]
+    assert local.calls[0]["completion_tokens"] < 100
+    # The loser's time so far counts against it
+    assert router.stats["local"].samples
@@ -0,0 +1,148 @@
+import json
+import time
+import socket
+import asyncio
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from agent_core import memory, server
+
+TOKEN = "s3cret"
+
+
+class _StubAsyncAgent:
+    """Answers every request with its text, without an LLM."""
+
+    def __init__(self):
+        self.persist_pool = ThreadPoolExecutor(max_workers=1)
+
+    async def handle_request(self, text, session=None):
+        if text == "hang":
+            await asyncio.sleep(3600)
+        session.history.append({"user": text})
+        return f"echo: {text}"
+
+
+class _StubAgent:
+    def __init__(self):
+        self.async_agent = _StubAsyncAgent()
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = memory.MemoryStore(str(tmp_path / 'commander.db'))
+    monkeypatch.setattr(memory, "_store", store)
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def agent_server(store):
+    """An AgentServer on an ephemeral port, served from a background event loop."""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    srv = server.AgentServer(_StubAgent(), port=0, token=TOKEN)
+    asyncio.run_coroutine_threadsafe(srv.start(), loop).result(10)
+    yield srv
+    asyncio.run_coroutine_threadsafe(srv.close(), loop).result(10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(10)
+
+
+def _call(srv, method, path, body=None, headers=None, token=TOKEN):
+    conn = http.client.HTTPConnection("127.0.0.1", srv.port, timeout=10)
+    headers = dict(headers or {})
+    if token is not None:
+        headers.setdefault("Authorization", f"Bearer {token}")
+    if body is not None and not isinstance(body, bytes):
+        body = json.dumps(body).encode()
+        headers.setdefault("Content-Type", "application/json")
+    conn.request(method, path, body=body, headers=headers)
+    response = conn.getresponse()
+    data = json.loads(response.read() or b"null")
+    conn.close()
+    return response.status, data
+
+
+def _upgrade(srv, extra=""):
+    """Send a WebSocket handshake; returns the status line."""
+    with socket.create_connection(("127.0.0.1", srv.port), timeout=10) as sock:
+        sock.sendall((f"GET /sessions/alice/events?token={TOKEN} HTTP/1.1\r\nHost: 127.0.0.1:{srv.port}\r\n"
+                      "Upgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n"
+                      f"Sec-WebSocket-Version: 13\r\n{extra}\r\n").encode())
+        return sock.recv(4096).split(b"\r\n", 1)[0].decode()
+
+
+def test_runs_a_request(agent_server):
+    status, data = _call(agent_server, "POST", "/sessions/alice/requests", {"request": "hi", "wait": True})
+    assert status == 200
+    assert data["status"] == "done" and data["response"] == "echo: hi"
+    status, data = _call(agent_server, "GET", "/sessions/alice")
+    assert data["history_entries"] == 1 and data["requests"][0]["id"]
+
+
+def test_token_required(agent_server):
+    assert _call(agent_server, "GET", "/health", token=None)[0] == 401
+    assert _call(agent_server, "GET", "/health", token="wrong")[0] == 401
+    assert _call(agent_server, "GET", "/health")[0] == 200
+
+
+def test_token_generated_by_default(store):
+    srv = server.AgentServer(_StubAgent())
+    assert srv.token and len(srv.token) >= 20
+    assert server.AgentServer(_StubAgent()).token != srv.token
+
+
+def test_foreign_origin_refused(agent_server):
+    headers = {"Origin": "https://evil.example"}
+    assert _call(agent_server, "POST", "/sessions/alice/requests", {"request": "hi"}, headers)[0] == 403
+    assert _call(agent_server, "GET", "/health", headers={"Origin": "null"})[0] == 403
+    assert _call(agent_server, "GET", "/health", headers={"Origin": "http://localhost:3000"})[0] == 200
+    assert "alice" not in agent_server.sessions
+
+
+def test_foreign_host_refused(agent_server):
+    # DNS rebinding: a page on evil.example whose name now resolves to 127.0.0.1
+    assert _call(agent_server, "GET", "/health", headers={"Host": f"evil.example:{agent_server.port}"})[0] == 403
+    assert _call(agent_server, "GET", "/health", headers={"Host": f"localhost:{agent_server.port}"})[0] == 200
+
+
+def test_body_must_be_json(agent_server):
+    body = json.dumps({"request": "hi"}).encode()
+    status, _ = _call(agent_server, "POST", "/sessions/alice/requests", body, {"Content-Type": "text/plain"})
+    assert status == 415
+    assert "alice" not in agent_server.sessions
+
+
+def test_websocket_origin_checked(agent_server):
+    assert " 403 " in _upgrade(agent_server, "Origin: https://evil.example\r\n")
+    assert " 101 " in _upgrade(agent_server, "Origin: http://127.0.0.1\r\n")
+
+
+def test_bad_content_length(agent_server):
+    with socket.create_connection(("127.0.0.1", agent_server.port), timeout=10) as sock:
+        sock.sendall((f"GET /health HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: Bearer {TOKEN}\r\n"
+                      "Content-Length: abc\r\n\r\n").encode())
+        assert b" 400 " in sock.recv(4096).split(b"\r\n", 1)[0]
+
+
+def test_close_answers_queued_requests(agent_server):
+    assert _call(agent_server, "POST", "/sessions/alice/requests", {"request": "hang"})[0] == 202
+    while agent_server.sessions["alice"].running is None:
+        time.sleep(0.01)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        waiting = pool.submit(_call, agent_server, "POST", "/sessions/alice/requests", {"request": "hi", "wait": True})
+        while not agent_server.sessions["alice"].queue.qsize():
+            time.sleep(0.01)
+        assert _call(agent_server, "DELETE", "/sessions/alice")[0] == 200
+        status, data = waiting.result(10)
+    assert status == 200 and data["status"] == "cancelled"
+
+
+def test_default_session_name_reserved(agent_server):
+    status, _ = _call(agent_server, "POST", "/sessions", {"name": memory.DEFAULT_SESSION})
+    assert status == 400
@@ -0,0 +1,51 @@
+import sys
+import json
+import subprocess
+
+import pytest
+
+from agent_core import startup
+
+
+def _probe(repo, ui):
+    """Run startup.probe in a fresh interpreter inside `repo`, with -X importtime."""
+    code = f"import json; from agent_core import startup; print(json.dumps(startup.probe(ui={ui})))"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=repo,
+                          capture_output=True, text=True, timeout=120)
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    return json.loads(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+
+def test_agent_startup_is_lazy_and_within_budget(repo_copy):
+    result, stderr = _probe(repo_copy, ui=False)
+    assert result["error"] is None
+    assert result["heavy_loaded"] == []
+    assert sum(result["phases"].values()) < startup.STARTUP_BUDGET_MS
+    imports = dict(startup.parse_importtime(stderr))
+    assert "agent_core.agent" in imports
+    assert not set(imports) & set(startup.HEAVY_MODULES)
+
+
+def test_startup_check_passes(repo_copy):
+    pytest.importorskip("rich")
+    ok, message = startup.check(runs=1, root=repo_copy)
+    assert ok, message
+
+
+def test_probe_catches_eager_heavy_import(repo_copy):
+    pytest.importorskip("PIL")
+    # Simulate a regression: a tool dependency imported on the way to the menu
+    with open(f"{repo_copy}/agent_core/agent.py") as f:
+        source = f.read()
+    with open(f"{repo_copy}/agent_core/agent.py", "w") as f:
+        f.write("import PIL.Image  # noqa\n" + source)
+    result, _ = _probe(repo_copy, ui=False)
+    assert "PIL" in result["heavy_loaded"]
+
+
+def test_parse_importtime_keeps_top_level_only():
+    stderr = ("import time: self [us] | cumulative | imported package\n"
+              "import time:       100 |        100 |   json.decoder\n"
+              "import time:       200 |        300 | json\n"
+              "import time:        50 |       5000 | agent_core.agent\n")
+    assert startup.parse_importtime(stderr) == [("agent_core.agent", 5000), ("json", 300)]
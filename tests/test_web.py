@@ -0,0 +1,137 @@
+import shutil
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from modules import web
+
+
+class FakeDriver:
+    """The part of a WebDriver the pool uses."""
+
+    def __init__(self, healthy=True):
+        self.healthy = healthy
+        self.quit_called = False
+
+    def execute_script(self, script):
+        if not self.healthy:
+            raise RuntimeError("browser died")
+        return 1
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_pool_reuses_browsers_and_recycles_after_max_uses():
+    created = []
+    pool = web.BrowserPool(size=1, max_uses=2, factory=lambda: created.append(FakeDriver()) or created[-1])
+    for _ in range(3):
+        pool.release(pool.acquire())
+    assert len(created) == 2
+    assert created[0].quit_called and not created[1].quit_called
+    assert pool.recycled == 1
+
+
+def test_pool_replaces_unhealthy_browser():
+    created = []
+    pool = web.BrowserPool(size=1, factory=lambda: created.append(FakeDriver()) or created[-1])
+    slot = pool.acquire()
+    pool.release(slot)
+    created[0].healthy = False
+    assert pool.acquire()[0] is created[1]
+    assert created[0].quit_called
+
+
+def test_pool_waits_when_all_browsers_are_busy():
+    pool = web.BrowserPool(size=1, factory=FakeDriver)
+    slot = pool.acquire()
+    with pytest.raises(web.BrowserUnavailable, match="no browser available after 0.05s"):
+        pool.acquire(timeout=0.05)
+    pool.release(slot, broken=True)
+    assert pool.acquire(timeout=0.05)[0] is not slot[0]
+
+
+def test_pool_frees_the_slot_when_a_browser_fails_to_start():
+    drivers = iter([RuntimeError("no geckodriver"), FakeDriver()])
+
+    def factory():
+        driver = next(drivers)
+        if isinstance(driver, Exception):
+            raise driver
+        return driver
+
+    pool = web.BrowserPool(size=1, factory=factory)
+    with pytest.raises(RuntimeError, match="geckodriver"):
+        pool.acquire(timeout=0.05)
+    assert isinstance(pool.acquire(timeout=0.05)[0], FakeDriver)
+
+
+def test_search_results_are_cached_per_normalized_query(monkeypatch):
+    scraped = []
+
+    def scrape(driver, query, max_results):
+        scraped.append(query)
+        return [{"title": query, "url": f"http://example.test/{len(scraped)}", "snippet": ""}]
+
+    monkeypatch.setattr(web, "_scrape", scrape)
+    monkeypatch.setattr(web, "_pool", web.BrowserPool(size=2, factory=FakeDriver))
+    monkeypatch.setattr(web, "_cache", web._TTLCache())
+    first = web.search_web("Python  asyncio")
+    assert web.search_web("python asyncio") == first
+    assert web.search_many(["a", "b", "python asyncio"])[2] == first
+    assert sorted(scraped) == ["Python  asyncio", "a", "b"]
+    assert web.search_web("python asyncio", use_cache=False) != first
+
+
+def test_failed_scrape_discards_the_browser(monkeypatch):
+    def scrape(driver, query, max_results):
+        raise RuntimeError("page did not load")
+
+    pool = web.BrowserPool(size=1, factory=FakeDriver)
+    monkeypatch.setattr(web, "_scrape", scrape)
+    monkeypatch.setattr(web, "_pool", pool)
+    monkeypatch.setattr(web, "_cache", web._TTLCache())
+    with pytest.raises(RuntimeError):
+        web.search_web("anything")
+    assert pool.recycled == 1
+
+
+RESULTS_PAGE = b"""<html><body>
+<div class="result"><a class="result__a" href="http://example.test/one">First result</a>
+<div class="result__snippet">The first snippet</div></div>
+<div class="result"><a class="result__a" href="http://example.test/two">Second result</a></div>
+</body></html>"""
+
+
+class _ResultsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(RESULTS_PAGE)))
+        self.end_headers()
+        self.wfile.write(RESULTS_PAGE)
+
+
+def test_scrape_local_results_page(monkeypatch):
+    pytest.importorskip("selenium")
+    if shutil.which("geckodriver") is None or shutil.which("firefox") is None:
+        pytest.skip("headless Firefox not installed")
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _ResultsHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    pool = web.BrowserPool(size=1)
+    monkeypatch.setattr(web, "SEARCH_URL", f"http://127.0.0.1:{httpd.server_address[1]}/?q={{query}}")
+    monkeypatch.setattr(web, "_pool", pool)
+    monkeypatch.setattr(web, "_cache", web._TTLCache())
+    try:
+        results = web.search_web("local test")
+    finally:
+        pool.close()
+        httpd.shutdown()
+    assert results == [
+        {"title": "First result", "url": "http://example.test/one", "snippet": "The first snippet"},
+        {"title": "Second result", "url": "http://example.test/two", "snippet": ""},
+    ]
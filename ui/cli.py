@@ -2,8 +2,9 @@
 CLI interface for Commander AI
 """
 
-from prompt_toolkit import prompt
 from models.llm import TASK_END_TOKEN
+from models import tracing
+from agent_core.history import SessionLog
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
@@ -14,7 +15,8 @@ from rich.text import Text
 from rich import box
 
 import os
-import glob
+import asyncio
+import time
 import shutil
 
 console = Console()
@@ -27,6 +29,7 @@ def main_menu():
                  "[bold green]3.[/bold green] Load previous chat\n"
                  "[bold green]4.[/bold green] Delete a chat\n"
                  "[bold green]5.[/bold green] Delete all cache/history\n"
+                 "[bold green]6.[/bold green] Performance stats\n"
                  "[bold red]0.[/bold red] Exit\n")
     menu_panel = Panel(
         Align.center(Text.from_markup(menu_text, justify="center"), vertical="middle"),
@@ -57,6 +60,9 @@ def start_cli(agent):
         elif choice == '5':
             console.clear()
             delete_all_cache()
+        elif choice == '6':
+            console.clear()
+            show_stats()
         elif choice == '0':
             console.clear()
             console.print(Panel("[bold red]Goodbye![/bold red]", border_style="red"))
@@ -65,184 +71,208 @@ def start_cli(agent):
             console.print(Panel("[bold yellow]Invalid option. Try again.[/bold yellow]", border_style="yellow"))
 
 def run_agent_cli(agent, new_session=False):
-    console.print(Panel("[bold magenta]Type 'exit' to return to menu.[/bold magenta]", border_style="magenta"))
+    from agent_core.async_agent import AgentSession
+    from modules import command
+    console.print(Panel("[bold magenta]Type 'exit' to return to menu. Ctrl+C cancels a running request.[/bold magenta]", border_style="magenta"))
     chat_history = []
     session_file = None
     import os, datetime
     chat_dir = os.path.join(os.path.dirname(__file__), '../cache/chats')
     os.makedirs(chat_dir, exist_ok=True)
-    session_file = os.path.join(chat_dir, f'session_{datetime.datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
-    while True:
-        user_input = Prompt.ask("[bold blue]You[/bold blue]")
-        if user_input.strip().lower() == 'exit':
-            break
-        # Step 1: Planning
-        model = "OpenAI GPT-4" if agent.llm.use_api and agent.llm.api_key else "Ollama (local LLM)"
-        with console.status(f"[bold yellow]Planning next action using {model}...[/bold yellow]", spinner="dots"):
-            plan = agent.llm.plan(user_input, chat_history)
-        message = plan.get('message')
-        if message:
-            console.print(f"[bold cyan]AI:[/bold cyan] {message}")
-            chat_history.append({"role": "assistant", "content": message})
+    stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    session_file = os.path.join(chat_dir, f'session_{stamp}.jsonl')
+    session_log = SessionLog(session_file, fsync=True)
+    # The chat's own history and shell; memory stays shared with the rest of the CLI
+    session = AgentSession(f"cli-{stamp}", history=chat_history)
+    try:
+        while True:
+            user_input = Prompt.ask("[bold blue]You[/bold blue]")
+            if user_input.strip().lower() == 'exit':
+                break
+            _run_turn(agent, user_input, session, session_log)
+    finally:
+        command.close_session(session.name)
+
+def _show_event(event, asked):
+    """Print the steps of a running request as the async agent reports them; questions go to `asked`."""
+    if event["type"] == "plan":
+        plan = event["plan"]
+        # A final plan's message is the response, printed once the request is done
+        if plan.get('message') and not plan.get('task_end') and plan.get('tool') != 'none':
+            console.print(f"[bold cyan]AI:[/bold cyan] {plan['message']}")
         tool = plan.get('tool', '?')
-        desc = plan.get('ui', {}).get('description', '')
-        # Show tool execution or AI response
-        if tool == 'inquiry':
-            result = agent.execute_plan(plan, user_input)
-            if isinstance(result, dict) and result.get('__type') == 'inquiry':
-                console.print(f"[bold cyan]AI:[/bold cyan] {result['text']}")
-                user_response = Prompt.ask("[bold blue]Your response[/bold blue]")
-                chat_history.append({"role": "assistant", "content": result['text']})
-                chat_history.append({"role": "user", "content": user_response})
-                plan = agent.llm.plan(user_response)
-                result = agent.execute_plan(plan, user_response)
-                chat_history.append({"role": "llm_plan", "content": str(plan)})
-                chat_history.append({"role": "tool", "content": str(result)})
-                continue
-            else:
-                console.print(f"[bold cyan]AI:[/bold cyan] {result}")
-        elif tool != 'none' and tool != '?':
-            display = desc or f"Executing {tool}"
-            console.print(f"[bold yellow]{display}[/bold yellow]")
-            with console.status(f"[bold green]{display}[/bold green]", spinner="bouncingBar"):
-                result = agent.execute_plan(plan, user_input)
-            console.print(f"[bold green]Done:[/bold green] [bold cyan]{tool}[/bold cyan]")
+        if tool not in ('none', '?', 'inquiry'):
+            desc = plan.get('ui', {}).get('description', '')
+            console.print(f"[bold yellow]{desc or f'Executing {tool}'}[/bold yellow]")
+    elif event["type"] == "result" and event.get("tool") == 'inquiry':
+        asked.append(event["result"])
+    elif event["type"] == "result" and event.get("tool") not in (None, 'none', '?'):
+        console.print(f"[bold green]Done:[/bold green] [bold cyan]{event['tool']}[/bold cyan]")
+
+def _run_turn(agent, user_input, session, session_log):
+    """
+    One CLI turn on the async agent core (agent_core/async_agent.py), so STEP_TIMEOUT applies
+    and Ctrl+C cancels the running step. A question from the agent ends its request; the
+    answer is sent as the next one.
+    """
+    model = "OpenAI GPT-4" if agent.llm.use_api and agent.llm.api_key else "Ollama (local LLM)"
+    request = user_input
+    while request is not None:
+        asked = []
+        session.on_event = lambda event: _show_event(event, asked)
+        try:
+            with console.status(f"[bold yellow]Working using {model}...[/bold yellow]", spinner="dots"):
+                response = asyncio.run(agent.async_agent.handle_request(request, session=session))
+        except KeyboardInterrupt:
+            # asyncio.run cancelled the request: its step's cancel token fired and the turn was saved
+            console.print("[bold red]Cancelled.[/bold red]")
+            response = None
+        # Actively save after each request: one append + fsync of the new entries
+        session_log.sync(session.history)
+        if response is None:
+            return
+        console.print(f"[bold cyan]AI:[/bold cyan] {response}")
+        request = Prompt.ask("[bold blue]Your response[/bold blue]") if asked else None
+
+def _chat_table(sessions, first, title):
+    table = Table(title=title, box=box.SIMPLE, border_style="cyan")
+    table.add_column("#", style="bold green", width=4)
+    table.add_column("Started", style="white")
+    table.add_column("Turns", justify="right")
+    table.add_column("Tools", style="cyan")
+    table.add_column("Size", justify="right")
+    table.add_column("First request", style="white", overflow="ellipsis", max_width=50)
+    for i, s in enumerate(sessions):
+        first_request = s.get("snippet") or s["title"]
+        table.add_row(str(first + i + 1), time.strftime("%Y-%m-%d %H:%M", time.localtime(s["started"])),
+                      str(s["turns"]), ", ".join(s["tools"]), f"{s['size'] / 1024:.1f} KB", first_request)
+    return table
+
+def _browse_chats(prompt=None):
+    """
+    Page through the session catalog, searching with /text. With a prompt, returns the
+    session whose number is entered (or None); otherwise returns once the user is done.
+    """
+    from agent_core.catalog import get_catalog, PAGE_SIZE
+    catalog = get_catalog()
+    catalog.refresh()
+    page, query = 0, None
+    while True:
+        total = catalog.count(query)
+        if not total:
+            message = f"No chats match '{query}'." if query else "No chats found."
+            console.print(Panel(f"[bold yellow]{message}[/bold yellow]", border_style="yellow"))
+            if not query:
+                return None
+            query, page = None, 0
+            continue
+        pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+        page = min(page, pages - 1)
+        sessions = catalog.list(page, query=query)
+        title = f"Chats matching '{query}'" if query else "Available Chats"
+        console.print(_chat_table(sessions, page * PAGE_SIZE, f"{title} (page {page + 1}/{pages}, {total} total)"))
+        hint = "[dim]n/p: next/previous page, /text: search, /: clear search"
+        hint += ", number: select, Enter: back[/dim]" if prompt else ", Enter: back[/dim]"
+        console.print(hint)
+        choice = Prompt.ask(f"[bold blue]{prompt or 'Chats'}[/bold blue]", default="").strip()
+        if not choice:
+            return None
+        if choice == "n":
+            page = min(page + 1, pages - 1)
+        elif choice == "p":
+            page = max(page - 1, 0)
+        elif choice.startswith("/"):
+            query, page = choice[1:].strip() or None, 0
+        elif prompt and choice.isdigit() and page * PAGE_SIZE < int(choice) <= page * PAGE_SIZE + len(sessions):
+            return sessions[int(choice) - 1 - page * PAGE_SIZE]
         else:
-            with console.status("[bold green]Processing...[/bold green]", spinner="bouncingBar"):
-                result = agent.execute_plan(plan, user_input)
-        # Step 3: Agentic follow-up (if needed)
-        steps = 0
-        max_steps = 20
-        while agent._should_continue(plan, result) and steps < max_steps:
-            steps += 1
-            with console.status(f"[bold cyan]Reasoning next step...[/bold cyan]", spinner="bouncingBall"):
-                followup_prompt = agent._agentic_followup_prompt(user_input, plan, result)
-                followup_plan = agent._robust_parse_plan(agent.llm._plan_with_api(followup_prompt, chat_history))
-                chat_history.append({"role": "llm_followup_plan", "content": str(followup_plan)})
-            
-            followup_message = followup_plan.get('message')
-            if followup_message:
-                console.print(f"[bold cyan]AI:[/bold cyan] {followup_message}")
-                chat_history.append({"role": "assistant", "content": followup_message})
-            followup_tool = followup_plan.get('tool', '?')
-            followup_desc = followup_plan.get('ui', {}).get('description', '')
-            if followup_tool == 'inquiry':
-                followup_result = agent.execute_plan(followup_plan, user_input)
-                if isinstance(followup_result, dict) and followup_result.get('__type') == 'inquiry':
-                    console.print(f"[bold cyan]AI:[/bold cyan] {followup_result['text']}")
-                    user_response = Prompt.ask("[bold blue]Your response[/bold blue]")
-                    chat_history.append({"role": "assistant", "content": followup_result['text']})
-                    chat_history.append({"role": "user", "content": user_response})
-                    plan = agent.llm.plan(user_response)
-                    result = agent.execute_plan(plan, user_response)
-                    chat_history.append({"role": "llm_plan", "content": str(plan)})
-                    chat_history.append({"role": "tool", "content": str(result)})
-                    if plan.get('message'):
-                        console.print(f"[bold cyan]AI:[/bold cyan] {plan['message']}")
-                        chat_history.append({"role": "assistant", "content": plan['message']})
-                    # Update the plan and result for the outer loop
-                    plan = followup_plan
-                    result = followup_result
-                else:
-                    console.print(f"[bold cyan]AI:[/bold cyan] {followup_result}")
-            elif followup_tool != 'none' and followup_tool != '?':
-                display = followup_desc or f"Executing {followup_tool}"
-                console.print(f"[bold yellow]{display}[/bold yellow]")
-                with console.status(f"[bold green]{display}[/bold green]", spinner="bouncingBar"):
-                    followup_result = agent.execute_plan(followup_plan, user_input)
-                chat_history.append({"role": "tool", "content": str(followup_result)})
-                console.print(f"[bold green]Done:[/bold green] [bold cyan]{followup_tool}[/bold cyan]")
-            else:
-                with console.status("[bold green]Processing...[/bold green]", spinner="bouncingBar"):
-                    followup_result = agent.execute_plan(followup_plan, user_input)
-                chat_history.append({"role": "tool", "content": str(followup_result)})
-            
-            plan, result = followup_plan, followup_result
-        
-        # Final message is already printed when received
-        # Save chat history after each turn
-        chat_history.append({"role": "user", "content": user_input})
-        chat_history.append({"role": "llm_plan", "content": str(plan)})
-        chat_history.append({"role": "tool", "content": str(result)})
-        # Actively save after each turn
-        if session_file:
-            import json, os
-            with open(session_file, 'w') as f:
-                json.dump(chat_history, f, indent=2)
-                f.flush()
-                os.fsync(f.fileno())
+            console.print(Panel("[bold red]Invalid input.[/bold red]", border_style="red"))
 
 def list_chats():
-    chat_dir = os.path.join(os.path.dirname(__file__), '../cache/chats')
-    if not os.path.exists(chat_dir):
-        console.print(Panel("[bold yellow]No chats found.[/bold yellow]", border_style="yellow"))
-        return
-    chats = sorted(glob.glob(os.path.join(chat_dir, 'session_*.json')))
-    if not chats:
-        console.print(Panel("[bold yellow]No chats found.[/bold yellow]", border_style="yellow"))
-        return
-    table = Table(title="Available Chats", box=box.SIMPLE, border_style="cyan")
-    table.add_column("#", style="bold green", width=4)
-    table.add_column("Session File", style="white")
-    for i, chat in enumerate(chats):
-        table.add_row(str(i+1), os.path.basename(chat))
-    console.print(table)
+    _browse_chats()
 
 def load_chat():
-    chat_dir = os.path.join(os.path.dirname(__file__), '../cache/chats')
-    chats = sorted(glob.glob(os.path.join(chat_dir, 'session_*.json')))
-    if not chats:
-        console.print(Panel("[bold yellow]No chats to load.[/bold yellow]", border_style="yellow"))
+    from agent_core.catalog import get_catalog, PAGE_SIZE
+    session = _browse_chats("Enter chat number to view")
+    if session is None:
         return
-    list_chats()
-    idx = Prompt.ask("[bold blue]Enter chat number to view[/bold blue]")
-    try:
-        idx = int(idx) - 1
-        if 0 <= idx < len(chats):
-            with open(chats[idx], 'r') as f:
-                import json
-                history = json.load(f)
-            chat_panel = Panel.fit("\n".join([
-                f"[bold magenta]{entry.get('role','agent').capitalize()}[/bold magenta]: [white]{clean_output(entry.get('content',''))}[/white]"
-                for entry in history
-            ]), title="[bold cyan]Chat History[/bold cyan]", border_style="cyan", padding=(1,2))
-            console.print(chat_panel)
-        else:
-            console.print(Panel("[bold red]Invalid chat number.[/bold red]", border_style="red"))
-    except Exception:
-        console.print(Panel("[bold red]Invalid input.[/bold red]", border_style="red"))
+    catalog = get_catalog()
+    # Rendered a page at a time so a long session never loads all at once
+    offset = 0
+    while True:
+        entries = catalog.entries(session["path"], offset, PAGE_SIZE)
+        if not entries:
+            break
+        console.print(Panel.fit("\n".join([
+            f"[bold magenta]{entry.get('role','agent').capitalize()}[/bold magenta]: [white]{clean_output(entry.get('content',''))}[/white]"
+            for entry in entries
+        ]), title=f"[bold cyan]Chat History ({offset + 1}-{offset + len(entries)} of {session['entries']})[/bold cyan]",
+            border_style="cyan", padding=(1,2)))
+        offset += len(entries)
+        if offset >= session["entries"] or Prompt.ask("[bold blue]More? (y/n)[/bold blue]", choices=["y","n"], default="y") != "y":
+            break
 
 def delete_chat():
-    chat_dir = os.path.join(os.path.dirname(__file__), '../cache/chats')
-    chats = sorted(glob.glob(os.path.join(chat_dir, 'session_*.json')))
-    if not chats:
-        console.print(Panel("[bold yellow]No chats to delete.[/bold yellow]", border_style="yellow"))
+    from agent_core.catalog import get_catalog
+    from agent_core import blobs
+    session = _browse_chats("Enter chat number to delete")
+    if session is None:
         return
-    list_chats()
-    idx = Prompt.ask("[bold red]Enter chat number to delete[/bold red]")
     try:
-        idx = int(idx) - 1
-        if 0 <= idx < len(chats):
-            os.remove(chats[idx])
-            console.print(Panel("[bold green]Chat deleted.[/bold green]", border_style="green"))
-        else:
-            console.print(Panel("[bold red]Invalid chat number.[/bold red]", border_style="red"))
-    except Exception:
-        console.print(Panel("[bold red]Invalid input.[/bold red]", border_style="red"))
+        get_catalog().delete(session["path"])
+        removed = blobs.collect_garbage()
+        note = f" Freed {removed} stored output{'s' if removed != 1 else ''}." if removed else ""
+        console.print(Panel(f"[bold green]Chat deleted.{note}[/bold green]", border_style="green"))
+    except Exception as e:
+        console.print(Panel(f"[bold red]Error deleting chat: {e}[/bold red]", border_style="red"))
 
 def delete_all_cache():
     cache_dir = os.path.join(os.path.dirname(__file__), '../cache')
     confirm = Prompt.ask("[bold red]Are you sure you want to delete ALL cache and chat history? (y/n)[/bold red]", choices=["y","n"], default="n")
     if confirm == 'y':
+        from agent_core import memory, catalog, blobs
         try:
+            # Close the open database connections and indexes first, then reopen on the fresh cache
+            catalog.reset_catalog()
+            blobs.reset_blob_store()
+            memory.close_store()
             shutil.rmtree(cache_dir)
             os.makedirs(os.path.join(cache_dir, 'chats'), exist_ok=True)
+            catalog.get_catalog()
             console.print(Panel("[bold green]All cache and chat history deleted.[/bold green]", border_style="green"))
         except Exception as e:
             console.print(Panel(f"[bold red]Error deleting cache: {e}[/bold red]", border_style="red"))
     else:
         console.print(Panel("[bold yellow]Cancelled.[/bold yellow]", border_style="yellow"))
 
+def show_stats():
+    tracer = tracing.get_tracer()
+    spans = tracing.read_spans(tracer.path, backups=tracer.backups)
+    if not spans:
+        console.print(Panel("[bold yellow]No traces recorded yet.[/bold yellow]", border_style="yellow"))
+        return
+    table = Table(title=f"Latency over the last {len(spans)} spans", box=box.SIMPLE, border_style="cyan")
+    table.add_column("Kind", style="bold green")
+    table.add_column("Name", style="white")
+    table.add_column("Count", justify="right")
+    table.add_column("p50 ms", justify="right")
+    table.add_column("p95 ms", justify="right")
+    table.add_column("Prefill p50", justify="right")
+    table.add_column("Total s", justify="right")
+    table.add_column("Errors", justify="right", style="red")
+    table.add_column("Prompt tok", justify="right")
+    table.add_column("Tok/s", justify="right", style="cyan")
+    for row in tracing.summarize(spans):
+        table.add_row(row["kind"], row["name"], str(row["count"]), f"{row['p50_ms']:.0f}", f"{row['p95_ms']:.0f}",
+                      f"{row['prefill_p50_ms']:.0f}" if row["prefill_p50_ms"] is not None else "",
+                      f"{row['total_ms'] / 1000:.1f}", str(row["errors"] or ""),
+                      str(row["prompt_tokens"] or ""), str(row["tokens_per_sec"] or ""))
+    console.print(table)
+    fallbacks = sum(1 for s in spans if s.get("attrs", {}).get("fallback_to_api"))
+    hedge_wins = sum(1 for s in spans if s.get("attrs", {}).get("hedge_win"))
+    console.print(f"[bold]Local -> API fallbacks:[/bold] {fallbacks}    [bold]Hedge wins:[/bold] {hedge_wins}    "
+                  f"[dim]Trace: {os.path.normpath(tracer.path)}  Metrics: {os.path.normpath(tracer.metrics_file)}[/dim]")
+
 def clean_output(text):
     import re
     # Remove debug, bracketed, and prompt lines